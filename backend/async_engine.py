@@ -0,0 +1,288 @@
+import asyncio
+import email.utils
+import http.client
+import io
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from backend.overseer_log import log
+
+
+class ResponseWriter:
+    """
+    File-like sink handed to route code running on an executor thread.
+
+    Output is buffered and handed to the event loop once the route
+    returns, so a typical JSON response never crosses threads mid-request.
+    Large (streamed) responses are pushed out whenever the buffer passes
+    `flush_threshold` bytes, waiting for the transport to drain.
+    """
+
+    def __init__(self, loop, writer, flush_threshold=65536):
+        self.loop = loop
+        self.writer = writer
+        self.flush_threshold = flush_threshold
+        self.pending = []
+        self.pending_bytes = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self.pending.append(data)
+        self.pending_bytes += len(data)
+        if self.pending_bytes >= self.flush_threshold:
+            asyncio.run_coroutine_threadsafe(self.drain_pending(), self.loop).result()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    async def drain_pending(self):
+        """Send whatever has been buffered so far."""
+        if self.pending:
+            data = b"".join(self.pending)
+            self.pending = []
+            self.pending_bytes = 0
+            self.writer.write(data)
+            await self.writer.drain()
+
+
+class AsyncExchange:
+    """
+    One HTTP request/response pair on a persistent connection.
+
+    Exposes the part of the BaseHTTPRequestHandler API the Overseer routes
+    rely on (path, headers, rfile, send_response/send_header/end_headers,
+    wfile), so the same route mixin serves both the threaded and the
+    asyncio engines.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "Overseer/1.0"
+
+    def __init__(self, command, path, request_version, headers, body, client_address, wfile):
+        self.command = command
+        self.path = path
+        self.request_version = request_version
+        self.requestline = f"{command} {path} {request_version}"
+        self.headers = headers
+        self.rfile = io.BytesIO(body)
+        self.wfile = wfile
+        self.client_address = client_address
+        self.close_connection = not self._wants_keep_alive()
+        self.headers_sent = False
+        self._framed = False
+
+    def _wants_keep_alive(self):
+        connection = self.headers.get('Connection', '').lower()
+        if self.request_version == "HTTP/1.1":
+            return connection != "close"
+        return connection == "keep-alive"
+
+    def dispatch(self):
+        """Run the route for this request on the calling (executor) thread."""
+        method = getattr(self, f"do_{self.command}", None)
+        if method is None:
+            self.send_error(501, f"Unsupported method ({self.command})")
+            return
+        method()
+
+    def send_response(self, code, message=None):
+        self.log_request(code)
+        self.send_response_only(code, message)
+        self.send_header('Server', self.server_version)
+        self.send_header('Date', email.utils.formatdate(usegmt=True))
+
+    def send_response_only(self, code, message=None):
+        if message is None:
+            try:
+                message = HTTPStatus(code).phrase
+            except ValueError:
+                message = ""
+        self.wfile.write(f"{self.protocol_version} {code} {message}\r\n".encode('latin-1'))
+
+    def send_header(self, keyword, value):
+        name = keyword.lower()
+        if name in ('content-length', 'transfer-encoding'):
+            self._framed = True
+        elif name == 'connection':
+            if value.lower() == 'close':
+                self.close_connection = True
+            return
+        self.wfile.write(f"{keyword}: {value}\r\n".encode('latin-1'))
+
+    def end_headers(self):
+        # Without a length or chunked framing the body ends when we close
+        if not self._framed:
+            self.close_connection = True
+        connection = "close" if self.close_connection else "keep-alive"
+        self.wfile.write(f"Connection: {connection}\r\n\r\n".encode('latin-1'))
+        self.headers_sent = True
+
+    def send_error(self, code, message=None):
+        body = (message or HTTPStatus(code).phrase).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_request(self, code='-', size='-'):
+        self.log_message('"%s" %s %s', self.requestline, str(code), str(size))
+
+    def log_message(self, format, *args):
+        print(format % args)
+
+
+class AsyncHTTPEngine:
+    """
+    HTTP/1.1 server with keep-alive built on asyncio streams.
+
+    Connections are handled on the event loop; route code (which does
+    blocking DB work) runs on a bounded thread pool. At most `max_pending`
+    requests are running or queued for that pool; past that, requests
+    get an immediate 503 instead of waiting in an unbounded queue.
+    """
+
+    def __init__(self, exchange_cls, host, port, max_workers=16, keepalive_timeout=15.0,
+                 max_header_bytes=65536, max_body_bytes=16 * 1024 * 1024, reuse_port=False,
+                 max_pending=None, retry_after=1, body_timeout=10.0):
+        self.exchange_cls = exchange_cls
+        self.host = host
+        self.port = port
+        self.keepalive_timeout = keepalive_timeout
+        self.body_timeout = body_timeout
+        self.max_header_bytes = max_header_bytes
+        self.max_body_bytes = max_body_bytes
+        self.reuse_port = reuse_port
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        # Requests handed to the executor and not yet finished (event loop only)
+        self.pending = 0
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="overseer-route")
+        self.server = None
+
+    async def serve_forever(self):
+        self.server = await asyncio.start_server(
+            self._handle_connection,
+            self.host or None,
+            self.port,
+            limit=self.max_header_bytes,
+            reuse_address=True,
+            reuse_port=self.reuse_port or None
+        )
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False)
+
+    async def _handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        client_address = writer.get_extra_info('peername')
+        try:
+            while True:
+                keep_open = await self._handle_request(loop, reader, writer, client_address)
+                if not keep_open:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _handle_request(self, loop, reader, writer, client_address):
+        """Serve one request. Returns True if the connection stays open."""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.keepalive_timeout)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+            return False
+        except asyncio.LimitOverrunError:
+            await self._reject(writer, 431, "Request header too large")
+            return False
+
+        request_line, _, header_block = head.partition(b"\r\n")
+        try:
+            command, path, request_version = request_line.decode('latin-1').split()
+        except ValueError:
+            await self._reject(writer, 400, "Bad request line")
+            return False
+        if not request_version.startswith("HTTP/1."):
+            await self._reject(writer, 505, "HTTP version not supported")
+            return False
+
+        headers = http.client.parse_headers(io.BytesIO(header_block))
+
+        if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+            await self._reject(writer, 411, "Content-Length required")
+            return False
+        try:
+            length = int(headers.get('Content-Length', 0))
+        except ValueError:
+            await self._reject(writer, 400, "Bad Content-Length")
+            return False
+        if length < 0 or length > self.max_body_bytes:
+            await self._reject(writer, 413, "Request body too large")
+            return False
+
+        if length and headers.get('Expect', '').lower() == '100-continue':
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        body = await self._read_body(reader, length)
+        if body is None:
+            return False
+
+        if self.max_pending is not None and self.pending >= self.max_pending:
+            log.warning('request', "All handler threads busy, answered %s with 503", path)
+            await self._reject(writer, 503, "Server busy, retry later",
+                               {'Retry-After': str(self.retry_after)})
+            return False
+
+        wfile = ResponseWriter(loop, writer)
+        exchange = self.exchange_cls(command, path, request_version, headers, body, client_address, wfile)
+        self.pending += 1
+        try:
+            await loop.run_in_executor(self.executor, exchange.dispatch)
+        except Exception as e:
+            log.error('request', "Unhandled error on %s: %s", path, e)
+            if exchange.headers_sent:
+                return False
+            wfile.pending = []
+            wfile.pending_bytes = 0
+            exchange.close_connection = True
+            await loop.run_in_executor(self.executor, exchange.send_error, 500, "Internal server error")
+        finally:
+            self.pending -= 1
+        await wfile.drain_pending()
+        return not exchange.close_connection
+
+    async def _read_body(self, reader, length):
+        """
+        The request body, or None if the client sends nothing for
+        `body_timeout` seconds or closes the connection first.
+        """
+        chunks = []
+        remaining = length
+        while remaining:
+            try:
+                chunk = await asyncio.wait_for(reader.read(min(remaining, 65536)), self.body_timeout)
+            except asyncio.TimeoutError:
+                return None
+            if not chunk:
+                return None
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    async def _reject(self, writer, code, message, headers=None):
+        body = message.encode('utf-8')
+        extra = "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        writer.write(
+            f"HTTP/1.1 {code} {HTTPStatus(code).phrase}\r\n"
+            f"Content-Type: text/plain; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"{extra}"
+            f"Connection: close\r\n\r\n".encode('latin-1') + body
+        )
+        await writer.drain()
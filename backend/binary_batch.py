@@ -0,0 +1,174 @@
+"""
+Binary event batches for `POST /events/batch`.
+
+A JSON batch repeats session_id and event_type in every event and costs
+a json.loads per event. A binary batch (Content-Type
+application/x-overseer-batch) names the session once, gives each event
+type a small integer code, and packs events as fixed-width records that
+numpy decodes in one frombuffer call.
+
+Layout (little-endian):
+
+    offset  type      field
+    0       4s        magic b"OVEB"
+    4       uint8     version (1)
+    5       uint8     number of event types T
+    6       uint16    session_id length S
+    8       uint32    number of records N
+    12      uint32    meta blob length M
+    16      S bytes   session_id (UTF-8)
+    ...     T times   uint8 length L, then L bytes of event type name
+    ...     N times   record (16 bytes):
+                          uint16   type code (index into the names)
+                          uint16   meta length
+                          float32  x
+                          float32  y
+                          uint32   meta offset into the blob
+    ...     M bytes   meta blob: UTF-8 JSON objects
+
+A record with meta length 0 has meta `{}`. Records may share one meta
+slice, and each distinct slice is parsed once. Server timestamps are
+assigned on arrival, as for JSON events.
+"""
+import json
+import struct
+
+import numpy as np
+
+CONTENT_TYPE = 'application/x-overseer-batch'
+
+MAGIC = b"OVEB"
+VERSION = 1
+HEADER = struct.Struct('<4sBBHII')
+RECORD = np.dtype([
+    ('type', '<u2'),
+    ('meta_length', '<u2'),
+    ('x', '<f4'),
+    ('y', '<f4'),
+    ('meta_offset', '<u4'),
+])
+
+
+def encode_batch(session_id, events):
+    """
+    Pack events (dicts with event_type, x, y and optional meta, as in a
+    JSON batch) for one session. Identical metas are stored once.
+    """
+    names = {}
+    slices = {}
+    blob = bytearray()
+    records = np.zeros(len(events), dtype=RECORD)
+    for index, event in enumerate(events):
+        code = names.setdefault(event['event_type'], len(names))
+        meta = event.get('meta')
+        if meta:
+            text = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+            if text not in slices:
+                slices[text] = len(blob)
+                blob += text
+            records[index]['meta_offset'] = slices[text]
+            records[index]['meta_length'] = len(text)
+        records[index]['type'] = code
+        records[index]['x'] = event.get('x', 0.0)
+        records[index]['y'] = event.get('y', 0.0)
+
+    session = session_id.encode('utf-8')
+    parts = [HEADER.pack(MAGIC, VERSION, len(names), len(session), len(events), len(blob)), session]
+    for name in names:
+        encoded = name.encode('utf-8')
+        parts.append(bytes([len(encoded)]) + encoded)
+    parts.append(records.tobytes())
+    parts.append(bytes(blob))
+    return b"".join(parts)
+
+
+class BinaryBatch:
+    """
+    A parsed binary batch: session_id, event type names, the records
+    (a numpy structured array over the body, not a copy) and the meta
+    blob. Raises ValueError if the batch is malformed as a whole.
+    """
+
+    def __init__(self, body):
+        if len(body) < HEADER.size:
+            raise ValueError("Truncated batch header")
+        magic, version, type_count, session_length, count, blob_length = HEADER.unpack_from(body)
+        if magic != MAGIC:
+            raise ValueError("Not a binary event batch")
+        if version != VERSION:
+            raise ValueError(f"Unsupported batch version {version}")
+
+        try:
+            offset = HEADER.size
+            self.session_id = body[offset:offset + session_length].decode('utf-8')
+            offset += session_length
+            self.names = []
+            for _ in range(type_count):
+                length = body[offset]
+                self.names.append(body[offset + 1:offset + 1 + length].decode('utf-8'))
+                offset += 1 + length
+        except (IndexError, UnicodeDecodeError):
+            raise ValueError("Malformed batch header")
+        if not self.session_id:
+            raise ValueError("session_id required")
+
+        if len(body) != offset + count * RECORD.itemsize + blob_length:
+            raise ValueError("Batch length does not match its header")
+        self.records = np.frombuffer(body, dtype=RECORD, count=count, offset=offset)
+        self.blob = body[offset + count * RECORD.itemsize:]
+
+    def __len__(self):
+        return len(self.records)
+
+    def rows(self, timestamp):
+        """
+        `events` rows for the valid records, like parse_event gives for
+        JSON, and {"index", "error"} dicts for the rest.
+        """
+        records = self.records
+        errors = []
+
+        unknown = records['type'] >= len(self.names)
+        for index in np.flatnonzero(unknown).tolist():
+            errors.append((index, "unknown type code"))
+        infinite = ~(np.isfinite(records['x']) & np.isfinite(records['y']))
+        for index in np.flatnonzero(infinite & ~unknown).tolist():
+            errors.append((index, "x and y must be finite"))
+        bad = (unknown | infinite).tolist()
+
+        names = self.names
+        xs = records['x'].astype(float).tolist()
+        ys = records['y'].astype(float).tolist()
+        # Parse each distinct meta slice once
+        metas = {}
+        rows = []
+        for index, (code, offset, length) in enumerate(zip(records['type'].tolist(),
+                                                           records['meta_offset'].tolist(),
+                                                           records['meta_length'].tolist())):
+            if bad[index]:
+                continue
+            key = (offset, length)
+            if key not in metas:
+                metas[key] = _meta(self.blob, offset, length)
+            meta = metas[key]
+            if meta is None:
+                errors.append((index, "meta must be a JSON object"))
+                continue
+            rows.append((self.session_id, names[code], xs[index], ys[index], timestamp, meta))
+
+        return rows, [{"index": index, "error": error} for index, error in sorted(errors)]
+
+
+def _meta(blob, offset, length):
+    """Meta JSON text for a blob slice, or None if it is not a JSON object."""
+    if not length:
+        return '{}'
+    if offset + length > len(blob):
+        return None
+    try:
+        text = blob[offset:offset + length].decode('utf-8')
+        if not isinstance(json.loads(text), dict):
+            return None
+    except ValueError:
+        return None
+    return text
@@ -0,0 +1,101 @@
+"""
+gzip/deflate for request and response bodies.
+
+Request bodies are inflated in fixed-size steps straight off the socket,
+and inflation stops as soon as the output passes the size cap, so a
+small "zip bomb" costs at most the cap in memory. Responses are
+compressed when the client's Accept-Encoding allows it and the body is
+big enough for compression to pay off.
+"""
+import zlib
+
+# Content-Encoding values accepted on requests
+ENCODINGS = ('identity', 'gzip', 'x-gzip', 'deflate')
+
+# Compressed bytes read from the request per inflate step
+READ_CHUNK = 65536
+
+# Responses smaller than this go out uncompressed
+MIN_COMPRESS_BYTES = 1024
+
+COMPRESS_LEVEL = 6
+
+
+def _decompressor(encoding, first_bytes):
+    if encoding in ('gzip', 'x-gzip'):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    # HTTP "deflate" means zlib-wrapped, but some clients send raw deflate
+    if len(first_bytes) >= 2 and (first_bytes[0] * 256 + first_bytes[1]) % 31 == 0 \
+            and first_bytes[0] & 0x0f == 8:
+        return zlib.decompressobj(zlib.MAX_WBITS)
+    return zlib.decompressobj(-zlib.MAX_WBITS)
+
+
+def read_body(rfile, length, encoding, max_size):
+    """
+    Read a `length`-byte request body from rfile and undo its
+    Content-Encoding. Returns None if the decoded body would exceed
+    max_size bytes; raises ValueError if it is not valid gzip/deflate.
+    """
+    if encoding == 'identity' or not length:
+        return rfile.read(length) if length <= max_size else None
+
+    output = []
+    size = 0
+    remaining = length
+    decompressor = None
+    while remaining:
+        chunk = rfile.read(min(READ_CHUNK, remaining))
+        if not chunk:
+            raise ValueError("Truncated request body")
+        remaining -= len(chunk)
+        while chunk:
+            if decompressor is None:
+                decompressor = _decompressor(encoding, chunk)
+            try:
+                data = decompressor.decompress(chunk, max_size - size + 1)
+            except zlib.error:
+                raise ValueError(f"Invalid {encoding} body")
+            size += len(data)
+            if size > max_size:
+                return None
+            output.append(data)
+            if decompressor.unconsumed_tail:
+                chunk = decompressor.unconsumed_tail
+            elif decompressor.eof and decompressor.unused_data and encoding != 'deflate':
+                # Concatenated gzip members decode as one body
+                chunk = decompressor.unused_data
+                decompressor = None
+            else:
+                chunk = b""
+
+    if decompressor is None or not decompressor.eof:
+        raise ValueError(f"Truncated {encoding} body")
+    return b"".join(output)
+
+
+def accepted(accept_encoding):
+    """The response encoding to use for an Accept-Encoding header: 'gzip', 'deflate' or None."""
+    weights = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip().lower()] = quality
+    star = weights.get('*', 0.0)
+    for encoding in ('gzip', 'deflate'):
+        if weights.get(encoding, star) > 0:
+            return encoding
+    return None
+
+
+def compress(body, encoding):
+    """Compress a whole response body with 'gzip' or 'deflate' (zlib-wrapped)."""
+    wbits = 16 + zlib.MAX_WBITS if encoding == 'gzip' else zlib.MAX_WBITS
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, wbits)
+    return compressor.compress(body) + compressor.flush()
@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import deque
+
+from backend.overseer_log import log
+
+
+class EventBuffer:
+    """
+    Bounded write-behind buffer for event rows.
+
+    Handlers offer rows and return immediately; flusher threads drain the
+    buffer in groups of up to `batch_size` rows, or whatever has piled up
+    after `flush_interval` seconds, and hand each group to `flush_fn`.
+    If `flush_fn` writes only part of a group, it returns the number of
+    rows it dropped; those count as failed.
+    """
+
+    def __init__(self, flush_fn, capacity=10000, batch_size=200, flush_interval=0.25, workers=1):
+        self.flush_fn = flush_fn
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.workers = workers
+
+        self._rows = deque()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = False
+        self._in_flight = 0
+
+        # Counters exposed through stats()
+        self._enqueued = 0
+        self._flushed = 0
+        self._rejected = 0
+        self._failed = 0
+        self._flushes = 0
+        self._flush_time_total = 0.0
+        self._flush_time_max = 0.0
+        self._last_flush_ms = 0.0
+
+    def start(self):
+        """Spawn the flusher threads."""
+        self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"event-flusher-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=10.0):
+        """Stop accepting work and drain whatever is still buffered."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def offer(self, rows):
+        """
+        Enqueue rows as a unit.
+
+        Returns False without enqueuing anything if the rows do not fit,
+        so a batch is never half accepted.
+        """
+        with self._cond:
+            if not self._running or len(self._rows) + len(rows) > self.capacity:
+                self._rejected += len(rows)
+                return False
+            self._rows.extend(rows)
+            self._enqueued += len(rows)
+            if len(self._rows) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def stats(self):
+        """Snapshot of queue depth and flush latency."""
+        with self._cond:
+            flushes = self._flushes
+            return {
+                "depth": len(self._rows),
+                "capacity": self.capacity,
+                "in_flight": self._in_flight,
+                "enqueued": self._enqueued,
+                "flushed": self._flushed,
+                "rejected": self._rejected,
+                "failed": self._failed,
+                "flushes": flushes,
+                "last_flush_ms": round(self._last_flush_ms, 3),
+                "avg_flush_ms": round(self._flush_time_total / flushes * 1000, 3) if flushes else 0.0,
+                "max_flush_ms": round(self._flush_time_max * 1000, 3)
+            }
+
+    def _take(self):
+        """Wait for a full group, the flush interval, or shutdown."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: len(self._rows) >= self.batch_size or not self._running,
+                timeout=self.flush_interval
+            )
+            count = min(len(self._rows), self.batch_size)
+            rows = [self._rows.popleft() for _ in range(count)]
+            self._in_flight += len(rows)
+            return rows
+
+    def _run(self):
+        while True:
+            rows = self._take()
+            if rows:
+                self._flush(rows)
+            elif not self._running:
+                return
+
+    def _flush(self, rows):
+        started = time.perf_counter()
+        try:
+            dropped = self.flush_fn(rows) or 0
+        except Exception as e:
+            log.error('storage', "Event flush failed (%d rows dropped): %s", len(rows), e)
+            dropped = len(rows)
+        elapsed = time.perf_counter() - started
+
+        with self._cond:
+            self._in_flight -= len(rows)
+            self._flushes += 1
+            self._flush_time_total += elapsed
+            self._flush_time_max = max(self._flush_time_max, elapsed)
+            self._last_flush_ms = elapsed * 1000
+            self._flushed += len(rows) - dropped
+            self._failed += dropped
@@ -0,0 +1,118 @@
+import base64
+import json
+from urllib.parse import parse_qs
+
+from database.storage import SQL
+
+# Page size for JSON responses; NDJSON exports are unbounded by default
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+EVENT_FIELDS = "event_id, session_id, event_type, x_coord, y_coord, timestamp, meta_data"
+
+
+def encode_cursor(event_id, order):
+    """Opaque continuation token: clients pass it back, never build it."""
+    token = json.dumps({"id": event_id, "order": order}).encode('utf-8')
+    return base64.urlsafe_b64encode(token).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+        event_id, order = int(data['id']), data['order']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+    if order not in ('asc', 'desc'):
+        raise ValueError("Invalid cursor")
+    return event_id, order
+
+
+class EventQuery:
+    """
+    Filters and keyset position for `GET /events`, parsed from the query
+    string. Pages are keyed on `event_id`, so fetching page N costs the
+    same as page 1 however deep the export goes.
+    """
+
+    def __init__(self, query_string):
+        params = {key: values[-1] for key, values in parse_qs(query_string).items()}
+
+        self.format = params.get('format', 'json')
+        if self.format not in ('json', 'ndjson'):
+            raise ValueError("format must be json or ndjson")
+
+        self.order = params.get('order', 'desc')
+        if self.order not in ('asc', 'desc'):
+            raise ValueError("order must be asc or desc")
+
+        self.event_type = params.get('event_type')
+        self.session_id = params.get('session_id')
+        self.user_id = params.get('user')
+        self.level = params.get('level')
+        self.since = self._int(params, 'since')
+        self.until = self._int(params, 'until')
+
+        self.after_id = None
+        if 'cursor' in params:
+            self.after_id, cursor_order = decode_cursor(params['cursor'])
+            if 'order' in params and cursor_order != self.order:
+                raise ValueError("cursor was issued for a different order")
+            self.order = cursor_order
+
+        self.limit = self._int(params, 'limit')
+        if self.format == 'json':
+            self.limit = min(self.limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        if self.limit is not None and self.limit < 1:
+            raise ValueError("limit must be positive")
+
+    @staticmethod
+    def _int(params, name):
+        if name not in params:
+            return None
+        try:
+            return int(params[name])
+        except ValueError:
+            raise ValueError(f"{name} must be an integer")
+
+    def sql(self):
+        """SELECT statement and parameters for this query."""
+        clauses = []
+        args = []
+        if self.event_type:
+            clauses.append("event_type = %s")
+            args.append(self.event_type)
+        if self.session_id:
+            clauses.append("session_id = %s")
+            args.append(self.session_id)
+        if self.user_id:
+            clauses.append("session_id IN (SELECT session_id FROM sessions WHERE user_id = %s)")
+            args.append(self.user_id)
+        if self.level:
+            clauses.append(f"{SQL.json_text.format(column='meta_data', key='level')} = %s")
+            args.append(self.level)
+        if self.since is not None:
+            clauses.append("timestamp >= %s")
+            args.append(self.since)
+        if self.until is not None:
+            clauses.append("timestamp < %s")
+            args.append(self.until)
+        if self.after_id is not None:
+            clauses.append("event_id < %s" if self.order == 'desc' else "event_id > %s")
+            args.append(self.after_id)
+
+        query = f"SELECT {EVENT_FIELDS} FROM events"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += f" ORDER BY event_id {self.order.upper()}"
+        if self.limit is not None:
+            query += " LIMIT %s"
+            args.append(self.limit)
+        return query, tuple(args)
+
+    def next_cursor(self, count, last_id):
+        """Cursor for the page after this one, or None if this was the last."""
+        if self.limit is None or count < self.limit:
+            return None
+        return encode_cursor(last_id, self.order)
@@ -0,0 +1,265 @@
+"""
+Binary heatmap grids for `GET /heatmap`.
+
+A grid counts the events of one type (optionally one level and one
+server-timestamp window) per bin over the HEATMAP_GRID_WIDTH x
+HEATMAP_GRID_HEIGHT map. Grids are built from `events` and kept in
+memory with the highest event_id they cover; a refresh only reads rows
+above it, and polls inside HEATMAP_CACHE_SECONDS of the last refresh
+don't touch the database at all.
+
+MySQL hands out AUTO_INCREMENT ids at insert time, but rows become
+visible at commit, so with concurrent writers a lower id can show up
+after a higher one was read. Each refresh therefore re-reads the last
+`rescan_ids` ids below the watermark and skips the ids it has already
+counted. A transaction that stays open while more than that many newer
+ids are handed out is still missed.
+
+Response body (little-endian):
+
+    offset  type      field
+    0       4s        magic b"OVHM"
+    4       uint8     version (1)
+    5       uint8     dtype: 1 = float32 counts, 2 = uint8 scaled to peak
+    6       uint16    reserved (0)
+    8       uint32    bins_x
+    12      uint32    bins_y
+    16      float32   width  (map units covered)
+    20      float32   height
+    24      uint64    events binned
+    32      uint64    events outside the map
+    40      float32   peak (largest bin count)
+    44      ...       bins_y rows of bins_x values, row 0 at y = 0
+
+A bin (ix, iy) covers x in [ix * width / bins_x, (ix + 1) * width / bins_x),
+and likewise for y. uint8 values decode as value / 255 * peak.
+"""
+import collections
+import hashlib
+import struct
+import threading
+import time
+from urllib.parse import parse_qs
+
+import numpy as np
+
+from database.storage import SQL
+from database.grids import bin_indices
+from backend import compression
+
+MAGIC = b"OVHM"
+VERSION = 1
+DTYPES = {'f32': 1, 'u8': 2}
+HEADER = struct.Struct('<4sBBHIIffQQf')
+
+MAX_BINS = 1024
+
+# Rows fetched per round trip while binning
+FETCH_ROWS = 50000
+
+
+class HeatmapQuery:
+    """`GET /heatmap` parameters, parsed from the query string."""
+
+    def __init__(self, query_string, event_types, default_bins):
+        params = {key: values[-1] for key, values in parse_qs(query_string).items()}
+
+        self.event_type = params.get('event_type')
+        if not self.event_type:
+            raise ValueError("event_type required")
+        if self.event_type not in event_types:
+            raise ValueError(f"Invalid event_type: {self.event_type}")
+
+        self.format = params.get('format', 'f32')
+        if self.format not in DTYPES:
+            raise ValueError("format must be f32 or u8")
+
+        self.level = params.get('level')
+        self.since = self._int(params, 'since')
+        self.until = self._int(params, 'until')
+        self.bins = self._int(params, 'bins')
+        if self.bins is None:
+            self.bins = default_bins
+        if not 1 <= self.bins <= MAX_BINS:
+            raise ValueError(f"bins must be between 1 and {MAX_BINS}")
+
+    @staticmethod
+    def _int(params, name):
+        if name not in params:
+            return None
+        try:
+            return int(params[name])
+        except ValueError:
+            raise ValueError(f"{name} must be an integer")
+
+    def key(self):
+        """Cache key: everything that selects or bins events (not the format)."""
+        return (self.event_type, self.level, self.since, self.until, self.bins)
+
+    def sql(self, after_id):
+        """SELECT of (event_id, x, y) for matching events above after_id."""
+        clauses = ["event_type = %s", "event_id > %s"]
+        args = [self.event_type, after_id]
+        if self.level:
+            clauses.append(f"{SQL.json_text.format(column='meta_data', key='level')} = %s")
+            args.append(self.level)
+        if self.since is not None:
+            clauses.append("timestamp >= %s")
+            args.append(self.since)
+        if self.until is not None:
+            clauses.append("timestamp < %s")
+            args.append(self.until)
+        query = "SELECT event_id, x_coord, y_coord FROM events WHERE " + " AND ".join(clauses)
+        return query, tuple(args)
+
+
+class HeatmapGrid:
+    """Counts for one query key, and the encoded bodies served from them."""
+
+    def __init__(self, bins, extent):
+        self.extent = extent
+        self.counts = np.zeros((bins, bins), dtype=np.int64)
+        self.outside = 0
+        self.watermark = 0
+        # Ids counted within the rescan window below the watermark
+        self.recent = np.empty(0, dtype=np.int64)
+        self.refreshed = None
+        self.lock = threading.Lock()
+        self._bodies = {}
+
+    def add(self, rows, seen=None, rescan_ids=0):
+        """
+        Bin a batch of (event_id, x, y) rows and advance the watermark,
+        skipping ids in `seen` (already counted) and keeping recent ids
+        within `rescan_ids` of the watermark.
+        """
+        batch = np.asarray(rows, dtype=float)
+        ids = batch[:, 0].astype(np.int64)
+        if seen is not None and len(seen):
+            fresh = ~np.isin(ids, seen)
+            batch, ids = batch[fresh], ids[fresh]
+            if not len(ids):
+                return
+        bins = self.counts.shape[0]
+        ix, iy, inside = bin_indices(batch[:, 1], batch[:, 2], self.extent, bins)
+        np.add.at(self.counts, (ix[inside], iy[inside]), 1)
+        self.outside += int((~inside).sum())
+        self.watermark = max(self.watermark, int(ids.max()))
+        recent = np.concatenate([self.recent, ids[ids > self.watermark - rescan_ids]])
+        self.recent = recent[recent > self.watermark - rescan_ids]
+        self._bodies.clear()
+
+    def merge(self, other, rescan_ids=0):
+        """Add another grid's counts, keeping recent ids within `rescan_ids` of the watermark."""
+        self.counts += other.counts
+        self.outside += other.outside
+        self.watermark = max(self.watermark, other.watermark)
+        recent = np.concatenate([self.recent, other.recent])
+        self.recent = recent[recent > self.watermark - rescan_ids]
+        if other.watermark:
+            # The delta binned new rows
+            self._bodies.clear()
+
+    def body(self, fmt, encoding=None):
+        """
+        (payload, etag) for a format, optionally gzip/deflate-compressed;
+        encoded once per change. Compressed payloads get a weak ETag.
+        """
+        cached = self._bodies.get((fmt, encoding))
+        if cached is None:
+            payload, etag = self.body(fmt) if encoding else self._encode(fmt)
+            if encoding:
+                payload, etag = compression.compress(payload, encoding), 'W/' + etag
+            cached = self._bodies[(fmt, encoding)] = payload, etag
+        return cached
+
+    def _encode(self, fmt):
+        bins_x, bins_y = self.counts.shape
+        peak = int(self.counts.max())
+        # Rows of constant y, so clients index [iy][ix]
+        rows = self.counts.T
+        if fmt == 'u8':
+            scale = 255 / peak if peak else 0
+            values = np.rint(rows * scale).astype(np.uint8)
+        else:
+            values = rows.astype('<f4')
+        header = HEADER.pack(MAGIC, VERSION, DTYPES[fmt], 0, bins_x, bins_y,
+                             self.extent[0], self.extent[1],
+                             int(self.counts.sum()), self.outside, peak)
+        payload = header + values.tobytes()
+        etag = '"' + hashlib.blake2b(payload, digest_size=12).hexdigest() + '"'
+        return payload, etag
+
+
+class HeatmapCache:
+    """
+    Least-recently-used HeatmapGrids keyed by HeatmapQuery.key().
+
+    get() refreshes a grid from the database when it is older than
+    `max_age` seconds; concurrent requests for the same key wait for one
+    refresh rather than each reading the new rows.
+    """
+
+    def __init__(self, extent, max_age=5.0, max_entries=64, rescan_ids=10000):
+        self.extent = extent
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.rescan_ids = rescan_ids
+        self._grids = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, query):
+        key = query.key()
+        with self._lock:
+            grid = self._grids.get(key)
+            if grid is None:
+                grid = self._grids[key] = HeatmapGrid(query.bins, self.extent)
+                while len(self._grids) > self.max_entries:
+                    self._grids.popitem(last=False)
+            else:
+                self._grids.move_to_end(key)
+            return grid
+
+    def get(self, query, connect, encoding=None):
+        """
+        (payload, etag) for the query, compressed with `encoding` if
+        given. `connect()` returns a database connection, called only
+        when the grid needs a refresh.
+        """
+        grid = self._entry(query)
+        with grid.lock:
+            now = time.monotonic()
+            if grid.refreshed is None or now - grid.refreshed >= self.max_age:
+                self._refresh(grid, query, connect)
+                grid.refreshed = now
+            return grid.body(query.format, encoding)
+
+    def _refresh(self, grid, query, connect):
+        # Rows arrive in no particular order, so they are binned into a
+        # delta that only lands once every row above the rescan floor is in
+        delta = HeatmapGrid(query.bins, self.extent)
+        conn = connect()
+        try:
+            cursor = conn.cursor(buffered=False)
+            cursor.execute(*query.sql(max(0, grid.watermark - self.rescan_ids)))
+            while True:
+                rows = cursor.fetchmany(FETCH_ROWS)
+                if not rows:
+                    break
+                delta.add(rows, seen=grid.recent, rescan_ids=self.rescan_ids)
+            cursor.close()
+        finally:
+            if conn.is_connected():
+                conn.close()
+        grid.merge(delta, self.rescan_ids)
+
+
+def etag_matches(header, etag):
+    """Whether an If-None-Match header value matches etag."""
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    tags = (tag.strip() for tag in header.split(','))
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return any(tag.removeprefix('W/') == etag.removeprefix('W/') for tag in tags)
@@ -0,0 +1,343 @@
+import bisect
+import functools
+import json
+import math
+import threading
+
+from backend.session_cache import SessionCache
+
+
+def score_value(value):
+    """
+    A client-sent score as a finite number, or None if it isn't one.
+    Numeric strings are converted, as the database does on write; NaN and
+    infinities are rejected because they break the sorted order.
+    """
+    if isinstance(value, bool):
+        return None
+    if not isinstance(value, (int, float)):
+        try:
+            value = float(value)
+        except (ValueError, TypeError):
+            return None
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            return None
+        if value.is_integer():
+            return int(value)
+    return value
+
+
+def update(method):
+    """
+    Mark a Leaderboard method as an update. While the board is being
+    rebuilt, updates are also journaled for the new board; once it has
+    been built they are forwarded to it.
+    """
+    @functools.wraps(method)
+    def apply(self, *args):
+        with self._journal_lock:
+            successor = self._successor
+            if successor is None and self._journal is not None:
+                self._journal.append((method.__name__, args))
+        if successor is not None:
+            return getattr(successor, method.__name__)(*args)
+        return method(self, *args)
+    return apply
+
+
+def parse_completion(meta):
+    """(level, time_seconds) from LEVEL_COMPLETE meta, or None if absent or invalid."""
+    try:
+        meta = json.loads(meta) if isinstance(meta, (str, bytes)) else meta
+        level = str(meta['level'])
+        seconds = score_value(meta['time_seconds'])
+    except (ValueError, TypeError, KeyError):
+        return None
+    if seconds is None:
+        return None
+    return level, seconds
+
+
+class RankedIndex:
+    """
+    Scores kept in rank order for one leaderboard category.
+
+    A sorted list of (sort key, user_id) tuples searched with bisect:
+    finding a user's rank or a top-N slice is O(log n), and moving a user
+    after a score change is one bisect plus a list memmove, which stays in
+    the microseconds well into hundreds of thousands of users.
+    """
+
+    def __init__(self, descending=True):
+        self.descending = descending
+        self._scores = {}
+        self._order = []
+        self._lock = threading.Lock()
+
+    def _key(self, user_id, score):
+        # Ties are broken by user_id so every rank is stable
+        return (-score if self.descending else score, user_id)
+
+    def _set(self, user_id, score):
+        old = self._scores.get(user_id)
+        if old is not None:
+            del self._order[bisect.bisect_left(self._order, self._key(user_id, old))]
+        self._scores[user_id] = score
+        bisect.insort(self._order, self._key(user_id, score))
+
+    def scores(self):
+        """A copy of {user_id: score}."""
+        with self._lock:
+            return dict(self._scores)
+
+    def replace(self, scores):
+        """Load {user_id: score} in one sort instead of n inserts."""
+        with self._lock:
+            self._scores = dict(scores)
+            self._order = sorted(self._key(user_id, score) for user_id, score in self._scores.items())
+
+    def set(self, user_id, score):
+        with self._lock:
+            self._set(user_id, score)
+
+    def improve(self, user_id, score):
+        """Keep the better of the current and new score (GREATEST / fastest)."""
+        with self._lock:
+            old = self._scores.get(user_id)
+            if old is None or (score > old if self.descending else score < old):
+                self._set(user_id, score)
+
+    def add(self, user_id, delta):
+        with self._lock:
+            self._set(user_id, self._scores.get(user_id, 0) + delta)
+
+    def __len__(self):
+        return len(self._order)
+
+    def top(self, n):
+        """[(rank, user_id, score)] for the best n users."""
+        with self._lock:
+            return [
+                (rank, user_id, self._scores[user_id])
+                for rank, (_, user_id) in enumerate(self._order[:n], start=1)
+            ]
+
+    def around(self, user_id, radius):
+        """
+        [(rank, user_id, score)] for `user_id` and up to `radius` users on
+        either side, or None if the user has no score in this category.
+        """
+        with self._lock:
+            score = self._scores.get(user_id)
+            if score is None:
+                return None
+            index = bisect.bisect_left(self._order, self._key(user_id, score))
+            start = max(0, index - radius)
+            return [
+                (rank, other, self._scores[other])
+                for rank, (_, other) in enumerate(self._order[start:index + radius + 1], start=start + 1)
+            ]
+
+
+class Leaderboard:
+    """
+    In-process ranked indexes for every leaderboard category, built from
+    the database at startup and updated as writes commit:
+
+        playtime     users.total_playtime (highest first)
+        deaths       PLAYER_DEATH events per user
+        completions  LEVEL_COMPLETE events per user
+        fastest      lowest LEVEL_COMPLETE time_seconds per user, per level
+
+    Events carry only a session_id. Users are looked up in `sessions`, a
+    SessionCache shared with the write paths; on a miss,
+    `resolve_sessions(session_ids)` must return {session_id: user_id}.
+
+    rebuild() reloads a new board to pick up other processes' writes.
+    Updates made while it loads are replayed into the new board, and
+    later ones are forwarded to it, so none are lost however late the
+    caller swaps it in. An update whose rows committed just before the
+    load read them, but which arrives just after, is counted twice.
+    """
+
+    CATEGORIES = ('playtime', 'deaths', 'completions', 'fastest')
+
+    def __init__(self, resolve_sessions, sessions=None, rescan_ids=10000):
+        self.resolve_sessions = resolve_sessions
+        self.rescan_ids = rescan_ids
+        self.playtime = RankedIndex()
+        self.deaths = RankedIndex()
+        self.completions = RankedIndex()
+        self.fastest = {}
+        # Highest LEVEL_COMPLETE event_id folded into `fastest`
+        self.completion_watermark = 0
+        self.usernames = {}
+        self.sessions = sessions if sessions is not None else SessionCache()
+        self._lock = threading.Lock()
+        self._journal_lock = threading.Lock()
+        self._journal = None
+        self._successor = None
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+    def load(self, cursor, previous=None):
+        """
+        Build every index from the database. Counts come from the
+        event_counts_by_session rollup. Completion times live in event
+        meta, so with a `previous` board only completions above its
+        watermark (less the rescan window) are read.
+        """
+        cursor.execute("SELECT user_id, username, total_playtime FROM users")
+        playtime = {}
+        for user_id, username, total_playtime in cursor.fetchall():
+            self.usernames[user_id] = username
+            playtime[user_id] = score_value(total_playtime) or 0
+        self.playtime.replace(playtime)
+
+        self.deaths.replace(self._counts_by_user(cursor, 'PLAYER_DEATH'))
+        self.completions.replace(self._counts_by_user(cursor, 'LEVEL_COMPLETE'))
+
+        fastest = {}
+        floor = 0
+        if previous is not None:
+            with previous._lock:
+                indexes = dict(previous.fastest)
+            fastest = {level: index.scores() for level, index in indexes.items()}
+            self.completion_watermark = previous.completion_watermark
+            floor = max(0, previous.completion_watermark - self.rescan_ids)
+        # Times are parsed here rather than in backend-specific JSON SQL
+        cursor.execute("""
+            SELECT e.event_id, s.user_id, e.meta_data FROM events e
+            JOIN sessions s ON s.session_id = e.session_id
+            WHERE e.event_type = 'LEVEL_COMPLETE' AND e.event_id > %s
+        """, (floor,))
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for event_id, user_id, meta in rows:
+                self.completion_watermark = max(self.completion_watermark, event_id)
+                completion = parse_completion(meta)
+                if completion:
+                    level, seconds = completion
+                    times = fastest.setdefault(level, {})
+                    if user_id not in times or seconds < times[user_id]:
+                        times[user_id] = seconds
+        for level, times in fastest.items():
+            self.fastest[level] = RankedIndex(descending=False)
+            self.fastest[level].replace(times)
+
+    @staticmethod
+    def _counts_by_user(cursor, event_type):
+        cursor.execute("""
+            SELECT s.user_id, SUM(r.event_count) FROM event_counts_by_session r
+            JOIN sessions s ON s.session_id = r.session_id
+            WHERE r.event_type = %s
+            GROUP BY s.user_id
+        """, (event_type,))
+        return {user_id: int(count) for user_id, count in cursor.fetchall()}
+
+    def rebuild(self, cursor):
+        """
+        A new board loaded from the database, which receives every update
+        made to this one from now on.
+        """
+        fresh = Leaderboard(self.resolve_sessions, self.sessions, self.rescan_ids)
+        with self._journal_lock:
+            self._journal = []
+        try:
+            fresh.load(cursor, previous=self)
+        finally:
+            with self._journal_lock:
+                journal, self._journal = self._journal, None
+        with self._journal_lock:
+            self._successor = fresh
+        for name, args in journal:
+            getattr(fresh, name)(*args)
+        return fresh
+
+    # ------------------------------------------------------------------
+    # Updates (call after the matching write commits)
+    # ------------------------------------------------------------------
+    @update
+    def user_registered(self, user_id, username):
+        self._register(user_id, username)
+
+    def _register(self, user_id, username):
+        self.usernames.setdefault(user_id, username)
+        self.playtime.improve(user_id, 0)
+
+    @update
+    def session_started(self, session_id, user_id, total_playtime=None):
+        self.sessions.remember_session(session_id, user_id)
+        self._register(user_id, 'Player')
+        total_playtime = score_value(total_playtime)
+        if total_playtime is not None:
+            self.playtime.improve(user_id, total_playtime)
+
+    @update
+    def session_ended(self, session_id, total_playtime=None):
+        total_playtime = score_value(total_playtime)
+        user_id = self.sessions.user_for(session_id)
+        if user_id is None and total_playtime is not None:
+            user_id = self.resolve_sessions([session_id]).get(session_id)
+        if user_id is not None and total_playtime is not None:
+            self.playtime.improve(user_id, total_playtime)
+
+    @update
+    def playtime_synced(self, user_id, total_playtime):
+        total_playtime = score_value(total_playtime)
+        if total_playtime is not None:
+            self.playtime.improve(user_id, total_playtime)
+
+    @update
+    def events_recorded(self, rows):
+        """Count deaths and completions from committed event rows."""
+        ranked = [row for row in rows if row[1] in ('PLAYER_DEATH', 'LEVEL_COMPLETE')]
+        if not ranked:
+            return
+        users = {row[0]: self.sessions.user_for(row[0]) for row in ranked}
+        missing = [session_id for session_id, user_id in users.items() if user_id is None]
+        if missing:
+            for session_id, user_id in self.resolve_sessions(missing).items():
+                users[session_id] = user_id
+                self.sessions.remember_session(session_id, user_id)
+        for session_id, event_type, _, _, _, meta in ranked:
+            user_id = users.get(session_id)
+            if user_id is None:
+                continue
+            if event_type == 'PLAYER_DEATH':
+                self.deaths.add(user_id, 1)
+            else:
+                self._record_completion(user_id, meta)
+
+    def _record_completion(self, user_id, meta):
+        self.completions.add(user_id, 1)
+        completion = parse_completion(meta)
+        if not completion:
+            return
+        level, seconds = completion
+        with self._lock:
+            index = self.fastest.get(level)
+            if index is None:
+                index = self.fastest[level] = RankedIndex(descending=False)
+        index.improve(user_id, seconds)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def index(self, category, level=None):
+        """The RankedIndex for a category, or None for an unknown one."""
+        if category == 'fastest':
+            return self.fastest.get(level, RankedIndex(descending=False))
+        if category in self.CATEGORIES:
+            return getattr(self, category)
+        return None
+
+    def describe(self, entries):
+        return [
+            {"rank": rank, "user_id": user_id, "username": self.usernames.get(user_id), "score": score}
+            for rank, user_id, score in entries
+        ]
@@ -0,0 +1,298 @@
+"""
+Request and database metrics for `GET /metrics` (Prometheus text format).
+
+Every thread records into its own shard: flat, pre-allocated lists of
+counters and histogram buckets that only that thread writes. Recording
+a request is a handful of list increments with no lock and no
+allocation; a scrape sums the shards. Both engines serve requests from
+fixed thread pools, so there are only a few shards. The shard of any
+thread that exits, such as a stopped background thread, is folded into
+a retired total at scrape time, so memory stays bounded.
+
+Metrics are per process. With --workers each scrape reaches one worker.
+"""
+import bisect
+import re
+import threading
+import time
+
+# Latency buckets in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+ROUTES = ('/event', '/events/batch', '/ingest', '/session/start', '/session/end', '/save/upload',
+          '/user/register', '/health', '/events', '/stats', '/leaderboard', '/heatmap', '/metrics', 'other')
+
+STATUS_CLASSES = ('2xx', '3xx', '4xx', '5xx')
+
+# Statement label: verb plus the table it touches
+STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'other')
+TABLES = ('events', 'sessions', 'users', 'save_files', 'heatmap_bins', 'rollups', 'other')
+_STATEMENT = re.compile(r"\s*(?:(UPDATE)\s+|(\w+)\b.*?\b(?:FROM|INTO)\s+)`?(\w+)", re.IGNORECASE | re.DOTALL)
+
+
+def route_label(path):
+    """The ROUTES entry for a request path (query string ignored)."""
+    path = path.split('?', 1)[0]
+    if path in ROUTES:
+        return path
+    if path.startswith('/leaderboard'):
+        return '/leaderboard'
+    return 'other'
+
+
+def statement_label(sql):
+    """(verb, table) for a SQL statement, both from a fixed vocabulary."""
+    match = _STATEMENT.match(sql[:300])
+    if not match:
+        return 'other', 'other'
+    verb = (match.group(1) or match.group(2)).upper()
+    table = match.group(3).lower()
+    if verb not in STATEMENTS:
+        verb = 'other'
+    if table.startswith('event_counts_'):
+        table = 'rollups'
+    elif table not in TABLES:
+        table = 'other'
+    return verb, table
+
+
+class Histogram:
+    """Layout of one histogram family inside a shard's value list."""
+
+    def __init__(self, offset, labels):
+        # Per label set: len(BUCKETS) + 1 bucket counts, then sum and count
+        self.width = len(BUCKETS) + 3
+        self.size = self.width * len(labels)
+        self.index = {label: offset + i * self.width for i, label in enumerate(labels)}
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards = []
+        size = 0
+
+        def counter(labels):
+            nonlocal size
+            index = {label: size + i for i, label in enumerate(labels)}
+            size += len(labels)
+            return index
+
+        def histogram(labels):
+            nonlocal size
+            family = Histogram(size, labels)
+            size += family.size
+            return family
+
+        self.requests = counter([(route, status) for route in ROUTES for status in STATUS_CLASSES])
+        self.errors = counter(ROUTES)
+        self.bytes_in = counter(ROUTES)
+        self.bytes_out = counter(ROUTES)
+        self.in_flight = counter([None])
+        self.latency = histogram(ROUTES)
+        self.pool_wait = histogram([None])
+        self.execute = histogram([(verb, table) for verb in STATEMENTS for table in TABLES])
+        self.commit = histogram([None])
+        self.size = size
+        self._retired = [0] * size
+
+    def _shard(self):
+        shard = getattr(self._local, 'values', None)
+        if shard is None:
+            shard = self._local.values = [0] * self.size
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    @staticmethod
+    def _observe(shard, start, seconds):
+        shard[start + bisect.bisect_left(BUCKETS, seconds)] += 1
+        end = start + len(BUCKETS) + 1
+        shard[end] += seconds
+        shard[end + 1] += 1
+
+    # ------------------------------------------------------------------
+    # Recording (called on the hot path)
+    # ------------------------------------------------------------------
+    def request_started(self):
+        self._shard()[self.in_flight[None]] += 1
+
+    def request_finished(self, route, status, seconds, bytes_in, bytes_out):
+        shard = self._shard()
+        shard[self.in_flight[None]] -= 1
+        status_class = f"{min(max(status // 100, 2), 5)}xx"
+        shard[self.requests[(route, status_class)]] += 1
+        if status >= 500:
+            shard[self.errors[route]] += 1
+        shard[self.bytes_in[route]] += bytes_in
+        shard[self.bytes_out[route]] += bytes_out
+        self._observe(shard, self.latency.index[route], seconds)
+
+    def observe_pool_wait(self, seconds):
+        self._observe(self._shard(), self.pool_wait.index[None], seconds)
+
+    def observe_execute(self, sql, seconds):
+        self._observe(self._shard(), self.execute.index[statement_label(sql)], seconds)
+
+    def observe_commit(self, seconds):
+        self._observe(self._shard(), self.commit.index[None], seconds)
+
+    # ------------------------------------------------------------------
+    # Scraping
+    # ------------------------------------------------------------------
+    def totals(self):
+        """Sum of every shard, folding in those of exited threads."""
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    self._retired = [a + b for a, b in zip(self._retired, shard)]
+            self._shards = live
+            totals = list(self._retired)
+            for _, shard in live:
+                totals = [a + b for a, b in zip(totals, shard)]
+        return totals
+
+    def render(self):
+        """Prometheus text exposition of every metric."""
+        totals = self.totals()
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def labels(**pairs):
+            return "{" + ",".join(f'{key}="{value}"' for key, value in pairs.items()) + "}" if pairs else ""
+
+        def histogram(name, layout, label_names):
+            for label, start in layout.index.items():
+                end = start + len(BUCKETS) + 1
+                if label_names and not totals[end + 1]:
+                    continue
+                values = label if isinstance(label, tuple) else (label,)
+                pairs = dict(zip(label_names, values))
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), totals[start:start + len(BUCKETS) + 1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{labels(**pairs, le=bound)} {cumulative}")
+                lines.append(f"{name}_sum{labels(**pairs)} {totals[end]:.6f}")
+                lines.append(f"{name}_count{labels(**pairs)} {totals[end + 1]}")
+
+        family("overseer_http_requests_total", "counter", "Requests by route and status class.")
+        for (route, status), index in self.requests.items():
+            if totals[index]:
+                lines.append(f"overseer_http_requests_total{labels(route=route, status=status)} {totals[index]}")
+
+        family("overseer_http_errors_total", "counter", "Requests answered with a 5xx status, by route.")
+        for route, index in self.errors.items():
+            lines.append(f"overseer_http_errors_total{labels(route=route)} {totals[index]}")
+
+        family("overseer_http_request_duration_seconds", "histogram", "Time from routing to the last byte written.")
+        histogram("overseer_http_request_duration_seconds", self.latency, ('route',))
+
+        family("overseer_http_request_bytes_total", "counter", "Request body bytes received, by route.")
+        for route, index in self.bytes_in.items():
+            lines.append(f"overseer_http_request_bytes_total{labels(route=route)} {totals[index]}")
+
+        family("overseer_http_response_bytes_total", "counter", "Response bytes sent (headers and body), by route.")
+        for route, index in self.bytes_out.items():
+            lines.append(f"overseer_http_response_bytes_total{labels(route=route)} {totals[index]}")
+
+        family("overseer_http_requests_in_flight", "gauge", "Requests being handled right now.")
+        lines.append(f"overseer_http_requests_in_flight {totals[self.in_flight[None]]}")
+
+        family("overseer_threads", "gauge", "Live threads in this process.")
+        lines.append(f"overseer_threads {threading.active_count()}")
+
+        family("overseer_db_pool_wait_seconds", "histogram", "Time spent getting a connection from the pool.")
+        histogram("overseer_db_pool_wait_seconds", self.pool_wait, ())
+
+        family("overseer_db_execute_seconds", "histogram", "Statement execute time by verb and table.")
+        histogram("overseer_db_execute_seconds", self.execute, ('statement', 'table'))
+
+        family("overseer_db_commit_seconds", "histogram", "Commit time.")
+        histogram("overseer_db_commit_seconds", self.commit, ())
+
+        return "\n".join(lines) + "\n"
+
+
+class CountingWriter:
+    """File-like wrapper that counts the bytes written through it."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.count = 0
+
+    def write(self, data):
+        self.count += len(data)
+        return self.raw.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+class InstrumentedPool:
+    """Wraps a connection pool so checkouts, executes and commits are timed."""
+
+    def __init__(self, pool, metrics):
+        self._pool = pool
+        self._metrics = metrics
+
+    def get_connection(self):
+        started = time.perf_counter()
+        try:
+            return InstrumentedConnection(self._pool.get_connection(), self._metrics)
+        finally:
+            self._metrics.observe_pool_wait(time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+
+class InstrumentedConnection:
+    def __init__(self, conn, metrics):
+        self._conn = conn
+        self._metrics = metrics
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._metrics)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            self._conn.commit()
+        finally:
+            self._metrics.observe_commit(time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor, metrics):
+        self._cursor = cursor
+        self._metrics = metrics
+
+    def execute(self, operation, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, *args, **kwargs)
+        finally:
+            self._metrics.observe_execute(operation, time.perf_counter() - started)
+
+    def executemany(self, operation, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, *args, **kwargs)
+        finally:
+            self._metrics.observe_execute(operation, time.perf_counter() - started)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
@@ -0,0 +1,188 @@
+"""
+Queued, sampled logging for the request and ingest paths.
+
+Handlers call info()/warning()/... with a category, a %-style message
+and its arguments. The call checks the category's level, then puts an
+unformatted record on a queue.SimpleQueue (a C-level queue: no Python
+lock, no I/O). A background thread formats records and writes them in
+batches, so a handler never waits on stdout.
+
+Categories:
+
+    request   one line per HTTP request
+    event     per-event and per-batch ingest lines
+    session   users, sessions and saves
+    storage   database, spool and buffer trouble
+    server    startup, shutdown and background services
+
+`request` and `event` lines are sampled: past `sample_per_second` lines
+in a second, the rest are counted and reported as one "suppressed" line
+once the second is over. Errors are never sampled.
+
+Until start() is called (and after stop()), records are written
+synchronously from the calling thread, so startup output and forked
+supervisors behave like plain print.
+"""
+import json
+import queue
+import sys
+import threading
+import time
+
+LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40, 'off': 100}
+
+CATEGORIES = ('request', 'event', 'session', 'storage', 'server')
+SAMPLED = ('request', 'event')
+
+# Records written per batch by the background thread
+WRITE_BATCH = 1000
+
+
+def parse_levels(spec):
+    """{category: level} from "request=warning,event=info". Raises ValueError."""
+    levels = {}
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        category, _, level = item.partition('=')
+        category, level = category.strip(), level.strip().lower()
+        if category not in CATEGORIES:
+            raise ValueError(f"Unknown log category: {category}")
+        if level not in LEVELS:
+            raise ValueError(f"Unknown log level: {level}")
+        levels[category] = level
+    return levels
+
+
+class OverseerLog:
+    def __init__(self, stream=None, level='info', levels=None, sample_per_second=0, fmt='text'):
+        self.stream = stream
+        self.configure(level, levels, sample_per_second, fmt)
+        self._queue = None
+        self._thread = None
+        self._write_lock = threading.Lock()
+        # category -> [second, lines written, lines suppressed]
+        self._windows = {category: [0, 0, 0] for category in SAMPLED}
+
+    def configure(self, level='info', levels=None, sample_per_second=0, fmt='text'):
+        if fmt not in ('text', 'json'):
+            raise ValueError("log format must be text or json")
+        if level not in LEVELS:
+            raise ValueError(f"Unknown log level: {level}")
+        thresholds = {category: LEVELS[level] for category in CATEGORIES}
+        thresholds.update({category: LEVELS[name] for category, name in (levels or {}).items()})
+        self._thresholds = thresholds
+        self.sample_per_second = sample_per_second
+        self.format = fmt
+
+    def enabled(self, category, level):
+        return LEVELS[level] >= self._thresholds[category]
+
+    def log(self, category, level, message, *args):
+        if LEVELS[level] < self._thresholds[category]:
+            return
+        record = (time.time(), category, level, message, args)
+        pending = self._queue
+        if pending is not None:
+            pending.put(record)
+        else:
+            with self._write_lock:
+                self._write([record])
+
+    def debug(self, category, message, *args):
+        self.log(category, 'debug', message, *args)
+
+    def info(self, category, message, *args):
+        self.log(category, 'info', message, *args)
+
+    def warning(self, category, message, *args):
+        self.log(category, 'warning', message, *args)
+
+    def error(self, category, message, *args):
+        self.log(category, 'error', message, *args)
+
+    def start(self):
+        """Move writing to a background thread."""
+        if self._thread:
+            return
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, args=(self._queue,), name="overseer-log", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Write everything queued so far, then go back to synchronous writes."""
+        if not self._thread:
+            return
+        pending, self._queue = self._queue, None
+        pending.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self, pending):
+        while True:
+            try:
+                batch = [pending.get(timeout=1.0)]
+            except queue.Empty:
+                # Quiet spell: report lines suppressed in the last busy second
+                with self._write_lock:
+                    self._write([])
+                continue
+            try:
+                while len(batch) < WRITE_BATCH:
+                    batch.append(pending.get_nowait())
+            except queue.Empty:
+                pass
+            stopping = batch[-1] is None
+            with self._write_lock:
+                self._write([record for record in batch if record is not None])
+            if stopping:
+                return
+
+    def _write(self, records):
+        lines = []
+        for record in records:
+            created, category, level, _, _ = record
+            if category in SAMPLED and level != 'error' and self.sample_per_second:
+                window = self._windows[category]
+                second = int(created)
+                if second != window[0]:
+                    self._report_suppressed(category, lines)
+                    window[:] = [second, 0, 0]
+                if window[1] >= self.sample_per_second:
+                    window[2] += 1
+                    continue
+                window[1] += 1
+            lines.append(self._format(record))
+        now = int(time.time())
+        for category, window in self._windows.items():
+            if window[0] < now:
+                self._report_suppressed(category, lines)
+        if lines:
+            stream = self.stream or sys.stdout
+            try:
+                stream.write("".join(lines))
+                stream.flush()
+            except (OSError, ValueError):
+                pass
+
+    def _report_suppressed(self, category, lines):
+        second, _, suppressed = self._windows[category]
+        if suppressed:
+            self._windows[category][2] = 0
+            lines.append(self._format((second, category, 'info', "Suppressed %d %s log lines at %s",
+                                       (suppressed, category, time.strftime('%H:%M:%S', time.localtime(second))))))
+
+    def _format(self, record):
+        created, category, level, message, args = record
+        try:
+            text = message % args if args else message
+        except (TypeError, ValueError):
+            text = f"{message} {args!r}"
+        if self.format == 'json':
+            return json.dumps({"time": round(created, 3), "category": category,
+                               "level": level, "message": text}) + "\n"
+        if category == 'request':
+            return f"[{time.strftime('%H:%M:%S', time.localtime(created))}] {text}\n"
+        return f"[OVERSEER] {text}\n"
+
+
+# Process-wide log used by the server modules
+log = OverseerLog()
@@ -1,19 +1,44 @@
 import http.server
 import socketserver
+import asyncio
+import argparse
 import json
-import mysql.connector
-from mysql.connector import Error, pooling
 import time
+import math
 import os
 import sys
+import signal
+import socket
+import threading
+import queue
 from urllib.parse import urlparse, parse_qs
 
 # Import shared configuration from the project root
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import var
+from database import storage, migrations, rollups
+from database.storage import Error, SQL
+from database.segments import SegmentWriter
+from database import grids
+from backend.event_buffer import EventBuffer
+from backend.spool import Spool, DatabaseHealth
+from backend.event_query import EventQuery
+from backend.leaderboard import Leaderboard, score_value
+from backend.session_cache import SessionCache
+from backend.heatmap import HeatmapQuery, HeatmapCache, etag_matches
+from backend import binary_batch, compression
+from backend.overseer_log import log, parse_levels
+from backend.metrics import Metrics, InstrumentedPool, CountingWriter, route_label
+from backend.async_engine import AsyncExchange, AsyncHTTPEngine
 
 PORT = var.SERVER_PORT
 
+# Selectable HTTP engines (see run_server)
+SERVER_MODES = ('threaded', 'async')
+
+# Seconds to wait before restarting a worker that died right after starting
+WORKER_RESTART_BACKOFF = 1.0
+
 # ============================================================================
 # EVENT TYPES - The Vocabulary of Suffering
 # ============================================================================
@@ -36,96 +61,44 @@ VALID_EVENT_TYPES = [
     EventType.DAMAGE_TAKEN
 ]
 
-# Database Configuration from common var.py
-DB_CONFIG = {
-    'host': var.DB_HOST,
-    'database': var.DB_NAME,
-    'user': var.DB_USER,
-    'password': var.DB_PASSWORD,
-    'pool_name': 'telemetry_pool',
-    'pool_size': 5
-}
+# Upper bound on events accepted by a single POST /events/batch
+MAX_BATCH_EVENTS = 500
+
+# Rows fetched per round trip while streaming an NDJSON export
+STREAM_BATCH_ROWS = 1000
 
-# Config without database for initial setup
-DB_CONFIG_NO_DB = var.DB_CONFIG_NO_DB
+# Leaderboard page sizes
+LEADERBOARD_DEFAULT_SIZE = 20
+LEADERBOARD_MAX_SIZE = 100
+
+EVENT_COLUMNS = "(session_id, event_type, x_coord, y_coord, timestamp, meta_data)"
 
 db_pool = None
+event_buffer = None
+segment_writer = None
+spool = None
+db_health = None
+leaderboard = None
+leaderboard_stop = threading.Event()
+partition_stop = threading.Event()
+grid_accumulator = None
+heatmap_cache = None
+metrics = Metrics() if var.METRICS_ENABLED else None
+# session -> user and known users, filled as writes commit
+session_cache = SessionCache(var.SESSION_CACHE_SESSIONS, var.SESSION_CACHE_USERS)
 
 def initialize_database():
     """Forge the database and tables if they don't exist."""
     conn = None
     try:
-        # Connect without specifying database first
-        conn = mysql.connector.connect(**DB_CONFIG_NO_DB)
-        cursor = conn.cursor()
-        
-        # Create database
-        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {DB_CONFIG['database']}")
-        cursor.execute(f"USE {DB_CONFIG['database']}")
-        
-        # Create Users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id VARCHAR(255) PRIMARY KEY,
-                username VARCHAR(255),
-                total_playtime INT DEFAULT 0,
-                created_at BIGINT
-            )
-        """)
-        
-        # Create Sessions table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sessions (
-                session_id VARCHAR(255) PRIMARY KEY,
-                user_id VARCHAR(255),
-                start_time BIGINT,
-                end_time BIGINT,
-                duration_seconds INT DEFAULT 0,
-                os_info TEXT,
-                FOREIGN KEY(user_id) REFERENCES users(user_id)
-            )
-        """)
-
-        # Migration: Add duration_seconds to sessions if it doesn't exist
-        try:
-            cursor.execute("ALTER TABLE sessions ADD COLUMN IF NOT EXISTS duration_seconds INT DEFAULT 0")
-        except:
-            pass # MySQL 8.0.19+ supports ADD COLUMN IF NOT EXISTS, older might not
-
-        # Migration: Add total_playtime to users if it doesn't exist
-        try:
-            cursor.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS total_playtime INT DEFAULT 0")
-        except:
-            pass
-
-        # Create Events table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS events (
-                event_id INT AUTO_INCREMENT PRIMARY KEY,
-                session_id VARCHAR(255),
-                event_type VARCHAR(50),
-                x_coord FLOAT,
-                y_coord FLOAT,
-                timestamp BIGINT,
-                meta_data JSON,
-                FOREIGN KEY(session_id) REFERENCES sessions(session_id)
-            )
-        """)
-        
-        # Create Save Files table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS save_files (
-                save_id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id VARCHAR(255),
-                level_data JSON,
-                inventory_data JSON,
-                updated_at BIGINT,
-                FOREIGN KEY(user_id) REFERENCES users(user_id)
-            )
-        """)
-        
-        conn.commit()
-        cursor.close()
+        # Creates the MySQL database (or SQLite file) first if needed
+        conn = storage.connect(create=True)
+        applied = migrations.migrate(conn)
+        if applied:
+            print(f"[OVERSEER] Applied schema migrations: {', '.join(map(str, applied))}")
+        added = migrations.ensure_partitions(conn)
+        if added:
+            print(f"[OVERSEER] Added event partitions: {', '.join(added)}")
         print("[OVERSEER] Database forged successfully.")
         return True
         
@@ -140,7 +113,9 @@ def create_connection_pool():
     """Create the connection pool after DB is initialized."""
     global db_pool
     try:
-        db_pool = mysql.connector.pooling.MySQLConnectionPool(**DB_CONFIG)
+        db_pool = storage.create_pool()
+        if metrics:
+            db_pool = InstrumentedPool(db_pool, metrics)
         print("[OVERSEER] Connection pool created.")
         return True
     except Error as e:
@@ -148,26 +123,760 @@ def create_connection_pool():
         return False
 
 
-class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+def parse_event(data, timestamp):
+    """
+    Validate a single event payload and turn it into an `events` row.
+    
+    Returns (row, None) on success or (None, error_message) when the
+    payload cannot be recorded.
+    """
+    if not isinstance(data, dict):
+        return None, "event must be a JSON object"
+    
+    session_id = data.get('session_id')
+    event_type = data.get('event_type')
+    
+    if not session_id or not event_type:
+        return None, "session_id and event_type required"
+    
+    try:
+        x_coord = float(data.get('x', 0.0))
+        y_coord = float(data.get('y', 0.0))
+    except (TypeError, ValueError):
+        return None, "x and y must be numbers"
+    
+    if not (math.isfinite(x_coord) and math.isfinite(y_coord)):
+        return None, "x and y must be finite"
+    
+    # Validate event type
+    if event_type not in VALID_EVENT_TYPES:
+        log.warning('event', "Warning: Unknown event type '%s' - recording anyway", event_type)
+    
+    row = (
+        session_id,
+        event_type,
+        x_coord,
+        y_coord,
+        timestamp,
+        json.dumps(data.get('meta', {}))
+    )
+    return row, None
+
+
+def insert_events(cursor, rows):
+    """
+    Write event rows with one multi-row INSERT statement and add them to
+    the rollups in the same transaction.
+    """
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(rows))
+    params = [value for row in rows for value in row]
+    cursor.execute(f"INSERT INTO events {EVENT_COLUMNS} VALUES {placeholders}", params)
+    rollups.apply(cursor, rows)
+
+
+def write_event_rows(rows):
+    """Write a group of event rows in one transaction. Raises on DB errors."""
+    conn = None
+    try:
+        conn = db_pool.get_connection()
+        cursor = conn.cursor()
+        insert_events(cursor, rows)
+        conn.commit()
+        cursor.close()
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+    
+    events_committed(rows)
+
+
+def events_committed(rows):
+    """Feed committed event rows to the columnar copy and the leaderboard."""
+    if segment_writer:
+        try:
+            segment_writer.append(rows)
+        except OSError as e:
+            log.error('storage', "Segment write failed: %s", e)
+    # The rows are committed: a failing in-memory update must not fail
+    # the request or make the spool replay them
+    try:
+        if grid_accumulator:
+            grid_accumulator.add(rows)
+        if leaderboard:
+            leaderboard.events_recorded(rows)
+    except Exception as e:
+        log.error('storage', "Post-commit update failed for %d events: %s", len(rows), e)
+
+
+def lookup_session_users(session_ids):
+    """{session_id: user_id} for the given sessions (empty on DB errors)."""
+    conn = None
+    try:
+        conn = db_pool.get_connection()
+        cursor = conn.cursor()
+        placeholders = ", ".join(["%s"] * len(session_ids))
+        cursor.execute(f"SELECT session_id, user_id FROM sessions WHERE session_id IN ({placeholders})",
+                       tuple(session_ids))
+        users = dict(cursor.fetchall())
+        cursor.close()
+        return users
+    except Error as e:
+        log.error('storage', "Session lookup failed: %s", e)
+        return {}
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
+
+def refresh_leaderboard():
+    """
+    Rebuild the leaderboard index from the database and swap it in.
+    Picks up writes made by other worker processes and spool replays.
+    """
+    global leaderboard
+    conn = None
+    try:
+        conn = storage.connect()
+        cursor = conn.cursor()
+        if leaderboard is None:
+            fresh = Leaderboard(lookup_session_users, sessions=session_cache, rescan_ids=var.EVENT_RESCAN_IDS)
+            fresh.load(cursor)
+        else:
+            fresh = leaderboard.rebuild(cursor)
+        cursor.close()
+        leaderboard = fresh
+        return True
+    except Error as e:
+        log.error('storage', "Leaderboard load failed: %s", e)
+        return False
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
+
+def write_grid_deltas(deltas):
+    """Checkpoint callback: add binned counts to heatmap_bins."""
+    conn = None
+    try:
+        conn = db_pool.get_connection()
+        cursor = conn.cursor()
+        grids.write_deltas(cursor, deltas)
+        conn.commit()
+        cursor.close()
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
+
+def grid_checkpoint_failed(error):
+    log.warning('storage', "Heatmap grid checkpoint failed, will retry: %s", error)
+
+
+def create_grid_accumulator():
+    """Bin committed events into heatmap grids if enabled in var.py."""
+    global grid_accumulator
+    if not var.HEATMAP_GRID_ENABLED:
+        return
+    grid_accumulator = grids.GridAccumulator(on_error=grid_checkpoint_failed)
+    grid_accumulator.start(write_grid_deltas, var.HEATMAP_GRID_CHECKPOINT_SECONDS)
+
+
+def create_heatmap_cache():
+    """In-memory grids behind GET /heatmap."""
+    global heatmap_cache
+    heatmap_cache = HeatmapCache(
+        (var.HEATMAP_GRID_WIDTH, var.HEATMAP_GRID_HEIGHT),
+        max_age=var.HEATMAP_CACHE_SECONDS,
+        max_entries=var.HEATMAP_CACHE_ENTRIES,
+        rescan_ids=var.EVENT_RESCAN_IDS
+    )
+
+
+def add_partitions():
+    """Add any monthly event partitions that are due (MySQL)."""
+    conn = None
+    try:
+        conn = storage.connect()
+        added = migrations.ensure_partitions(conn)
+        if added:
+            log.info('storage', "Added event partitions: %s", ", ".join(added))
+    except Error as e:
+        log.error('storage', "Adding event partitions failed: %s", e)
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
+
+def create_partition_maintainer():
+    """Keep monthly event partitions ahead of the clock in the background."""
+    partition_stop.clear()
+    interval = var.PARTITION_CHECK_HOURS * 3600
+    if interval <= 0 or storage.BACKEND == 'sqlite':
+        return
+    def check_loop():
+        while not partition_stop.wait(interval):
+            add_partitions()
+    threading.Thread(target=check_loop, name="partition-check", daemon=True).start()
+
+
+def create_leaderboard():
+    """Load the leaderboard index and keep it fresh in the background."""
+    leaderboard_stop.clear()
+    if refresh_leaderboard():
+        log.info('server', "Leaderboard loaded (%d players)", len(leaderboard.playtime))
+    interval = var.LEADERBOARD_REFRESH_SECONDS
+    if interval > 0:
+        def refresh_loop():
+            while not leaderboard_stop.wait(interval):
+                refresh_leaderboard()
+        threading.Thread(target=refresh_loop, name="leaderboard-refresh", daemon=True).start()
+
+
+def create_event_buffer():
+    """Start the write-behind buffer if it is enabled in var.py."""
+    global event_buffer
+    if not var.EVENT_BUFFER_ENABLED:
+        return
+    event_buffer = EventBuffer(
+        flush_buffered_events,
+        capacity=var.EVENT_BUFFER_CAPACITY,
+        batch_size=var.EVENT_FLUSH_BATCH_SIZE,
+        flush_interval=var.EVENT_FLUSH_INTERVAL_MS / 1000,
+        workers=var.EVENT_FLUSHER_THREADS
+    )
+    event_buffer.start()
+    log.info('server', "Event buffer started (%d events, %d flusher(s)).",
+             var.EVENT_BUFFER_CAPACITY, var.EVENT_FLUSHER_THREADS)
+
+
+def create_segment_writer():
+    """Open the columnar segment store if it is enabled in var.py."""
+    global segment_writer
+    if not var.SEGMENT_STORE_ENABLED:
+        return
+    segment_writer = SegmentWriter(var.SEGMENT_DIR, segment_rows=var.SEGMENT_ROWS)
+    log.info('server', "Writing event segments to %s", var.SEGMENT_DIR)
+
+
+def create_spool():
+    """Open the on-disk spool and start its replayer if enabled in var.py."""
+    global spool, db_health
+    if not var.SPOOL_ENABLED:
+        return
+    db_health = DatabaseHealth(
+        latency_threshold=var.SPOOL_LATENCY_THRESHOLD_MS / 1000,
+        cooldown=var.SPOOL_COOLDOWN_SECONDS
+    )
+    spool = Spool(var.SPOOL_DIR, is_transient=storage.is_transient)
+    spool.start_replayer(replay_spooled_writes, db_health, interval=var.SPOOL_REPLAY_INTERVAL_SECONDS)
+    log.info('server', "Spooling to %s when the database is unavailable", var.SPOOL_DIR)
+
+
+def configure_logging():
+    """Apply the LOG_* settings from var.py. Returns False if they are invalid."""
+    try:
+        log.configure(var.LOG_LEVEL, parse_levels(var.LOG_LEVELS),
+                      var.LOG_SAMPLE_PER_SECOND, var.LOG_FORMAT)
+        return True
+    except ValueError as e:
+        print(f"[OVERSEER] Invalid logging settings: {e}")
+        return False
+
+
+def start_background_services(maintain_partitions=True):
+    """
+    Per-process state that must be created after any fork. Only one
+    process needs to maintain partitions.
+    """
+    if var.LOG_ASYNC:
+        log.start()
+    if maintain_partitions:
+        create_partition_maintainer()
+    create_segment_writer()
+    create_grid_accumulator()
+    create_heatmap_cache()
+    create_leaderboard()
+    create_spool()
+    create_event_buffer()
+
+
+def stop_background_services():
+    """Flush buffered events, then close the stores they feed."""
+    leaderboard_stop.set()
+    partition_stop.set()
+    if event_buffer:
+        event_buffer.stop()
+    if spool:
+        spool.close()
+    if grid_accumulator:
+        grid_accumulator.stop(write_grid_deltas)
+    if segment_writer:
+        segment_writer.close()
+    log.stop()
+
+
+# ============================================================================
+# WRITES - Shared by request handlers and spool replay
+# ============================================================================
+def playtime_is_current(user_id, total_playtime):
+    """Whether the stored total_playtime is known to be at least total_playtime already."""
+    known = session_cache.known_playtime(user_id)
+    if known is None or not isinstance(total_playtime, (int, float)):
+        return False
+    return total_playtime <= known
+
+
+def apply_session_start(cursor, data, timestamp):
+    """Ensure the user exists, sync playtime, and create the session."""
+    user_id = data['user_id']
+    starting_total_playtime = score_value(data.get('starting_total_playtime'))
+    
+    # Ensure user exists first (skipped for users already seen)
+    if session_cache.known_playtime(user_id) is None:
+        cursor.execute(f"""
+            {SQL.insert_ignore} INTO users (user_id, username, created_at)
+            VALUES (%s, %s, %s)
+        """, (user_id, 'Player', timestamp))
+    
+    # Sync starting playtime if provided (cloud sync logic)
+    if starting_total_playtime is not None and not playtime_is_current(user_id, starting_total_playtime):
+        cursor.execute(f"""
+            UPDATE users SET total_playtime = {SQL.greatest}(total_playtime, %s)
+            WHERE user_id = %s
+        """, (starting_total_playtime, user_id))
+    
+    # Create session
+    cursor.execute("""
+        INSERT INTO sessions (session_id, user_id, start_time, os_info)
+        VALUES (%s, %s, %s, %s)
+    """, (data['session_id'], user_id, timestamp, data.get('os_info', 'Unknown')))
+
+
+def apply_session_end(cursor, data, timestamp):
+    """Close the session and sync the user's total playtime."""
+    session_id = data['session_id']
+    playtime_seconds = data.get('playtime_seconds', 0)
+    total_playtime_seconds = score_value(data.get('total_playtime_seconds'))
+    
+    # Update session with end time and duration
+    cursor.execute("""
+        UPDATE sessions SET end_time = %s, duration_seconds = %s WHERE session_id = %s
+    """, (timestamp, playtime_seconds, session_id))
+    
+    # Sync user's total playtime if provided
+    if total_playtime_seconds is not None:
+        # Find user_id from session_id
+        user_id = session_cache.user_for(session_id)
+        if user_id is None:
+            cursor.execute("SELECT user_id FROM sessions WHERE session_id = %s", (session_id,))
+            res = cursor.fetchone()
+            if res:
+                user_id = res[0]
+                session_cache.remember_session(session_id, user_id)
+        if user_id is None:
+            log.warning('session', "Session %s not found in database", session_id)
+        elif not playtime_is_current(user_id, total_playtime_seconds):
+            log.info('session', "Updating playtime for user %s to %s", user_id, total_playtime_seconds)
+            cursor.execute(f"""
+                UPDATE users SET total_playtime = {SQL.greatest}(total_playtime, %s)
+                WHERE user_id = %s
+            """, (total_playtime_seconds, user_id))
+
+
+def apply_save_upload(cursor, data, timestamp):
+    """Store the save file and sync playtime stats from it."""
+    user_id = data['user_id']
+    save_data = data.get('save_data', {})
+    total_playtime_seconds = score_value(save_data.get('totalPlaytimeSeconds'))
+    
+    # Update save record
+    cursor.execute("""
+        INSERT INTO save_files (user_id, level_data, inventory_data, updated_at)
+        VALUES (%s, %s, %s, %s)
+    """, (
+        user_id,
+        json.dumps(save_data.get('level_data', {})),
+        json.dumps(save_data.get('inventory_data', {})),
+        timestamp
+    ))
+    
+    # Extract and sync playtime stats if present
+    if total_playtime_seconds is not None and not playtime_is_current(user_id, total_playtime_seconds):
+        cursor.execute(f"""
+            UPDATE users SET total_playtime = {SQL.greatest}(total_playtime, %s)
+            WHERE user_id = %s
+        """, (total_playtime_seconds, user_id))
+
+
+WRITE_APPLIERS = {
+    'session_start': apply_session_start,
+    'session_end': apply_session_end,
+    'save_upload': apply_save_upload,
+}
+
+
+def write_committed(kind, data):
+    """Mirror a committed session/save write into the session cache and leaderboard."""
+    try:
+        mirror_committed(kind, data)
+    except Exception as e:
+        # Committed already: never fail the request or trigger a spool replay
+        log.error('storage', "Post-commit update failed for %s: %s", kind, e)
+
+
+def mirror_committed(kind, data):
+    remember_committed(kind, data)
+    if not leaderboard:
+        return
+    if kind == 'session_start':
+        leaderboard.session_started(data['session_id'], data['user_id'], data.get('starting_total_playtime'))
+    elif kind == 'session_end':
+        leaderboard.session_ended(data['session_id'], data.get('total_playtime_seconds'))
+    elif kind == 'save_upload':
+        total_playtime_seconds = data.get('save_data', {}).get('totalPlaytimeSeconds')
+        if total_playtime_seconds is not None:
+            leaderboard.playtime_synced(data['user_id'], total_playtime_seconds)
+
+
+def remember_committed(kind, data):
+    """Cache the sessions, users and playtimes a committed write guarantees."""
+    if kind == 'session_start':
+        session_cache.remember_session(data['session_id'], data['user_id'])
+        session_cache.remember_user(data['user_id'], score_value(data.get('starting_total_playtime')))
+    elif kind == 'session_end':
+        user_id = session_cache.user_for(data['session_id'])
+        if user_id is not None:
+            session_cache.remember_user(user_id, score_value(data.get('total_playtime_seconds')))
+    elif kind == 'save_upload':
+        # save_files references users, so the user exists once this commits
+        session_cache.remember_user(data['user_id'],
+                                    score_value(data.get('save_data', {}).get('totalPlaytimeSeconds')))
+
+
+def should_spool():
+    """
+    Send writes straight to the spool while the database is degraded, and
+    while older spooled writes are still waiting (so replay keeps order).
+    """
+    return spool is not None and (db_health.degraded() or spool.has_backlog())
+
+
+def run_write(kind, data, timestamp):
+    """
+    Apply a session/save write, or spool it when the database is
+    unavailable or slow. Returns True if the write was spooled.
+    """
+    if should_spool():
+        spool.append(kind, data, timestamp)
+        return True
+    
+    conn = None
+    started = time.perf_counter()
+    try:
+        conn = db_pool.get_connection()
+        cursor = conn.cursor()
+        WRITE_APPLIERS[kind](cursor, data, timestamp)
+        conn.commit()
+        cursor.close()
+    except Error as e:
+        if spool is None or not storage.is_transient(e):
+            raise
+        db_health.record(time.perf_counter() - started, False)
+        log.warning('storage', "DB unavailable, spooling %s: %s", kind, e)
+        spool.append(kind, data, timestamp)
+        return True
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+    
+    write_committed(kind, data)
+    if db_health:
+        db_health.record(time.perf_counter() - started, True)
+    return False
+
+
+def store_event_rows(rows):
+    """
+    Write event rows, or spool them when the database is unavailable or
+    slow. Returns True if the rows were spooled.
+    """
+    if should_spool():
+        spool.append('events', rows, int(time.time() * 1000), count=len(rows))
+        return True
+    
+    started = time.perf_counter()
+    try:
+        write_event_rows(rows)
+    except Error as e:
+        if spool is None or not storage.is_transient(e):
+            raise
+        db_health.record(time.perf_counter() - started, False)
+        log.warning('storage', "DB unavailable, spooling %d events: %s", len(rows), e)
+        spool.append('events', rows, int(time.time() * 1000), count=len(rows))
+        return True
+    
+    if db_health:
+        db_health.record(time.perf_counter() - started, True)
+    return False
+
+
+def flush_buffered_events(rows):
+    """
+    Event buffer callback. If one bad row (e.g. an unknown session) makes
+    the group insert fail, retry row by row so the rest still land.
+    Returns the number of rows dropped.
+    """
+    try:
+        store_event_rows(rows)
+    except Error as e:
+        if len(rows) == 1:
+            raise
+        log.warning('storage', "Group insert failed (%s), retrying %d events individually", e, len(rows))
+        dropped = 0
+        for row in rows:
+            try:
+                store_event_rows([row])
+            except Error:
+                dropped += 1
+        if dropped:
+            log.error('storage', "Dropped %d events that could not be recorded", dropped)
+        return dropped
+    return 0
+
+
+def replay_spooled_writes(records):
+    """
+    Spool replayer callback: apply records in order, in one transaction.
+    
+    The writes were already acknowledged, so if a non-transient error
+    (e.g. a save for an unknown user) fails the transaction, re-apply
+    them one at a time and drop only the ones that fail. If the database
+    goes away part-way through, the rest are spooled again rather than
+    replaying the ones already committed.
+    """
+    try:
+        apply_spooled_records(records)
+    except Error as e:
+        if storage.is_transient(e):
+            raise
+        log.warning('storage', "Spool replay failed (%s), retrying %d records individually", e, len(records))
+    else:
+        return
+    
+    units = []
+    for record in records:
+        if record['kind'] == 'events':
+            units.extend(dict(record, data=[row], count=1) for row in record['data'])
+        else:
+            units.append(record)
+    dropped = 0
+    for index, unit in enumerate(units):
+        try:
+            apply_spooled_records([unit])
+        except Error as e:
+            if not storage.is_transient(e):
+                dropped += 1
+                log.warning('storage', "Dropped spooled %s: %s", unit['kind'], e)
+                continue
+            for rest in units[index:]:
+                spool.append(rest['kind'], rest['data'], rest['ts'], count=rest.get('count', 1))
+            log.warning('storage', "DB unavailable, spooled %d records again: %s", len(units) - index, e)
+            break
+    if dropped:
+        log.error('storage', "Dropped %d spooled writes that could not be applied", dropped)
+
+
+def apply_spooled_records(records):
+    """Apply spooled records in order, in one transaction."""
+    event_rows = []
+    writes = []
+    conn = None
+    try:
+        conn = db_pool.get_connection()
+        cursor = conn.cursor()
+        pending = []
+        for record in records:
+            if record['kind'] == 'events':
+                pending.extend(tuple(row) for row in record['data'])
+                continue
+            # Keep spooled order: earlier events go in before the next write
+            for offset in range(0, len(pending), MAX_BATCH_EVENTS):
+                insert_events(cursor, pending[offset:offset + MAX_BATCH_EVENTS])
+            event_rows.extend(pending)
+            pending = []
+            WRITE_APPLIERS[record['kind']](cursor, record['data'], record['ts'])
+            writes.append(record)
+        for offset in range(0, len(pending), MAX_BATCH_EVENTS):
+            insert_events(cursor, pending[offset:offset + MAX_BATCH_EVENTS])
+        event_rows.extend(pending)
+        conn.commit()
+        cursor.close()
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+    
+    for record in writes:
+        write_committed(record['kind'], record['data'])
+    if event_rows:
+        events_committed(event_rows)
+
+
+class ThreadingTCPServer(socketserver.TCPServer):
+    """
+    TCP server whose connections are handled by a fixed pool of threads.
+    
+    Up to `backlog` accepted connections wait for a free thread. Past
+    that the accept loop answers 503 itself, so a burst can't pile up
+    threads or memory.
+    """
     allow_reuse_address = True
+    # Set by worker processes so they can all bind the same port
+    reuse_port = False
+    
+    def __init__(self, server_address, handler_class, threads, backlog, retry_after):
+        body = json.dumps({"error": "Server busy, retry later"}).encode('utf-8')
+        self.busy_response = (
+            f"HTTP/1.0 503 Service Unavailable\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Retry-After: {retry_after}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n"
+        ).encode('latin-1') + body
+        self.slots = threading.BoundedSemaphore(threads + backlog)
+        self.pending = queue.SimpleQueue()
+        super().__init__(server_address, handler_class)
+        self.workers = [
+            threading.Thread(target=self.handle_pending, name=f"overseer-handler-{i}", daemon=True)
+            for i in range(threads)
+        ]
+        for worker in self.workers:
+            worker.start()
+    
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+    
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            log.warning('request', "All handler threads busy, answered %s:%s with 503", *client_address[:2])
+            try:
+                request.sendall(self.busy_response)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self.pending.put((request, client_address))
+    
+    def handle_pending(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                self.slots.release()
+    
+    def server_close(self):
+        super().server_close()
+        # Finish connections already accepted, then let the threads go
+        for _ in self.workers:
+            self.pending.put(None)
+        for worker in self.workers:
+            worker.join()
 
 
-class TelemetryHandler(http.server.BaseHTTPRequestHandler):
+class TelemetryRoutes:
+    """
+    Routing and endpoint handlers shared by both HTTP engines.
+    
+    Subclasses provide the BaseHTTPRequestHandler-style request API:
+    path, headers, rfile, send_response/send_header/end_headers and wfile.
+    """
     
     def log_message(self, format, *args):
         """Custom logging format."""
-        print(f"[{time.strftime('%H:%M:%S')}] {args[0]}")
+        log.info('request', "%s", args[0])
+    
+    def send_response(self, code, message=None):
+        self.response_status = code
+        super().send_response(code, message)
+    
+    def observe_request(self, route):
+        """Run a route handler, recording latency, status and bytes for /metrics."""
+        if metrics is None:
+            route()
+            return
+        started = time.perf_counter()
+        metrics.request_started()
+        self.response_status = 500
+        wfile = self.wfile = CountingWriter(self.wfile)
+        try:
+            route()
+        finally:
+            self.wfile = wfile.raw
+            try:
+                bytes_in = int(self.headers.get('Content-Length') or 0)
+            except ValueError:
+                bytes_in = 0
+            metrics.request_finished(route_label(self.path), self.response_status,
+                                     time.perf_counter() - started, bytes_in, wfile.count)
     
-    def send_json_response(self, status_code, data):
+    def send_json_response(self, status_code, data, headers=None):
         """Helper to send JSON responses."""
+        self.send_body(status_code, json.dumps(data).encode('utf-8'), 'application/json', headers)
+    
+    def send_body(self, status_code, body, content_type, headers=None):
+        """Send a complete response, gzip/deflate-compressed if the client accepts it."""
+        headers = dict(headers or {})
+        if len(body) >= compression.MIN_COMPRESS_BYTES:
+            encoding = compression.accepted(self.headers.get('Accept-Encoding'))
+            if encoding:
+                body = compression.compress(body, encoding)
+                headers['Content-Encoding'] = encoding
+            headers['Vary'] = 'Accept-Encoding'
         self.send_response(status_code)
-        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode('utf-8'))
+        self.wfile.write(body)
     
     def do_POST(self):
+        self.observe_request(self.route_post)
+    
+    def do_GET(self):
+        self.observe_request(self.route_get)
+    
+    def route_post(self):
         content_length = int(self.headers.get('Content-Length', 0))
-        post_data = self.rfile.read(content_length)
+        encoding = self.headers.get('Content-Encoding', '').strip().lower() or 'identity'
+        if encoding not in compression.ENCODINGS:
+            self.close_connection = True
+            self.send_json_response(415, {"error": f"Unsupported Content-Encoding: {encoding}"})
+            return
+        
+        try:
+            post_data = compression.read_body(self.rfile, content_length, encoding, var.REQUEST_BODY_MAX_BYTES)
+        except ValueError as e:
+            self.close_connection = True
+            self.send_json_response(400, {"error": str(e)})
+            return
+        if post_data is None:
+            self.close_connection = True
+            self.send_json_response(413, {"error": f"Request body exceeds {var.REQUEST_BODY_MAX_BYTES} bytes"})
+            return
+        
+        content_type = self.headers.get('Content-Type', '').split(';')[0].strip()
+        if self.path == '/events/batch' and content_type == binary_batch.CONTENT_TYPE:
+            self.handle_binary_batch(post_data)
+            return
         
         try:
             data = json.loads(post_data) if post_data else {}
@@ -175,6 +884,15 @@ class TelemetryHandler(http.server.BaseHTTPRequestHandler):
             self.send_json_response(400, {"error": "Invalid JSON"})
             return
         
+        # Batches are JSON arrays, everything else is a single object
+        if self.path == '/events/batch':
+            self.handle_event_batch(data)
+            return
+        
+        if not isinstance(data, dict):
+            self.send_json_response(400, {"error": "Expected a JSON object"})
+            return
+        
         # Route to appropriate handler
         if self.path == '/session/start':
             self.handle_session_start(data)
@@ -192,13 +910,28 @@ class TelemetryHandler(http.server.BaseHTTPRequestHandler):
         else:
             self.send_json_response(404, {"error": "Endpoint not found"})
     
-    def do_GET(self):
+    def route_get(self):
         if self.path == '/health':
-            self.send_json_response(200, {"status": "alive", "pool": db_pool is not None})
-        elif self.path == '/events':
+            health = {"status": "alive", "pool": db_pool is not None}
+            if db_pool:
+                health["connections"] = db_pool.stats()
+            health["session_cache"] = session_cache.stats()
+            if event_buffer:
+                health["buffer"] = event_buffer.stats()
+            if spool:
+                health["database"] = db_health.stats()
+                health["spool"] = spool.stats()
+            self.send_json_response(200, health)
+        elif urlparse(self.path).path == '/events':
             self.handle_get_events()
+        elif urlparse(self.path).path == '/stats':
+            self.handle_get_stats()
+        elif urlparse(self.path).path == '/heatmap':
+            self.handle_get_heatmap()
         elif self.path.startswith('/leaderboard'):
             self.handle_get_leaderboard()
+        elif self.path == '/metrics' and metrics:
+            self.send_body(200, metrics.render().encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8')
         else:
             self.send_json_response(404, {"error": "Endpoint not found"})
     
@@ -211,26 +944,32 @@ class TelemetryHandler(http.server.BaseHTTPRequestHandler):
             self.send_json_response(400, {"error": "user_id required"})
             return
         
+        if session_cache.known_playtime(user_id) is not None:
+            self.send_json_response(200, {"status": "registered", "user_id": user_id})
+            return
+        
         conn = None
         try:
             conn = db_pool.get_connection()
             cursor = conn.cursor()
             
             # Insert or ignore if exists
-            cursor.execute("""
-                INSERT IGNORE INTO users (user_id, username, created_at)
+            cursor.execute(f"""
+                {SQL.insert_ignore} INTO users (user_id, username, created_at)
                 VALUES (%s, %s, %s)
             """, (user_id, username, int(time.time() * 1000)))
             
             conn.commit()
             cursor.close()
             
-            print(f"[OVERSEER] User registered: {user_id}")
+            session_cache.remember_user(user_id)
+            if leaderboard:
+                leaderboard.user_registered(user_id, username)
+            log.info('session', "User registered: %s", user_id)
             self.send_json_response(200, {"status": "registered", "user_id": user_id})
             
         except Error as e:
-            print(f"[OVERSEER] DB Error: {e}")
-            self.send_json_response(500, {"error": str(e)})
+            self.send_db_error(e)
         finally:
             if conn and conn.is_connected():
                 conn.close()
@@ -239,49 +978,19 @@ class TelemetryHandler(http.server.BaseHTTPRequestHandler):
         """Initialize a new telemetry session."""
         session_id = data.get('session_id')
         user_id = data.get('user_id')
-        os_info = data.get('os_info', 'Unknown')
-        starting_total_playtime = data.get('starting_total_playtime')
         
         if not session_id or not user_id:
             self.send_json_response(400, {"error": "session_id and user_id required"})
             return
         
-        conn = None
         try:
-            conn = db_pool.get_connection()
-            cursor = conn.cursor()
-            
-            # Ensure user exists first
-            cursor.execute("""
-                INSERT IGNORE INTO users (user_id, username, created_at)
-                VALUES (%s, %s, %s)
-            """, (user_id, 'Player', int(time.time() * 1000)))
-            
-            # Sync starting playtime if provided (cloud sync logic)
-            if starting_total_playtime is not None:
-                cursor.execute("""
-                    UPDATE users SET total_playtime = GREATEST(total_playtime, %s)
-                    WHERE user_id = %s
-                """, (starting_total_playtime, user_id))
-            
-            # Create session
-            cursor.execute("""
-                INSERT INTO sessions (session_id, user_id, start_time, os_info)
-                VALUES (%s, %s, %s, %s)
-            """, (session_id, user_id, int(time.time() * 1000), os_info))
-            
-            conn.commit()
-            cursor.close()
-            
-            print(f"[OVERSEER] Session started: {session_id} for user {user_id}")
-            self.send_json_response(200, {"status": "session_started", "session_id": session_id})
-            
+            spooled = run_write('session_start', data, int(time.time() * 1000))
         except Error as e:
-            print(f"[OVERSEER] DB Error: {e}")
-            self.send_json_response(500, {"error": str(e)})
-        finally:
-            if conn and conn.is_connected():
-                conn.close()
+            self.send_db_error(e)
+            return
+        
+        log.info('session', "Session started: %s for user %s", session_id, user_id)
+        self.send_write_response({"status": "session_started", "session_id": session_id}, spooled)
     
     def handle_session_end(self, data):
         """End the current session."""
@@ -289,227 +998,588 @@ class TelemetryHandler(http.server.BaseHTTPRequestHandler):
         playtime_seconds = data.get('playtime_seconds', 0)
         total_playtime_seconds = data.get('total_playtime_seconds')
         
-        print(f"[OVERSEER] Session end request: {session_id}, {playtime_seconds}s, Total: {total_playtime_seconds}s")
+        log.info('session', "Session end request: %s, %ss, Total: %ss", session_id, playtime_seconds, total_playtime_seconds)
         
         if not session_id:
             self.send_json_response(400, {"error": "session_id required"})
             return
         
-        conn = None
         try:
-            conn = db_pool.get_connection()
-            cursor = conn.cursor()
-            
-            # Update session with end time and duration
-            cursor.execute("""
-                UPDATE sessions SET end_time = %s, duration_seconds = %s WHERE session_id = %s
-            """, (int(time.time() * 1000), playtime_seconds, session_id))
-            
-            # Sync user's total playtime if provided
-            if total_playtime_seconds is not None:
-                # Find user_id from session_id
-                cursor.execute("SELECT user_id FROM sessions WHERE session_id = %s", (session_id,))
-                res = cursor.fetchone()
-                if res:
-                    user_id = res[0]
-                    print(f"[OVERSEER] Updating playtime for user {user_id} to {total_playtime_seconds}")
-                    cursor.execute("""
-                        UPDATE users SET total_playtime = GREATEST(total_playtime, %s)
-                        WHERE user_id = %s
-                    """, (total_playtime_seconds, user_id))
-                else:
-                    print(f"[OVERSEER] Session {session_id} not found in database")
-            
-            conn.commit()
-            cursor.close()
-            
-            print(f"[OVERSEER] Session ended: {session_id} with duration {playtime_seconds}s")
-            self.send_json_response(200, {"status": "session_ended"})
-            
+            spooled = run_write('session_end', data, int(time.time() * 1000))
         except Error as e:
-            print(f"[OVERSEER] DB Error: {e}")
-            self.send_json_response(500, {"error": str(e)})
-        finally:
-            if conn and conn.is_connected():
-                conn.close()
+            self.send_db_error(e)
+            return
+        
+        log.info('session', "Session ended: %s with duration %ss", session_id, playtime_seconds)
+        self.send_write_response({"status": "session_ended"}, spooled)
 
     def handle_save_upload(self, data):
         """Process game save and sync playtime statistics."""
         user_id = data.get('user_id')
-        save_data = data.get('save_data', {})
         
         if not user_id:
             self.send_json_response(400, {"error": "user_id required"})
             return
-            
-        total_playtime_seconds = save_data.get('totalPlaytimeSeconds')
         
-        conn = None
         try:
-            conn = db_pool.get_connection()
-            cursor = conn.cursor()
-            
-            # Update save record
-            cursor.execute("""
-                INSERT INTO save_files (user_id, level_data, inventory_data, updated_at)
-                VALUES (%s, %s, %s, %s)
-            """, (
-                user_id,
-                json.dumps(save_data.get('level_data', {})),
-                json.dumps(save_data.get('inventory_data', {})),
-                int(time.time() * 1000)
-            ))
-            
-            # Extract and sync playtime stats if present
-            if total_playtime_seconds is not None:
-                cursor.execute("""
-                    UPDATE users SET total_playtime = GREATEST(total_playtime, %s)
-                    WHERE user_id = %s
-                """, (total_playtime_seconds, user_id))
-            
-            conn.commit()
-            cursor.close()
-            
-            print(f"[OVERSEER] Save stats synced for {user_id}")
-            self.send_json_response(200, {"status": "save_synced", "user_id": user_id})
-            
+            spooled = run_write('save_upload', data, int(time.time() * 1000))
         except Error as e:
-            print(f"[OVERSEER] DB Error: {e}")
-            self.send_json_response(500, {"error": str(e)})
-        finally:
-            if conn and conn.is_connected():
-                conn.close()
+            self.send_db_error(e)
+            return
+        
+        log.info('session', "Save stats synced for %s", user_id)
+        self.send_write_response({"status": "save_synced", "user_id": user_id}, spooled)
+    
+    def send_db_error(self, e):
+        """500 for a database error, or a fast 503 when no pooled connection was free."""
+        if isinstance(e, storage.PoolTimeout):
+            log.warning('storage', "%s", e)
+            self.send_json_response(503, {"error": "Server busy, retry later"},
+                                    headers={'Retry-After': str(var.SERVER_RETRY_AFTER)})
+            return
+        log.error('storage', "DB Error: %s", e)
+        self.send_json_response(500, {"error": str(e)})
+    
+    def send_write_response(self, body, spooled):
+        """Ack a write, flagging ones that were spooled for later replay."""
+        if spooled:
+            body["spooled"] = True
+        self.send_json_response(200, body)
     
     def handle_event(self, data):
         """Record a telemetry event."""
-        session_id = data.get('session_id')
-        event_type = data.get('event_type')
-        x_coord = data.get('x', 0.0)
-        y_coord = data.get('y', 0.0)
-        meta_data = data.get('meta', {})
+        row, error = parse_event(data, int(time.time() * 1000))
         
-        if not session_id or not event_type:
-            self.send_json_response(400, {"error": "session_id and event_type required"})
+        if error:
+            self.send_json_response(400, {"error": error})
             return
         
-        # Validate event type
-        if event_type not in VALID_EVENT_TYPES:
-            print(f"[OVERSEER] Warning: Unknown event type '{event_type}' - recording anyway")
+        if not self.submit_events([row]):
+            return
         
-        conn = None
+        log.info('event', "Event recorded: %s at (%s, %s)", row[1], row[2], row[3])
+        self.send_json_response(200, {"status": "event_recorded"})
+    
+    def handle_event_batch(self, data):
+        """Record a batch of telemetry events in a single transaction."""
+        if not isinstance(data, list):
+            self.send_json_response(400, {"error": "Expected a JSON array of events"})
+            return
+        
+        if not data:
+            self.send_json_response(400, {"error": "Batch is empty"})
+            return
+        
+        if len(data) > MAX_BATCH_EVENTS:
+            self.send_json_response(413, {"error": f"Batch exceeds {MAX_BATCH_EVENTS} events"})
+            return
+        
+        # Validate the whole array first, collecting per-item errors
+        timestamp = int(time.time() * 1000)
+        rows = []
+        errors = []
+        for index, item in enumerate(data):
+            row, error = parse_event(item, timestamp)
+            if error:
+                errors.append({"index": index, "error": error})
+            else:
+                rows.append(row)
+        
+        self.record_batch(rows, errors)
+    
+    def handle_binary_batch(self, body):
+        """Record a binary event batch (layout in backend/binary_batch.py)."""
         try:
-            conn = db_pool.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                INSERT INTO events (session_id, event_type, x_coord, y_coord, timestamp, meta_data)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (
-                session_id, 
-                event_type, 
-                float(x_coord), 
-                float(y_coord), 
-                int(time.time() * 1000),
-                json.dumps(meta_data)
-            ))
-            
-            conn.commit()
-            cursor.close()
-            
-            print(f"[OVERSEER] Event recorded: {event_type} at ({x_coord}, {y_coord})")
-            self.send_json_response(200, {"status": "event_recorded"})
-            
+            batch = binary_batch.BinaryBatch(body)
+        except ValueError as e:
+            self.send_json_response(400, {"error": str(e)})
+            return
+        
+        if not len(batch):
+            self.send_json_response(400, {"error": "Batch is empty"})
+            return
+        
+        if len(batch) > MAX_BATCH_EVENTS:
+            self.send_json_response(413, {"error": f"Batch exceeds {MAX_BATCH_EVENTS} events"})
+            return
+        
+        rows, errors = batch.rows(int(time.time() * 1000))
+        for name in {row[1] for row in rows}:
+            if name not in VALID_EVENT_TYPES:
+                log.warning('event', "Warning: Unknown event type '%s' - recording anyway", name)
+        
+        self.record_batch(rows, errors)
+    
+    def record_batch(self, rows, errors):
+        """Submit the valid rows of a batch and report per-item errors."""
+        if not rows:
+            self.send_json_response(400, {"error": "No valid events in batch", "errors": errors})
+            return
+        
+        if not self.submit_events(rows):
+            return
+        
+        log.info('event', "Batch recorded: %d events (%d rejected)", len(rows), len(errors))
+        self.send_json_response(200, {
+            "status": "batch_recorded",
+            "recorded": len(rows),
+            "rejected": len(errors),
+            "errors": errors
+        })
+    
+    def submit_events(self, rows):
+        """
+        Hand event rows to the write-behind buffer, or write them inline
+        when buffering is disabled.
+        
+        Returns True once the rows are accepted. On failure the error
+        response has already been sent.
+        """
+        if event_buffer:
+            if event_buffer.offer(rows):
+                return True
+            # Shed load instead of piling up handler threads
+            self.send_json_response(
+                503,
+                {"error": "Event buffer full, retry later"},
+                headers={'Retry-After': str(var.EVENT_BUFFER_RETRY_AFTER)}
+            )
+            return False
+        
+        try:
+            store_event_rows(rows)
+            return True
         except Error as e:
-            print(f"[OVERSEER] DB Error: {e}")
-            self.send_json_response(500, {"error": str(e)})
-        finally:
-            if conn and conn.is_connected():
-                conn.close()
+            self.send_db_error(e)
+            return False
     
     def handle_get_events(self):
-        """Fetch all events (for debugging/visualization)."""
+        """
+        Query events with optional filters and keyset pagination.
+        
+        ?event_type= &session_id= &user= &level= &since= &until= (epoch ms)
+        &limit= &order=asc|desc &cursor= &format=json|ndjson
+        """
+        try:
+            query = EventQuery(urlparse(self.path).query)
+        except ValueError as e:
+            self.send_json_response(400, {"error": str(e)})
+            return
+        
+        if query.format == 'ndjson':
+            self.stream_events(query)
+            return
+        
         conn = None
         try:
             conn = db_pool.get_connection()
             cursor = conn.cursor(dictionary=True)
             
-            cursor.execute("SELECT * FROM events ORDER BY timestamp DESC LIMIT 100")
+            cursor.execute(*query.sql())
             events = cursor.fetchall()
             cursor.close()
             
-            self.send_json_response(200, {"events": events})
+            last_id = events[-1]['event_id'] if events else None
+            self.send_json_response(200, {
+                "events": events,
+                "next_cursor": query.next_cursor(len(events), last_id)
+            })
             
         except Error as e:
-            self.send_json_response(500, {"error": str(e)})
+            self.send_db_error(e)
         finally:
             if conn and conn.is_connected():
                 conn.close()
-
-    def handle_get_leaderboard(self):
-        """Fetch game leaderboards."""
-        parsed_url = urlparse(self.path)
-        params = parse_qs(parsed_url.query)
-        category = params.get('category', ['playtime'])[0]
+    
+    def stream_events(self, query):
+        """
+        Stream matching events as NDJSON straight off an unbuffered cursor,
+        so memory stays flat however many rows match. If `limit` cut the
+        export short, the last line is {"next_cursor": ...}.
         
+        Exports can run for minutes, so they use their own connection
+        rather than holding a pool slot.
+        """
         conn = None
         try:
-            conn = db_pool.get_connection()
+            conn = storage.connect()
             cursor = conn.cursor(dictionary=True)
-            
-            if category == 'playtime':
-                # Rank by total_playtime (DESC)
-                cursor.execute("""
-                    SELECT user_id, username, total_playtime 
-                    FROM users 
-                    ORDER BY total_playtime DESC 
-                    LIMIT 20
-                """)
-                leaderboard = cursor.fetchall()
-                cursor.close()
-                self.send_json_response(200, {"category": category, "leaderboard": leaderboard})
+            cursor.execute(*query.sql())
+        except Error as e:
+            if conn:
+                try:
+                    conn.close()
+                except Error:
+                    pass
+            self.send_db_error(e)
+            return
+        
+        chunked = self.start_stream('application/x-ndjson')
+        count = 0
+        last_id = None
+        finished = False
+        try:
+            while True:
+                rows = cursor.fetchmany(STREAM_BATCH_ROWS)
+                if not rows:
+                    break
+                count += len(rows)
+                last_id = rows[-1]['event_id']
+                self.write_stream("".join(json.dumps(row) + "\n" for row in rows).encode('utf-8'), chunked)
+            next_cursor = query.next_cursor(count, last_id)
+            if next_cursor:
+                self.write_stream((json.dumps({"next_cursor": next_cursor}) + "\n").encode('utf-8'), chunked)
+            self.end_stream(chunked)
+            finished = True
+        except Error as e:
+            # Headers are gone; a truncated body is the only signal left
+            log.error('storage', "Event export failed after %d rows: %s", count, e)
+        except OSError:
+            log.info('request', "Client went away after %d exported rows", count)
+        finally:
+            if not finished:
+                self.close_connection = True
             else:
                 cursor.close()
-                self.send_json_response(400, {"error": f"Unknown category: {category}"})
-            
+            # An abandoned unbuffered MySQL result can make close() complain
+            try:
+                conn.close()
+            except Error:
+                pass
+    
+    def start_stream(self, content_type):
+        """
+        Send headers for a streamed 200 response. Uses chunked encoding
+        where the engine speaks HTTP/1.1; otherwise the body ends when the
+        connection closes. Returns whether the body is chunked.
+        """
+        chunked = self.protocol_version == "HTTP/1.1" and self.request_version == "HTTP/1.1"
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.close_connection = True
+        self.end_headers()
+        return chunked
+    
+    def write_stream(self, data, chunked):
+        if chunked:
+            self.wfile.write(f"{len(data):x}\r\n".encode('latin-1') + data + b"\r\n")
+        else:
+            self.wfile.write(data)
+    
+    def end_stream(self, chunked):
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+    
+    def handle_get_stats(self):
+        """
+        Event counts from the rollup tables.
+        
+        ?hours=N (hourly breakdown window, default 24) &session_id=
+        """
+        params = parse_qs(urlparse(self.path).query)
+        session_id = params.get('session_id', [None])[0]
+        try:
+            hours = max(1, min(int(params.get('hours', [24])[0]), 24 * 90))
+        except ValueError:
+            self.send_json_response(400, {"error": "hours must be an integer"})
+            return
+        
+        conn = None
+        try:
+            conn = db_pool.get_connection()
+            cursor = conn.cursor()
+            stats = rollups.read_stats(cursor, hours=hours, session_id=session_id)
+            cursor.close()
+            self.send_json_response(200, stats)
         except Error as e:
-            print(f"[OVERSEER] DB Error: {e}")
-            self.send_json_response(500, {"error": str(e)})
+            self.send_db_error(e)
         finally:
             if conn and conn.is_connected():
                 conn.close()
+    
+    def handle_get_heatmap(self):
+        """
+        Binned event counts as a binary grid (layout in backend/heatmap.py).
+        
+        ?event_type= (required) &level= &since= &until= (epoch ms)
+        &bins=N &format=f32|u8
+        
+        Responses carry an ETag; a matching If-None-Match gets 304 with no
+        body, so clients can poll cheaply.
+        """
+        try:
+            query = HeatmapQuery(urlparse(self.path).query, VALID_EVENT_TYPES, var.HEATMAP_GRID_BINS)
+        except ValueError as e:
+            self.send_json_response(400, {"error": str(e)})
+            return
+        
+        encoding = compression.accepted(self.headers.get('Accept-Encoding'))
+        try:
+            body, etag = heatmap_cache.get(query, db_pool.get_connection, encoding)
+        except Error as e:
+            self.send_db_error(e)
+            return
+        
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        
+        # Bodies come compressed from the cache, so skip send_body
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(body)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def handle_get_leaderboard(self):
+        """
+        Serve leaderboards from the in-memory index.
+        
+        ?category=playtime|deaths|completions|fastest (fastest needs &level=)
+        &limit=N for the top N, or &user=ID[&radius=N] for a player's rank
+        and the players around them.
+        """
+        parsed_url = urlparse(self.path)
+        params = parse_qs(parsed_url.query)
+        category = params.get('category', ['playtime'])[0]
+        level = params.get('level', [None])[0]
+        user_id = params.get('user', [None])[0]
+        
+        if leaderboard is None:
+            self.send_json_response(503, {"error": "Leaderboard is not loaded yet"},
+                                    headers={'Retry-After': '5'})
+            return
+        
+        index = leaderboard.index(category, level)
+        if index is None:
+            self.send_json_response(400, {"error": f"Unknown category: {category}"})
+            return
+        if category == 'fastest' and not level:
+            self.send_json_response(400, {"error": "level required for category fastest"})
+            return
+        
+        try:
+            limit = min(int(params.get('limit', [LEADERBOARD_DEFAULT_SIZE])[0]), LEADERBOARD_MAX_SIZE)
+            radius = min(int(params.get('radius', [5])[0]), LEADERBOARD_MAX_SIZE)
+        except ValueError:
+            self.send_json_response(400, {"error": "limit and radius must be integers"})
+            return
+        
+        response = {"category": category}
+        if level:
+            response["level"] = level
+        
+        if user_id:
+            entries = index.around(user_id, max(radius, 0))
+            if entries is None:
+                self.send_json_response(404, {"error": f"{user_id} has no {category} score"})
+                return
+            response["user_id"] = user_id
+            response["rank"] = next(rank for rank, other, _ in entries if other == user_id)
+        else:
+            entries = index.top(max(limit, 0))
+        
+        rows = leaderboard.describe(entries)
+        if category == 'playtime':
+            # Field name used before categories existed
+            for row in rows:
+                row["total_playtime"] = row["score"]
+        response["leaderboard"] = rows
+        self.send_json_response(200, response)
 
 
-if __name__ == "__main__":
+class TelemetryHandler(TelemetryRoutes, http.server.BaseHTTPRequestHandler):
+    """Request handler for the threaded engine (pooled handler threads, HTTP/1.0)."""
+    
+    # Stalled clients release their handler thread instead of holding it
+    timeout = var.SERVER_SOCKET_TIMEOUT
+
+
+class AsyncTelemetryExchange(TelemetryRoutes, AsyncExchange):
+    """Request handler for the asyncio engine (persistent HTTP/1.1 connections)."""
+
+
+def print_banner(mode, workers=1):
+    if workers > 1:
+        print(f"[OVERSEER] Listening on port {PORT} ({mode} engine, {workers} workers)")
+    else:
+        print(f"[OVERSEER] Listening on port {PORT} ({mode} engine)")
+    print(f"[OVERSEER] Connected to {storage.describe()}")
+    print("-" * 50)
+    print("Endpoints:")
+    print("  POST /session/start  - Start a new session")
+    print("  POST /session/end    - End a session")
+    print("  POST /event          - Record an event")
+    print("  POST /events/batch   - Record a batch of events")
+    print("  POST /user/register  - Register a user")
+    print("  GET  /health         - Health check")
+    print("  GET  /events         - Query events (filters, cursor, ndjson)")
+    print("  GET  /leaderboard    - Rankings and player rank lookups")
+    print("  GET  /stats          - Event counts from the rollups")
+    print("  GET  /heatmap        - Binned event counts as a binary grid")
+    if metrics:
+        print("  GET  /metrics        - Prometheus metrics")
+    print("-" * 50)
+    print("Waiting for victims...")
+
+
+def run_server(mode, reuse_port=False):
+    """Serve requests with the selected engine until interrupted."""
+    try:
+        if mode == 'async':
+            engine = AsyncHTTPEngine(
+                AsyncTelemetryExchange, "", PORT,
+                max_workers=var.ASYNC_EXECUTOR_WORKERS,
+                max_pending=var.ASYNC_EXECUTOR_WORKERS + var.SERVER_BACKLOG,
+                retry_after=var.SERVER_RETRY_AFTER,
+                keepalive_timeout=var.ASYNC_KEEPALIVE_TIMEOUT,
+                body_timeout=var.SERVER_SOCKET_TIMEOUT,
+                max_body_bytes=var.REQUEST_BODY_MAX_BYTES,
+                reuse_port=reuse_port
+            )
+            if not reuse_port:
+                print_banner(mode)
+            asyncio.run(engine.serve_forever())
+        else:
+            ThreadingTCPServer.reuse_port = reuse_port
+            with ThreadingTCPServer(("", PORT), TelemetryHandler, var.SERVER_THREADS,
+                                    var.SERVER_BACKLOG, var.SERVER_RETRY_AFTER) as httpd:
+                if not reuse_port:
+                    print_banner(mode)
+                httpd.serve_forever()
+    except KeyboardInterrupt:
+        if not reuse_port:
+            print("\n[OVERSEER] Shutting down...")
+    finally:
+        stop_background_services()
+
+
+def _interrupt_server(signum, frame):
+    """Turn SIGTERM/SIGINT into a single KeyboardInterrupt so buffers drain."""
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    raise KeyboardInterrupt
+
+
+def run_worker(slot, mode):
+    """Entry point of a forked worker: own pool, own buffer, shared port."""
+    signal.signal(signal.SIGTERM, _interrupt_server)
+    signal.signal(signal.SIGINT, _interrupt_server)
+    
+    if not create_connection_pool():
+        return 1
+    start_background_services(maintain_partitions=slot == 0)
+    
+    print(f"[OVERSEER] Worker {slot} ready (pid {os.getpid()})")
+    run_server(mode, reuse_port=True)
+    return 0
+
+
+def supervise_workers(count, mode):
+    """
+    Fork `count` workers bound to the same port with SO_REUSEPORT and
+    restart any that exit unexpectedly until the supervisor is stopped.
+    """
+    workers = {}
+    stopping = False
+    
+    def spawn(slot):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = run_worker(slot, mode)
+            finally:
+                os._exit(code)
+        workers[pid] = (slot, time.monotonic())
+    
+    def stop(signum, frame):
+        nonlocal stopping
+        if stopping:
+            return
+        stopping = True
+        print("\n[OVERSEER] Shutting down workers...")
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    
+    for slot in range(count):
+        spawn(slot)
+    print_banner(mode, count)
+    
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        slot, started = workers.pop(pid, (None, 0))
+        if slot is None or stopping:
+            continue
+        
+        code = os.waitstatus_to_exitcode(status)
+        print(f"[OVERSEER] Worker {slot} (pid {pid}) exited with {code}, restarting")
+        # Don't spin if a worker keeps dying right after it starts
+        if time.monotonic() - started < WORKER_RESTART_BACKOFF:
+            time.sleep(WORKER_RESTART_BACKOFF)
+        if not stopping:
+            spawn(slot)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='The Overseer telemetry server')
+    parser.add_argument('--mode', choices=SERVER_MODES, default=var.SERVER_MODE,
+                        help='HTTP engine: threaded (default) or async keep-alive')
+    parser.add_argument('--workers', type=int, default=var.SERVER_WORKERS,
+                        help='Number of server processes sharing the port (SO_REUSEPORT)')
+    args = parser.parse_args()
+    
+    if args.workers > 1 and not (hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')):
+        print("[OVERSEER] --workers needs fork() and SO_REUSEPORT, which this platform lacks.")
+        sys.exit(1)
+    
+    if not configure_logging():
+        sys.exit(1)
+    
     print("=" * 50)
     print("  THE OVERSEER - Telemetry Collection Server")
     print("=" * 50)
     
-    # Phase 1: Forge the database
+    # Phase 1: Forge the database (exactly once, before any worker starts)
     if not initialize_database():
         print("[OVERSEER] Failed to initialize database. Exiting.")
         sys.exit(1)
     
+    if args.workers > 1:
+        supervise_workers(args.workers, args.mode)
+        return
+    
     # Create connection pool
     if not create_connection_pool():
         print("[OVERSEER] Failed to create connection pool. Exiting.")
         sys.exit(1)
     
-    # Start the server
-    with ThreadingTCPServer(("", PORT), TelemetryHandler) as httpd:
-        print(f"[OVERSEER] Listening on port {PORT}")
-        print(f"[OVERSEER] Connected to MySQL at {DB_CONFIG['host']}")
-        print("-" * 50)
-        print("Endpoints:")
-        print("  POST /session/start  - Start a new session")
-        print("  POST /session/end    - End a session")
-        print("  POST /event          - Record an event")
-        print("  POST /user/register  - Register a user")
-        print("  GET  /health         - Health check")
-        print("  GET  /events         - Fetch recent events")
-        print("-" * 50)
-        print("Waiting for victims...")
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            print("\n[OVERSEER] Shutting down...")
-            httpd.shutdown()
+    start_background_services()
+    signal.signal(signal.SIGTERM, _interrupt_server)
+    
+    run_server(args.mode)
+
+
+if __name__ == "__main__":
+    main()
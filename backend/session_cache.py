@@ -0,0 +1,79 @@
+"""
+In-process cache of session and user metadata for the write paths.
+
+    sessions   session_id -> user_id
+    users      user_id -> highest total_playtime written for that user
+
+Both maps are LRU-bounded. Entries are only added once the write that
+created them has committed (or, for sessions, once read back from the
+database), and they cannot go stale: a session's user never changes,
+users are never deleted, and total_playtime only grows because every
+write goes through GREATEST. A cached user is therefore known to exist
+and a cached playtime is a lower bound on the stored one, which holds
+even when other worker processes write to the same database.
+"""
+import threading
+from collections import OrderedDict
+
+
+class SessionCache:
+    def __init__(self, max_sessions=100000, max_users=100000):
+        self.max_sessions = max_sessions
+        self.max_users = max_users
+        self._sessions = OrderedDict()
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _touch(entries, key):
+        value = entries.get(key)
+        if value is not None:
+            entries.move_to_end(key)
+        return value
+
+    @staticmethod
+    def _store(entries, key, value, limit):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > limit:
+            entries.popitem(last=False)
+
+    def user_for(self, session_id):
+        """The user who started session_id, or None if not cached."""
+        with self._lock:
+            user_id = self._touch(self._sessions, session_id)
+            if user_id is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return user_id
+
+    def remember_session(self, session_id, user_id):
+        with self._lock:
+            self._store(self._sessions, session_id, user_id, self.max_sessions)
+
+    def known_playtime(self, user_id):
+        """
+        A lower bound on the user's stored total_playtime, or None if the
+        user isn't known to exist.
+        """
+        with self._lock:
+            playtime = self._touch(self._users, user_id)
+            if playtime is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return playtime
+
+    def remember_user(self, user_id, total_playtime=None):
+        """Record that user_id exists, with a committed total_playtime if known."""
+        with self._lock:
+            known = self._users.get(user_id) or 0
+            self._store(self._users, user_id, max(known, total_playtime or 0), self.max_users)
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "users": len(self._users),
+                    "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,293 @@
+import json
+import os
+import re
+import threading
+import time
+
+from backend.overseer_log import log
+
+SPOOL_NAME = re.compile(r"^spool-(\d+)-(\d+)-(\d+)\.jsonl(?:\.replaying-(\d+))?$")
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class DatabaseHealth:
+    """
+    Circuit breaker over recent database writes.
+
+    A failed write, or a smoothed write latency above `latency_threshold`
+    seconds, marks the database degraded for `cooldown` seconds. While
+    degraded, writes go straight to the spool instead of waiting on MySQL.
+    """
+
+    def __init__(self, latency_threshold, cooldown):
+        self.latency_threshold = latency_threshold
+        self.cooldown = cooldown
+        self._latency = 0.0
+        self._degraded_until = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            if ok:
+                self._latency = 0.8 * self._latency + 0.2 * seconds
+                if self._latency <= self.latency_threshold:
+                    return
+            self._degraded_until = time.monotonic() + self.cooldown
+
+    def degraded(self):
+        return time.monotonic() < self._degraded_until
+
+    def stats(self):
+        return {
+            "degraded": self.degraded(),
+            "write_latency_ms": round(self._latency * 1000, 3)
+        }
+
+
+class Spool:
+    """
+    Durable append-only journal for writes the database could not take.
+
+    Records are JSON lines in `spool-<pid>-<ms>-<seq>.jsonl` files. Appends
+    return only after an fsync covers them; concurrent appenders share one
+    fsync (group commit). A replayer thread hands closed files back to the
+    server once the database is healthy and deletes them after commit.
+    """
+
+    def __init__(self, directory, max_file_bytes=4 * 1024 * 1024, max_attempts=5,
+                 is_transient=lambda error: False):
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self.max_attempts = max_attempts
+        # Transient failures (DB down) are retried forever; anything else
+        # counts towards max_attempts before the file is quarantined
+        self.is_transient = is_transient
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()       # guards the active file
+        self._sync_lock = threading.Lock()  # one fsync round at a time
+        self._file = None
+        self._file_name = None
+        self._file_bytes = 0
+        self._retired = []
+        self._seq = 0
+        self._written = 0
+        self._synced = 0
+        self._replayed_upto = 0
+
+        self._attempts = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+        # Counters exposed through stats()
+        self._spooled = 0
+        self._replayed = 0
+        self._quarantined = 0
+        self._last_replay_rate = 0.0
+        self._last_error = None
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def append(self, kind, data, timestamp, count=1):
+        """Durably record one write. Returns once it is fsynced."""
+        record = {"kind": kind, "ts": timestamp, "count": count, "data": data}
+        line = (json.dumps(record) + "\n").encode('utf-8')
+        with self._lock:
+            if self._file is None or self._file_bytes >= self.max_file_bytes:
+                self._rotate()
+            self._file.write(line)
+            self._file_bytes += len(line)
+            self._written += 1
+            self._spooled += count
+            ticket = self._written
+        self._sync(ticket)
+
+    def has_backlog(self):
+        """True while this process has spooled writes not yet replayed."""
+        return self._written > self._replayed_upto
+
+    def _rotate(self):
+        """Retire the active file (closed after its final fsync) and open a new one."""
+        if self._file is not None:
+            self._file.flush()
+            self._retired.append(self._file)
+        self._file_name = f"spool-{os.getpid()}-{int(time.time() * 1000):013d}-{self._seq:04d}.jsonl"
+        self._seq += 1
+        self._file = open(os.path.join(self.directory, self._file_name), 'ab')
+        self._file_bytes = 0
+
+    def _sync(self, ticket):
+        with self._sync_lock:
+            if self._synced >= ticket:
+                # Another appender's fsync already covered us
+                return
+            with self._lock:
+                target = self._written
+                handles = self._retired + ([self._file] if self._file else [])
+                retired = self._retired
+                self._retired = []
+                for handle in handles:
+                    handle.flush()
+            for handle in handles:
+                os.fsync(handle.fileno())
+            for handle in retired:
+                handle.close()
+            self._synced = target
+
+    def close(self):
+        self.stop_replayer()
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                self._retired.append(self._file)
+                self._file = None
+                self._file_name = None
+        self._sync(self._written + 1)
+
+    # ------------------------------------------------------------------
+    # Replay
+    # ------------------------------------------------------------------
+    def start_replayer(self, replay_fn, health, interval=1.0):
+        """
+        Periodically hand spooled records to `replay_fn(records)` while the
+        database is healthy. `replay_fn` must write them in one transaction
+        and raise on failure.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._replay_loop, args=(replay_fn, health, interval),
+            name="spool-replayer", daemon=True
+        )
+        self._thread.start()
+
+    def stop_replayer(self):
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _replay_loop(self, replay_fn, health, interval):
+        while not self._stop.wait(interval):
+            if not health.degraded():
+                self.replay(replay_fn, health)
+
+    def replay(self, replay_fn, health=None):
+        """Drain every claimable spool file, oldest first. Returns writes replayed."""
+        with self._lock:
+            if self._file is not None and self._file_bytes > 0:
+                self._file.flush()
+                self._retired.append(self._file)
+                self._file = None
+                self._file_name = None
+            written = self._written
+        self._sync(written + 1)
+
+        total = 0
+        complete = True
+        for path in self._claim_files():
+            records = self._read(path)
+            started = time.perf_counter()
+            try:
+                if records:
+                    replay_fn(records)
+            except Exception as e:
+                complete = False
+                self._last_error = str(e)
+                if health:
+                    health.record(time.perf_counter() - started, False)
+                if self.is_transient(e):
+                    log.warning('storage', "Spool replay paused, database unavailable: %s", e)
+                    break
+                attempts = self._attempts.get(path, 0) + 1
+                self._attempts[path] = attempts
+                if attempts >= self.max_attempts:
+                    os.replace(path, path + ".failed")
+                    self._attempts.pop(path, None)
+                    self._quarantined += 1
+                    log.error('storage', "Spool file quarantined after %d attempts: %s (%s)", attempts, path, e)
+                else:
+                    log.warning('storage', "Spool replay failed, will retry: %s", e)
+                break
+            elapsed = time.perf_counter() - started
+            os.remove(path)
+            self._attempts.pop(path, None)
+            count = sum(record.get("count", 1) for record in records)
+            total += count
+            self._replayed += count
+            self._last_replay_rate = count / elapsed if elapsed > 0 else 0.0
+        if complete:
+            self._replayed_upto = written
+        if total:
+            log.info('storage', "Replayed %d spooled writes", total)
+        return total
+
+    def _claim_files(self):
+        """Closed files of this process plus anything left by dead processes."""
+        me = os.getpid()
+        claimed = []
+        for name in sorted(os.listdir(self.directory), key=self._sort_key):
+            match = SPOOL_NAME.match(name)
+            if not match or name == self._file_name:
+                continue
+            writer_pid = int(match.group(1))
+            replaying_pid = match.group(4)
+            owner = int(replaying_pid) if replaying_pid else writer_pid
+            if owner != me and _pid_alive(owner):
+                continue
+
+            path = os.path.join(self.directory, name)
+            base = name.split(".replaying-")[0]
+            target = os.path.join(self.directory, f"{base}.replaying-{me}")
+            if path != target:
+                try:
+                    os.rename(path, target)
+                except FileNotFoundError:
+                    continue  # another process claimed it first
+            claimed.append(target)
+        return claimed
+
+    @staticmethod
+    def _sort_key(name):
+        match = SPOOL_NAME.match(name)
+        if not match:
+            return (0, 0, name)
+        return (int(match.group(2)), int(match.group(3)), name)
+
+    @staticmethod
+    def _read(path):
+        records = []
+        with open(path, 'rb') as handle:
+            for line in handle:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Torn final line from a crash mid-append; it was never acked
+                    continue
+        return records
+
+    def stats(self):
+        pending_files = 0
+        pending_bytes = 0
+        for name in os.listdir(self.directory):
+            if SPOOL_NAME.match(name):
+                pending_files += 1
+                pending_bytes += os.path.getsize(os.path.join(self.directory, name))
+        return {
+            "pending_files": pending_files,
+            "pending_bytes": pending_bytes,
+            "spooled": self._spooled,
+            "replayed": self._replayed,
+            "quarantined": self._quarantined,
+            "last_replay_rate": round(self._last_replay_rate, 1),
+            "last_error": self._last_error
+        }
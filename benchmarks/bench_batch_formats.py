@@ -0,0 +1,120 @@
+"""
+Compare JSON and binary event batches for POST /events/batch.
+
+Synthetic game sessions are packed both ways, and each body is decoded
+with the server's own code: json.loads plus parse_event per item for
+JSON, BinaryBatch for binary. The table shows bytes per event on the
+wire and decode CPU per event, from the request body to `events` rows.
+The database insert is the same for both and is left out. Both
+decoders must produce the same rows, with x and y compared at float32
+precision, or the run fails.
+
+Usage:
+    python benchmarks/bench_batch_formats.py --events 100000 --batch 500
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from backend import server
+from backend.binary_batch import BinaryBatch, encode_batch
+
+TIMESTAMP = 1790000000000
+
+
+def synthetic_events(count, rng):
+    """Events shaped like the Java client's, with its usual metas."""
+    metas = [
+        {"cause": "guard"}, {"cause": "laser"}, {"enemy": "drone"},
+        {"item": "medkit"}, {"damage": 10, "source": "guard"}, {},
+    ]
+    kinds = server.VALID_EVENT_TYPES
+    events = []
+    for kind, x, y, meta in zip(rng.integers(0, len(kinds), count),
+                                rng.uniform(0, 1000, count).round(2),
+                                rng.uniform(0, 1000, count).round(2),
+                                rng.integers(0, len(metas), count)):
+        event = {"event_type": kinds[kind], "x": float(x), "y": float(y)}
+        if metas[meta]:
+            event["meta"] = metas[meta]
+        events.append(event)
+    # A level tag on completions, as the client sends it
+    for event in events:
+        if event["event_type"] == "LEVEL_COMPLETE":
+            event["meta"] = {"level": "3", "time_seconds": 200}
+    return events
+
+
+def decode_json(body):
+    rows = []
+    for item in json.loads(body):
+        row, error = server.parse_event(item, TIMESTAMP)
+        if row:
+            rows.append(row)
+    return rows
+
+
+def decode_binary(body):
+    return BinaryBatch(body).rows(TIMESTAMP)[0]
+
+
+def timed(decode, bodies, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.process_time()
+        rows = [decode(body) for body in bodies]
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return rows, best
+
+
+def same_rows(json_rows, binary_rows):
+    if len(json_rows) != len(binary_rows):
+        return False
+    for a, b in zip(json_rows, binary_rows):
+        if a[:2] != b[:2] or a[4] != b[4] or json.loads(a[5]) != json.loads(b[5]):
+            return False
+        if np.float32(a[2]) != np.float32(b[2]) or np.float32(a[3]) != np.float32(b[3]):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark JSON against binary event batches')
+    parser.add_argument('--events', type=int, default=100000, help='Events to encode and decode')
+    parser.add_argument('--batch', type=int, default=server.MAX_BATCH_EVENTS, help='Events per batch')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing runs (best is reported)')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    events = synthetic_events(args.events, np.random.default_rng(args.seed))
+    batches = [events[start:start + args.batch] for start in range(0, len(events), args.batch)]
+
+    json_bodies = [
+        json.dumps([dict(event, session_id="session-0123456789abcdef") for event in batch]).encode('utf-8')
+        for batch in batches
+    ]
+    binary_bodies = [encode_batch("session-0123456789abcdef", batch) for batch in batches]
+
+    json_rows, json_time = timed(decode_json, json_bodies, args.repeat)
+    binary_rows, binary_time = timed(decode_binary, binary_bodies, args.repeat)
+
+    print(f"{'format':<8} {'bytes/event':>12} {'us/event':>9} {'events/s':>11}")
+    for name, bodies, elapsed in (('json', json_bodies, json_time), ('binary', binary_bodies, binary_time)):
+        size = sum(len(body) for body in bodies)
+        print(f"{name:<8} {size / args.events:>12.1f} {elapsed / args.events * 1e6:>9.2f} "
+              f"{args.events / elapsed:>11.0f}")
+
+    if not all(same_rows(a, b) for a, b in zip(json_rows, binary_rows)):
+        print("[ERROR] Binary batches decoded to different rows than JSON")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Compare the visualizer's binned FFT KDE with scipy's gaussian_kde.
+
+Both estimate the density of synthetic clustered points on the 200x200
+grid the heatmaps use, with Scott and Silverman bandwidths, with and
+without the 2.0 / 1.0 death / stealth weighting. The error column is
+the largest difference from scipy as a fraction of scipy's peak, and the
+run fails if any case exceeds --tolerance.
+
+scipy's cost grows with points x grid nodes, so it is skipped above
+--scipy-limit points and only the binned timing is shown.
+
+Usage:
+    python benchmarks/bench_kde.py --points 1000 10000 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.stats import gaussian_kde
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from visualizer import kde
+
+EXTENT = (0, 1000, 0, 1000)
+SIZE = 200
+
+
+def clustered_points(count, rng):
+    """Points around a few hotspots, a bit like deaths near hazards."""
+    centres = np.array([[250, 300], [600, 700], [800, 250]])
+    spread = np.array([[50, 30], [40, 90], [25, 25]])
+    which = rng.integers(0, len(centres), count)
+    points = rng.normal(centres[which], spread[which])
+    weights = rng.choice([2.0, 1.0], count)
+    return points[:, 0], points[:, 1], weights
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def run_case(x, y, weights, bw_method, scipy_limit):
+    (xi, yi, binned), binned_time = timed(
+        lambda: kde.evaluate(x, y, EXTENT, SIZE, weights=weights, bw_method=bw_method)
+    )
+    if len(x) > scipy_limit:
+        return binned_time, None, None
+
+    def reference():
+        estimator = gaussian_kde(np.vstack([x, y]), bw_method=bw_method, weights=weights)
+        return estimator(np.vstack([xi.ravel(), yi.ravel()])).reshape(xi.shape)
+
+    exact, exact_time = timed(reference)
+    error = np.abs(binned - exact).max() / exact.max()
+    return binned_time, exact_time, error
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the binned KDE against scipy')
+    parser.add_argument('--points', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Point counts to try')
+    parser.add_argument('--scipy-limit', type=int, default=20000,
+                        help='Skip scipy above this many points')
+    parser.add_argument('--tolerance', type=float, default=0.01,
+                        help='Largest allowed error relative to the peak density')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'points':>8} {'bandwidth':<10} {'weights':<8} {'binned ms':>10} {'scipy ms':>10} {'speedup':>8} {'error':>9}")
+    failed = False
+    for count in args.points:
+        x, y, weights = clustered_points(count, rng)
+        for bw_method in ('scott', 'silverman'):
+            for weighted in (False, True):
+                binned_time, exact_time, error = run_case(
+                    x, y, weights if weighted else None, bw_method, args.scipy_limit
+                )
+                row = f"{count:>8} {bw_method:<10} {'2:1' if weighted else 'none':<8} {binned_time * 1000:>10.1f}"
+                if exact_time is None:
+                    print(f"{row} {'-':>10} {'-':>8} {'-':>9}")
+                    continue
+                print(f"{row} {exact_time * 1000:>10.1f} {exact_time / binned_time:>7.0f}x {error:>9.2e}")
+                failed = failed or error > args.tolerance
+
+    if failed:
+        print(f"[ERROR] Binned KDE differs from scipy by more than {args.tolerance:.0%} of the peak")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
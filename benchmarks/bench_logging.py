@@ -0,0 +1,152 @@
+"""
+Measure what server logging costs on the ingest path.
+
+The Overseer is started once per logging setup against a scratch SQLite
+database, with the event buffer on so the database stays off the
+request path. Its stdout goes to a pipe that the benchmark drains, like
+a process supervisor or container runtime would. Concurrent keep-alive
+clients then POST /event, which logs an access line and an "Event
+recorded" line per request.
+
+    print     LOG_ASYNC=false, no sampling (formatted and written in the handler)
+    queued    LOG_ASYNC=true, no sampling
+    sampled   LOG_ASYNC=true, LOG_SAMPLE_PER_SECOND=50
+    off       LOG_LEVEL=off
+
+Run with PYTHONUNBUFFERED=1 to model a server whose stdout is unbuffered,
+as it usually is under Docker or systemd.
+
+Usage:
+    python benchmarks/bench_logging.py --clients 16 --requests 1000
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETUPS = {
+    'print': {'LOG_ASYNC': 'false', 'LOG_SAMPLE_PER_SECOND': '0'},
+    'queued': {'LOG_ASYNC': 'true', 'LOG_SAMPLE_PER_SECOND': '0'},
+    'sampled': {'LOG_ASYNC': 'true', 'LOG_SAMPLE_PER_SECOND': '50'},
+    'off': {'LOG_LEVEL': 'off'},
+}
+
+EVENT = {"session_id": "bench-session", "event_type": "PLAYER_DEATH", "x": 120.5, "y": 88.0,
+         "meta": {"cause": "guard"}}
+
+
+def post(conn, path, body):
+    conn.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+
+def wait_for_port(port, timeout=20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not come up")
+
+
+def start_server(setup, port, scratch, mode):
+    env = dict(os.environ, DB_BACKEND='sqlite', SQLITE_PATH=os.path.join(scratch, f'{setup}.db'),
+               SEGMENT_DIR=os.path.join(scratch, f'{setup}-segments'),
+               SPOOL_DIR=os.path.join(scratch, f'{setup}-spool'),
+               SERVER_PORT=str(port), SERVER_MODE=mode, EVENT_BUFFER_ENABLED='true',
+               LOG_LEVEL='info', LOG_LEVELS='', LOG_FORMAT='text')
+    env.update(SETUPS[setup])
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, 'backend', 'server.py')],
+                            cwd=os.path.join(ROOT, 'backend'), env=env,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    written = [0]
+
+    def drain():
+        for chunk in iter(lambda: proc.stdout.read1(65536), b""):
+            written[0] += len(chunk)
+
+    threading.Thread(target=drain, daemon=True).start()
+    return proc, written
+
+
+def run_clients(port, clients, requests):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        local = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            post(conn, "/event", EVENT)
+            local.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, sorted(latencies)
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Overseer logging on the ingest path')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent client connections')
+    parser.add_argument('--requests', type=int, default=1000, help='Requests per client')
+    parser.add_argument('--mode', choices=['threaded', 'async'], default='async', help='HTTP engine')
+    parser.add_argument('--port', type=int, default=18091, help='Port to benchmark on')
+    parser.add_argument('--setups', nargs='+', choices=list(SETUPS), default=list(SETUPS))
+    args = parser.parse_args()
+
+    print(f"{'setup':<8} {'req/s':>8} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'log KB':>8}")
+    with tempfile.TemporaryDirectory() as scratch:
+        for setup in args.setups:
+            proc, written = start_server(setup, args.port, scratch, args.mode)
+            try:
+                wait_for_port(args.port)
+                conn = http.client.HTTPConnection("127.0.0.1", args.port, timeout=10)
+                post(conn, "/session/start", {"session_id": EVENT["session_id"], "user_id": "bench-user"})
+                conn.close()
+                # Warm up, then measure only the log output of the timed run
+                run_clients(args.port, args.clients, 20)
+                time.sleep(1.5)
+                before = written[0]
+                elapsed, latencies = run_clients(args.port, args.clients, args.requests)
+                time.sleep(1.5)
+                logged = written[0] - before
+            finally:
+                proc.terminate()
+                proc.wait()
+            total = len(latencies)
+            print(f"{setup:<8} {total / elapsed:>8.0f} "
+                  f"{sum(latencies) / total * 1000:>8.2f} "
+                  f"{percentile(latencies, 50) * 1000:>8.2f} "
+                  f"{percentile(latencies, 99) * 1000:>8.2f} "
+                  f"{logged / 1024:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
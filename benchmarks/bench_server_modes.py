@@ -0,0 +1,108 @@
+"""
+Compare the threaded and asyncio HTTP engines of the Overseer.
+
+Each engine is started in its own process and hit with concurrent
+clients that reuse their connection where the server allows it. Only
+GET /health is exercised so the numbers reflect transport and routing
+cost, not database latency.
+
+Usage:
+    python benchmarks/bench_server_modes.py --clients 32 --requests 500
+"""
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+
+def serve(mode, port):
+    """Child process entry point: run one engine without a database."""
+    from backend import server
+    server.PORT = port
+    sys.stdout = open(os.devnull, 'w')
+    server.run_server(mode)
+
+
+def wait_for_port(port, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not come up")
+
+
+def run_clients(port, clients, requests):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        local = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            conn.request("GET", "/health")
+            conn.getresponse().read()
+            local.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return elapsed, sorted(latencies)
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Overseer HTTP engines')
+    parser.add_argument('--clients', type=int, default=32, help='Concurrent client connections')
+    parser.add_argument('--requests', type=int, default=500, help='Requests per client')
+    parser.add_argument('--port', type=int, default=18090, help='Port to benchmark on')
+    parser.add_argument('--serve', choices=['threaded', 'async'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    print(f"{'mode':<10} {'req/s':>10} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for mode in ('threaded', 'async'):
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', mode, '--port', str(args.port)])
+        try:
+            wait_for_port(args.port)
+            elapsed, latencies = run_clients(args.port, args.clients, args.requests)
+        finally:
+            proc.terminate()
+            proc.wait()
+        total = len(latencies)
+        print(f"{mode:<10} {total / elapsed:>10.0f} "
+              f"{sum(latencies) / total * 1000:>8.2f} "
+              f"{percentile(latencies, 50) * 1000:>8.2f} "
+              f"{percentile(latencies, 95) * 1000:>8.2f} "
+              f"{percentile(latencies, 99) * 1000:>8.2f} "
+              f"{latencies[-1] * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Compare event ingest throughput of the MySQL and SQLite backends.
+
+Each backend runs in its own process (DB_BACKEND is read at import
+time) against a scratch database. Events are written with the server's
+own insert path, first one commit per event (the unbuffered /event
+path) and then in groups (the /events/batch and write-behind path).
+
+Usage:
+    python benchmarks/bench_storage.py --events 20000 --batch 200
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+
+def measure(events, batch):
+    """Child process entry point: time ingest on the configured backend."""
+    from backend import server
+    from database import storage
+
+    if not server.initialize_database():
+        return {"error": f"cannot reach {storage.describe()}"}
+
+    conn = storage.connect()
+    cursor = conn.cursor()
+    session_id = f"bench-{os.getpid()}-{time.time_ns()}"
+    cursor.execute(f"{storage.SQL.insert_ignore} INTO users (user_id, username, created_at) VALUES (%s, %s, %s)",
+                   ("bench-user", "Bench", 0))
+    cursor.execute("INSERT INTO sessions (session_id, user_id, start_time, os_info) VALUES (%s, %s, %s, %s)",
+                   (session_id, "bench-user", 0, "bench"))
+    conn.commit()
+
+    def row(i):
+        return (session_id, "PLAYER_DEATH", float(i % 1000), float(i % 777), i, json.dumps({"cause": "bench"}))
+
+    results = {"backend": storage.describe()}
+
+    # Unbuffered: one INSERT + COMMIT per event, on a tenth of the events
+    single = max(1, events // 10)
+    started = time.perf_counter()
+    for i in range(single):
+        server.insert_events(cursor, [row(i)])
+        conn.commit()
+    results["single_events_per_sec"] = round(single / (time.perf_counter() - started))
+
+    # Batched: multi-row INSERT + one COMMIT per group
+    started = time.perf_counter()
+    for offset in range(0, events, batch):
+        server.insert_events(cursor, [row(i) for i in range(offset, min(events, offset + batch))])
+        conn.commit()
+    results["batched_events_per_sec"] = round(events / (time.perf_counter() - started))
+
+    cursor.execute("DELETE FROM events WHERE session_id = %s", (session_id,))
+    cursor.execute("DELETE FROM sessions WHERE session_id = %s", (session_id,))
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ingest throughput per storage backend')
+    parser.add_argument('--events', type=int, default=20000, help='Events written in batched mode')
+    parser.add_argument('--batch', type=int, default=200, help='Events per multi-row INSERT')
+    parser.add_argument('--backends', default='sqlite,mysql', help='Comma-separated backends to run')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.stdout, real_stdout = open(os.devnull, 'w'), sys.stdout
+        result = measure(args.events, args.batch)
+        real_stdout.write(json.dumps(result))
+        return
+
+    print(f"{'backend':<10} {'single ev/s':>12} {'batched ev/s':>13}")
+    with tempfile.TemporaryDirectory() as scratch:
+        for backend in args.backends.split(','):
+            env = dict(os.environ, DB_BACKEND=backend, SQLITE_PATH=os.path.join(scratch, 'bench.db'))
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child',
+                 '--events', str(args.events), '--batch', str(args.batch)],
+                env=env, capture_output=True, text=True
+            )
+            try:
+                result = json.loads(proc.stdout)
+            except json.JSONDecodeError:
+                result = {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "no output"}
+            if "error" in result:
+                print(f"{backend:<10} skipped: {result['error']}")
+                continue
+            print(f"{backend:<10} {result['single_events_per_sec']:>12} {result['batched_events_per_sec']:>13}")
+
+
+if __name__ == "__main__":
+    main()
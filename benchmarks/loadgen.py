@@ -0,0 +1,340 @@
+"""
+Replay realistic game traffic against the Overseer and record a baseline.
+
+Each virtual player registers once, then plays sessions: POST
+/session/start, bursts of POST /event and POST /events/batch covering
+all seven event types, a POST /save/upload, a GET /leaderboard read and
+POST /session/end. Every player draws from its own seeded RNG, so the
+same --seed and player count replay the same requests.
+
+By default the load generator starts its own server with a scratch
+SQLite database standing in for MySQL, so runs don't touch real data.
+Use --target host:port to drive a server that is already running.
+
+The report lists throughput and p50/p95/p99 latency per route. --save
+writes the numbers to a JSON baseline. --compare checks a run against
+a saved baseline and exits 1 if a route's throughput dropped, or its
+p95/p99 rose, by more than --tolerance.
+
+Usage:
+    python benchmarks/loadgen.py --players 16 --sessions 10 --save baseline.json
+    python benchmarks/loadgen.py --players 16 --sessions 10 --compare baseline.json
+    python benchmarks/loadgen.py --mode async --env DB_POOL_SIZE=10 --compare baseline.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EVENT_TYPES = ["STEALTH_BROKEN", "PLAYER_DEATH", "ITEM_USED", "LEVEL_COMPLETE",
+               "ENEMY_ALERT", "CHECKPOINT", "DAMAGE_TAKEN"]
+
+# Relative frequency of each event type in a play session
+EVENT_WEIGHTS = [6, 3, 8, 1, 10, 4, 12]
+
+LEADERBOARD_READS = [
+    "/leaderboard?category=playtime&limit=20",
+    "/leaderboard?category=deaths&limit=20",
+    "/leaderboard?category=completions&limit=10",
+    "/leaderboard?category=fastest&level=3&limit=10",
+]
+
+ROUTES = ["/user/register", "/session/start", "/event", "/events/batch", "/save/upload",
+          "/leaderboard", "/session/end"]
+
+
+def random_event(rng, session_id=None):
+    event_type = rng.choices(EVENT_TYPES, EVENT_WEIGHTS)[0]
+    event = {"event_type": event_type, "x": round(rng.uniform(0, 1000), 2), "y": round(rng.uniform(0, 1000), 2)}
+    if session_id:
+        event["session_id"] = session_id
+    if event_type == "PLAYER_DEATH":
+        event["meta"] = {"cause": rng.choice(["guard", "laser", "drone"])}
+    elif event_type == "ITEM_USED":
+        event["meta"] = {"item": rng.choice(["medkit", "decoy", "emp"])}
+    elif event_type == "DAMAGE_TAKEN":
+        event["meta"] = {"damage": rng.randint(5, 40), "source": rng.choice(["guard", "turret"])}
+    elif event_type == "LEVEL_COMPLETE":
+        event["meta"] = {"level": str(rng.randint(1, 5)), "time_seconds": rng.randint(90, 600)}
+    return event
+
+
+class Recorder:
+    """Latencies and status codes per route, shared by every player."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {route: [] for route in ROUTES}
+        self.errors = {route: 0 for route in ROUTES}
+
+    def merge(self, latencies, errors):
+        with self.lock:
+            for route in ROUTES:
+                self.latencies[route].extend(latencies[route])
+                self.errors[route] += errors[route]
+
+
+class Player:
+    """One simulated game client with its own connection and RNG."""
+
+    def __init__(self, index, host, port, seed, sessions, max_burst, batch_size):
+        self.rng = random.Random(seed * 100003 + index)
+        self.user_id = f"loadgen-{seed}-{index}"
+        self.conn = http.client.HTTPConnection(host, port, timeout=30)
+        self.sessions = sessions
+        self.max_burst = max_burst
+        self.batch_size = batch_size
+        self.latencies = {route: [] for route in ROUTES}
+        self.errors = {route: 0 for route in ROUTES}
+        self.playtime = 0
+
+    def request(self, route, method, path, body=None):
+        payload = json.dumps(body) if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload else {}
+        started = time.perf_counter()
+        try:
+            self.conn.request(method, path, payload, headers)
+            response = self.conn.getresponse()
+            response.read()
+            ok = 200 <= response.status < 300
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            ok = False
+        self.latencies[route].append(time.perf_counter() - started)
+        if not ok:
+            self.errors[route] += 1
+
+    def play(self):
+        rng = self.rng
+        self.request("/user/register", "POST", "/user/register",
+                     {"user_id": self.user_id, "username": self.user_id})
+        for number in range(self.sessions):
+            session_id = f"{self.user_id}-s{number}"
+            self.request("/session/start", "POST", "/session/start",
+                         {"session_id": session_id, "user_id": self.user_id,
+                          "starting_total_playtime": self.playtime})
+            for _ in range(rng.randint(1, 4)):
+                # Single events as they happen, then a batch flushed by the client
+                for _ in range(rng.randint(1, self.max_burst)):
+                    self.request("/event", "POST", "/event", random_event(rng, session_id))
+                batch = [random_event(rng, session_id) for _ in range(rng.randint(1, self.batch_size))]
+                self.request("/events/batch", "POST", "/events/batch", batch)
+            session_seconds = rng.randint(60, 900)
+            self.playtime += session_seconds
+            self.request("/save/upload", "POST", "/save/upload", {
+                "user_id": self.user_id,
+                "save_data": {
+                    "totalPlaytimeSeconds": self.playtime,
+                    "level_data": {"current_level": rng.randint(1, 5), "checkpoints": rng.sample(range(20), 5)},
+                    "inventory_data": {"medkit": rng.randint(0, 3), "decoy": rng.randint(0, 2)},
+                },
+            })
+            self.request("/leaderboard", "GET", rng.choice(LEADERBOARD_READS + [f"/leaderboard?user={self.user_id}"]))
+            self.request("/session/end", "POST", "/session/end",
+                         {"session_id": session_id, "playtime_seconds": session_seconds,
+                          "total_playtime_seconds": self.playtime})
+        self.conn.close()
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    if not latencies:
+        return None
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def run_load(host, port, args):
+    recorder = Recorder()
+    players = [Player(index, host, port, args.seed, args.sessions, args.max_burst, args.batch_size)
+               for index in range(args.players)]
+
+    def play(player):
+        player.play()
+        recorder.merge(player.latencies, player.errors)
+
+    threads = [threading.Thread(target=play, args=(player,)) for player in players]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    routes = {}
+    for route in ROUTES:
+        summary = summarize(recorder.latencies[route], recorder.errors[route], elapsed)
+        if summary:
+            routes[route] = summary
+    everything = [value for route in ROUTES for value in recorder.latencies[route]]
+    total = summarize(everything, sum(recorder.errors.values()), elapsed)
+    return {"elapsed_seconds": round(elapsed, 3), "routes": routes, "total": total}
+
+
+def wait_for_port(host, port, timeout=20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=1)
+            conn.request("GET", "/health")
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on {host}:{port} did not come up")
+
+
+def start_server(port, scratch, mode, overrides):
+    """Start a server on a scratch SQLite database, output discarded."""
+    env = dict(os.environ, DB_BACKEND='sqlite', SQLITE_PATH=os.path.join(scratch, 'loadgen.db'),
+               SEGMENT_DIR=os.path.join(scratch, 'segments'), SPOOL_DIR=os.path.join(scratch, 'spool'),
+               SERVER_PORT=str(port), SERVER_MODE=mode, SERVER_WORKERS='1', LOG_LEVEL='warning')
+    env.update(overrides)
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, 'backend', 'server.py')],
+                            cwd=os.path.join(ROOT, 'backend'), env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(result):
+    print(f"{'route':<16} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    rows = list(result["routes"].items()) + [("total", result["total"])]
+    for route, stats in rows:
+        print(f"{route:<16} {stats['requests']:>8} {stats['errors']:>6} {stats['throughput']:>8.1f} "
+              f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+
+
+def compare(result, run, baseline, tolerance):
+    """Print changes against a baseline; returns the routes that regressed."""
+    regressions = []
+    print(f"\nAgainst baseline from {baseline['run'].get('started_at')} "
+          f"(revision {baseline['run'].get('revision') or 'unknown'}), tolerance {tolerance:.0%}:")
+    differing = [key for key in ("mode", "env", "players", "sessions", "max_burst", "batch_size", "seed", "cpus")
+                 if baseline['run'].get(key) != run[key]]
+    if differing:
+        print(f"[WARNING] Baseline was recorded with different settings: {', '.join(differing)}")
+    print(f"{'route':<16} {'req/s':>9} {'p95':>9} {'p99':>9}")
+    current = dict(result["routes"], total=result["total"])
+    previous = dict(baseline["routes"], total=baseline["total"])
+    for route, stats in current.items():
+        before = previous.get(route)
+        if not before:
+            continue
+        changes = {key: (stats[key] - before[key]) / before[key] if before[key] else 0.0
+                   for key in ("throughput", "p95_ms", "p99_ms")}
+        regressed = (changes["throughput"] < -tolerance or changes["p95_ms"] > tolerance
+                     or changes["p99_ms"] > tolerance)
+        if regressed:
+            regressions.append(route)
+        print(f"{route:<16} {changes['throughput']:>+9.1%} {changes['p95_ms']:>+9.1%} "
+              f"{changes['p99_ms']:>+9.1%}{'  REGRESSED' if regressed else ''}")
+    return regressions
+
+
+def parse_overrides(pairs):
+    overrides = {}
+    for pair in pairs:
+        key, separator, value = pair.partition('=')
+        if not separator:
+            raise argparse.ArgumentTypeError(f"--env expects KEY=VALUE, got {pair}")
+        overrides[key] = value
+    return overrides
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay game traffic against the Overseer and record baselines')
+    parser.add_argument('--players', type=int, default=16, help='Concurrent simulated players')
+    parser.add_argument('--sessions', type=int, default=10, help='Play sessions per player')
+    parser.add_argument('--max-burst', type=int, default=8, help='Most single /event posts in a burst')
+    parser.add_argument('--batch-size', type=int, default=50, help='Most events in one /events/batch post')
+    parser.add_argument('--seed', type=int, default=7, help='Seed for the traffic mix')
+    parser.add_argument('--mode', choices=['threaded', 'async'], default='threaded', help='HTTP engine to start')
+    parser.add_argument('--port', type=int, default=18092, help='Port for the server started by the load generator')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='Extra environment for the started server (repeatable)')
+    parser.add_argument('--target', help='host:port of a running server to drive instead')
+    parser.add_argument('--save', help='Write the results to this JSON baseline file')
+    parser.add_argument('--compare', help='Compare against this JSON baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Allowed relative drop in throughput or rise in p95/p99 (default 0.10)')
+    args = parser.parse_args()
+    overrides = parse_overrides(args.env)
+
+    run = {
+        "started_at": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "target": args.target or "local",
+        "mode": None if args.target else args.mode,
+        "env": overrides,
+        "players": args.players,
+        "sessions": args.sessions,
+        "max_burst": args.max_burst,
+        "batch_size": args.batch_size,
+        "seed": args.seed,
+    }
+
+    if args.target:
+        host, _, port = args.target.rpartition(':')
+        host, port = host or "127.0.0.1", int(port)
+        wait_for_port(host, port)
+        result = run_load(host, port, args)
+    else:
+        with tempfile.TemporaryDirectory() as scratch:
+            proc = start_server(args.port, scratch, args.mode, overrides)
+            try:
+                wait_for_port("127.0.0.1", args.port)
+                result = run_load("127.0.0.1", args.port, args)
+            finally:
+                proc.terminate()
+                proc.wait()
+
+    print_report(result)
+    baseline = dict(result, run=run)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, run, json.load(f), args.tolerance)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"\nBaseline written to {args.save}")
+    if regressions:
+        print(f"[ERROR] Regressed against {args.compare}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Fixed-resolution 2D histograms of event positions per (event_type, level).
+
+The server bins every committed event into an in-memory delta grid and
+periodically adds the deltas to the `heatmap_bins` table. Deltas are
+additive, so any number of worker processes can checkpoint side by side.
+The visualizer renders from these grids, so a heatmap costs the same at
+ten events or ten million.
+
+Grid geometry comes from var.py (HEATMAP_GRID_*). Bin (ix, iy) covers
+x in [ix * w, (ix + 1) * w) where w = width / bins, and likewise for y.
+Points outside the map are tallied in the sentinel bin (-1, -1) so the
+visualizer can warn about them. After changing the geometry, run
+`python database/grids.py --rebuild`.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import var
+from database import storage
+from database.storage import Error, SQL
+from database.rollups import event_level
+
+EXTENT = (var.HEATMAP_GRID_WIDTH, var.HEATMAP_GRID_HEIGHT)
+BINS = var.HEATMAP_GRID_BINS
+
+OUTSIDE = (-1, -1)
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS heatmap_bins (
+        event_type VARCHAR(50) NOT NULL,
+        level VARCHAR(255) NOT NULL,
+        ix INT NOT NULL,
+        iy INT NOT NULL,
+        event_count BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (event_type, level, ix, iy)
+    )
+    """,
+]
+
+
+class Grid:
+    """
+    Binned counts for one heatmap: counts[ix, iy] over a width x height
+    map. `points` is the number of events behind the counts, which stays
+    put when a grid is scaled by a weight, and `sum_sq` is the sum of
+    squared event weights (the KDE's effective sample size needs it).
+    """
+
+    def __init__(self, counts, extent=EXTENT, outside=0, points=None, sum_sq=None):
+        self.counts = counts
+        self.extent = extent
+        self.outside = outside
+        self.points = int(counts.sum()) if points is None else points
+        self.sum_sq = float(counts.sum()) if sum_sq is None else sum_sq
+
+    def __len__(self):
+        return self.points
+
+    @property
+    def bins(self):
+        return self.counts.shape
+
+    def centers(self):
+        """Bin-centre coordinates along x and y."""
+        (bins_x, bins_y), (width, height) = self.counts.shape, self.extent
+        return (
+            (np.arange(bins_x) + 0.5) * (width / bins_x),
+            (np.arange(bins_y) + 0.5) * (height / bins_y),
+        )
+
+    def __add__(self, other):
+        return Grid(self.counts + other.counts, self.extent, self.outside + other.outside,
+                    self.points + other.points, self.sum_sq + other.sum_sq)
+
+    def __mul__(self, weight):
+        return Grid(self.counts * weight, self.extent, self.outside,
+                    self.points, self.sum_sq * weight * weight)
+
+
+def bin_indices(x, y, extent=EXTENT, bins=BINS):
+    """Integer bin indices for coordinate arrays, plus an in-bounds mask."""
+    ix = np.floor(np.asarray(x, dtype=float) * (bins / extent[0])).astype(np.int64)
+    iy = np.floor(np.asarray(y, dtype=float) * (bins / extent[1])).astype(np.int64)
+    inside = (ix >= 0) & (ix < bins) & (iy >= 0) & (iy < bins)
+    return ix, iy, inside
+
+
+class GridAccumulator:
+    """
+    Per-process delta grids, flushed by a background thread every
+    `interval` seconds through `checkpoint_fn(deltas)`. Thread-safe.
+
+    `deltas` maps (event_type, level) to (counts, outside). If the
+    checkpoint raises, the deltas are merged back and retried next time,
+    and `on_error(exception)` is called if given.
+    """
+
+    def __init__(self, extent=EXTENT, bins=BINS, on_error=None):
+        self.extent = extent
+        self.bins = bins
+        self.on_error = on_error
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _grid(self, key):
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = self._pending[key] = [np.zeros((self.bins, self.bins), dtype=np.int64), 0]
+        return entry
+
+    def add(self, rows):
+        """Bin server event rows (session_id, event_type, x, y, timestamp, meta)."""
+        groups = {}
+        for _, event_type, x, y, _, meta in rows:
+            groups.setdefault((event_type, event_level(meta) or ''), []).append((x, y))
+        with self._lock:
+            for key, points in groups.items():
+                points = np.asarray(points, dtype=float)
+                ix, iy, inside = bin_indices(points[:, 0], points[:, 1], self.extent, self.bins)
+                entry = self._grid(key)
+                np.add.at(entry[0], (ix[inside], iy[inside]), 1)
+                entry[1] += int((~inside).sum())
+
+    def take(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def restore(self, deltas):
+        with self._lock:
+            for key, (counts, outside) in deltas.items():
+                entry = self._grid(key)
+                entry[0] += counts
+                entry[1] += outside
+
+    def checkpoint(self, checkpoint_fn):
+        deltas = self.take()
+        if not deltas:
+            return
+        try:
+            checkpoint_fn(deltas)
+        except Exception as e:
+            self.restore(deltas)
+            if self.on_error:
+                self.on_error(e)
+
+    def start(self, checkpoint_fn, interval):
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                self.checkpoint(checkpoint_fn)
+
+        self._thread = threading.Thread(target=run, name="grid-checkpoint", daemon=True)
+        self._thread.start()
+
+    def stop(self, checkpoint_fn):
+        """Stop the checkpoint thread and flush what is left."""
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self.checkpoint(checkpoint_fn)
+
+
+def write_deltas(cursor, deltas):
+    """Add delta grids to heatmap_bins (caller commits)."""
+    upsert = SQL.upsert_add.format(keys="event_type, level, ix, iy", column='event_count')
+    params = []
+    for (event_type, level), (counts, outside) in sorted(deltas.items()):
+        ix, iy = np.nonzero(counts)
+        params.extend(
+            (event_type, level, int(i), int(j), int(n))
+            for i, j, n in zip(ix, iy, counts[ix, iy])
+        )
+        if outside:
+            params.append((event_type, level) + OUTSIDE + (outside,))
+    for offset in range(0, len(params), 1000):
+        cursor.executemany(
+            f"INSERT INTO heatmap_bins (event_type, level, ix, iy, event_count) VALUES (%s, %s, %s, %s, %s) {upsert}",
+            params[offset:offset + 1000]
+        )
+
+
+def rebuild(cursor):
+    """Recompute heatmap_bins from events. Pause ingest first."""
+    accumulator = GridAccumulator()
+    cursor.execute("SELECT session_id, event_type, x_coord, y_coord, timestamp, meta_data FROM events")
+    batch = cursor.fetchmany(10000)
+    while batch:
+        accumulator.add([row for row in batch if None not in row[1:4]])
+        batch = cursor.fetchmany(10000)
+    cursor.execute("DELETE FROM heatmap_bins")
+    write_deltas(cursor, accumulator.take())
+
+
+def load_grids(cursor, event_types, level=None):
+    """{event_type: Grid} in one query, summed over levels unless one is given."""
+    placeholders = ", ".join(["%s"] * len(event_types))
+    query = f"SELECT event_type, ix, iy, SUM(event_count) FROM heatmap_bins WHERE event_type IN ({placeholders})"
+    params = list(event_types)
+    if level is not None:
+        query += " AND level = %s"
+        params.append(level)
+    cursor.execute(query + " GROUP BY event_type, ix, iy", tuple(params))
+    counts = {event_type: np.zeros((BINS, BINS), dtype=np.float64) for event_type in event_types}
+    outside = dict.fromkeys(event_types, 0)
+    for event_type, ix, iy, count in cursor.fetchall():
+        if (ix, iy) == OUTSIDE:
+            outside[event_type] = int(count)
+        elif 0 <= ix < BINS and 0 <= iy < BINS:
+            counts[event_type][ix, iy] = count
+    return {event_type: Grid(counts[event_type], EXTENT, outside[event_type]) for event_type in event_types}
+
+
+def load_grid(cursor, event_type, level=None):
+    """Grid for an event type, summed over levels unless one is given."""
+    return load_grids(cursor, [event_type], level)[event_type]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Overseer heatmap grids')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute grids from the events table')
+    args = parser.parse_args()
+
+    try:
+        conn = storage.connect()
+    except Error as e:
+        print(f"[ERROR] Connecting to {storage.describe()}: {e}")
+        sys.exit(1)
+
+    try:
+        cursor = conn.cursor()
+        if args.rebuild:
+            started = time.perf_counter()
+            rebuild(cursor)
+            conn.commit()
+            print(f"[SUCCESS] Heatmap grids rebuilt in {time.perf_counter() - started:.1f}s")
+        cursor.execute("""
+            SELECT event_type, SUM(event_count) FROM heatmap_bins
+            WHERE ix >= 0 GROUP BY event_type ORDER BY event_type
+        """)
+        print(f"[INFO] {BINS}x{BINS} bins over {EXTENT[0]}x{EXTENT[1]}")
+        for event_type, count in cursor.fetchall():
+            print(f"  {event_type}: {int(count)} events binned")
+        cursor.close()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,441 @@
+"""
+Versioned schema migrations for the Overseer database.
+
+Every migration runs once, in order, and is recorded in the
+`schema_migrations` table. The MySQL baseline (version 1) is
+database/schema.sql itself, so the file you can feed to `mysql` by hand
+and the schema the server builds never drift apart. Later changes are
+the Python steps below. Each step checks the catalog before it alters
+anything, so a database built by an older Overseer is adopted safely.
+
+On MySQL, `events` is range-partitioned by month on `timestamp`.
+Expiring old data is then a metadata-only DROP PARTITION instead of a
+long DELETE. SQLite has no partitioning, so it only gets the indexes.
+
+Usage:
+    python database/migrations.py                 # apply pending migrations
+    python database/migrations.py --status
+    python database/migrations.py --explain       # fail on full scans of events
+    python database/migrations.py --drop-before 2026-01-01
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import storage, rollups, grids
+from database.storage import Error
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+
+# Monthly partitions kept ready beyond the current month
+PARTITION_MONTHS_AHEAD = 3
+
+MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(255),
+        applied_at BIGINT
+    )
+"""
+
+SQLITE_BASELINE = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id TEXT PRIMARY KEY,
+        username TEXT,
+        total_playtime INTEGER DEFAULT 0,
+        created_at INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        user_id TEXT,
+        start_time INTEGER,
+        end_time INTEGER,
+        duration_seconds INTEGER DEFAULT 0,
+        os_info TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS events (
+        event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT,
+        event_type TEXT,
+        x_coord REAL,
+        y_coord REAL,
+        timestamp INTEGER,
+        meta_data TEXT,
+        FOREIGN KEY(session_id) REFERENCES sessions(session_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS save_files (
+        save_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT,
+        level_data TEXT,
+        inventory_data TEXT,
+        updated_at INTEGER,
+        FOREIGN KEY(user_id) REFERENCES users(user_id)
+    )
+    """,
+]
+
+# Queries that must search an index on their table rather than read all
+# of it (see --explain)
+INDEXED_QUERIES = [
+    ("heatmap by type", "events",
+     "SELECT x_coord, y_coord FROM events WHERE event_type=%s", ('PLAYER_DEATH',)),
+    ("heatmap by type and session", "events",
+     "SELECT x_coord, y_coord FROM events WHERE event_type=%s AND session_id=%s", ('PLAYER_DEATH', 'explain')),
+    ("events in time range", "events",
+     "SELECT * FROM events WHERE timestamp >= %s AND timestamp < %s ORDER BY event_id DESC LIMIT 100", (0, 1)),
+    ("stats hourly window", "event_counts_hourly",
+     "SELECT hour_start, event_type, event_count FROM event_counts_hourly WHERE hour_start >= %s ORDER BY hour_start", (0,)),
+    ("stats for a session", "event_counts_by_session",
+     "SELECT event_type, event_count FROM event_counts_by_session WHERE session_id = %s", ('explain',)),
+]
+
+
+# ============================================================================
+# CATALOG HELPERS
+# ============================================================================
+def read_schema_file():
+    """Statements from schema.sql, minus the database selection lines."""
+    with open(SCHEMA_FILE, encoding='utf-8') as handle:
+        text = re.sub(r'--[^\n]*', '', handle.read())
+    statements = []
+    for statement in text.split(';'):
+        statement = statement.strip()
+        if not statement or re.match(r'(CREATE DATABASE|USE)\b', statement, re.IGNORECASE):
+            continue
+        statements.append(statement)
+    return statements
+
+
+def column_exists(cursor, table, column):
+    if storage.BACKEND == 'sqlite':
+        cursor.execute(f"PRAGMA table_info({table})")
+        return any(row[1] == column for row in cursor.fetchall())
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+
+def index_exists(cursor, table, index):
+    if storage.BACKEND == 'sqlite':
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND name = %s", (index,))
+        return cursor.fetchone()[0] > 0
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    """, (table, index))
+    return cursor.fetchone()[0] > 0
+
+
+def month_start_ms(year, month):
+    """Epoch ms at 00:00 UTC on the first of the month (months may overflow 12)."""
+    year += (month - 1) // 12
+    month = (month - 1) % 12 + 1
+    return int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def partition_spec(year, month):
+    """Partition holding one month of events: (name, exclusive upper bound)."""
+    year += (month - 1) // 12
+    month = (month - 1) % 12 + 1
+    return f"p{year:04d}{month:02d}", month_start_ms(year, month + 1)
+
+
+def list_partitions(cursor):
+    """Bounded partitions of `events` as [(name, upper bound ms)], oldest first."""
+    cursor.execute("""
+        SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'events' AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """)
+    return [(name, int(bound)) for name, bound in cursor.fetchall() if bound != 'MAXVALUE']
+
+
+def is_partitioned(cursor):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'events' AND PARTITION_NAME IS NOT NULL
+    """)
+    return cursor.fetchone()[0] > 0
+
+
+# ============================================================================
+# MIGRATIONS
+# ============================================================================
+def baseline(cursor):
+    """Tables as of the first release."""
+    statements = SQLITE_BASELINE if storage.BACKEND == 'sqlite' else read_schema_file()
+    for statement in statements:
+        cursor.execute(statement)
+
+
+def add_missing_columns(cursor):
+    """Columns added after the first deployments went out."""
+    integer = "INTEGER" if storage.BACKEND == 'sqlite' else "INT"
+    bigint = "INTEGER" if storage.BACKEND == 'sqlite' else "BIGINT"
+    for table, column, definition in [
+        ('users', 'total_playtime', f"{integer} DEFAULT 0"),
+        ('users', 'created_at', bigint),
+        ('sessions', 'duration_seconds', f"{integer} DEFAULT 0"),
+    ]:
+        if not column_exists(cursor, table, column):
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def add_event_indexes(cursor):
+    """Serve heatmap filters and newest-first listings without full scans."""
+    for name, columns in [
+        ('idx_events_type_session', 'event_type, session_id'),
+        ('idx_events_timestamp', 'timestamp'),
+    ]:
+        if not index_exists(cursor, 'events', name):
+            cursor.execute(f"CREATE INDEX {name} ON events ({columns})")
+
+
+def partition_events(cursor):
+    """
+    Range-partition `events` by month (MySQL only).
+
+    MySQL requires the partitioning column in every unique key and does
+    not allow foreign keys on partitioned tables, so the primary key
+    becomes (event_id, timestamp) and the session foreign key is dropped,
+    so MySQL no longer rejects events for unknown sessions.
+    """
+    if storage.BACKEND == 'sqlite' or is_partitioned(cursor):
+        return
+
+    cursor.execute("""
+        SELECT CONSTRAINT_NAME FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'events' AND REFERENCED_TABLE_NAME IS NOT NULL
+    """)
+    for (constraint,) in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE events DROP FOREIGN KEY {constraint}")
+
+    cursor.execute("UPDATE events SET timestamp = 0 WHERE timestamp IS NULL")
+    cursor.execute("""
+        ALTER TABLE events
+            MODIFY timestamp BIGINT NOT NULL,
+            DROP PRIMARY KEY,
+            ADD PRIMARY KEY (event_id, timestamp)
+    """)
+
+    # One partition per month from the oldest event up to a few months ahead
+    cursor.execute("SELECT MIN(timestamp) FROM events WHERE timestamp > 0")
+    oldest = cursor.fetchone()[0]
+    now = datetime.now(timezone.utc)
+    first = datetime.fromtimestamp(oldest / 1000, timezone.utc) if oldest else now
+    months = (now.year - first.year) * 12 + (now.month - first.month) + PARTITION_MONTHS_AHEAD
+    partitions = [partition_spec(first.year, first.month + offset) for offset in range(months + 1)]
+    definitions = ",\n".join(f"PARTITION {name} VALUES LESS THAN ({bound})" for name, bound in partitions)
+    cursor.execute(f"""
+        ALTER TABLE events PARTITION BY RANGE (timestamp) (
+            {definitions},
+            PARTITION pmax VALUES LESS THAN MAXVALUE
+        )
+    """)
+
+
+def create_rollups(cursor):
+    """Rollup tables behind --stats and /stats, backfilled from events."""
+    for statement in rollups.SCHEMA:
+        cursor.execute(statement)
+    rollups.rebuild(cursor)
+
+
+def create_heatmap_bins(cursor):
+    """Pre-binned heatmap grids, backfilled from events."""
+    for statement in grids.SCHEMA:
+        cursor.execute(statement)
+    grids.rebuild(cursor)
+
+
+MIGRATIONS = [
+    (1, "baseline", baseline),
+    (2, "add missing columns", add_missing_columns),
+    (3, "event indexes", add_event_indexes),
+    (4, "partition events by month", partition_events),
+    (5, "event count rollups", create_rollups),
+    (6, "heatmap bin grids", create_heatmap_bins),
+]
+
+
+# ============================================================================
+# PUBLIC API
+# ============================================================================
+def applied_versions(cursor):
+    cursor.execute(MIGRATIONS_TABLE)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(conn):
+    """Apply every pending migration in order. Returns the versions applied."""
+    cursor = conn.cursor()
+    done = applied_versions(cursor)
+    applied = []
+    for version, name, step in MIGRATIONS:
+        if version in done:
+            continue
+        # MySQL commits DDL implicitly, so each step records itself right
+        # away; the catalog checks make a half-applied step safe to rerun
+        step(cursor)
+        cursor.execute(
+            "INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s, %s, %s)",
+            (version, name, int(time.time() * 1000))
+        )
+        conn.commit()
+        applied.append(version)
+    cursor.close()
+    return applied
+
+
+def ensure_partitions(conn, months_ahead=PARTITION_MONTHS_AHEAD):
+    """
+    Split `pmax` so monthly partitions exist through `months_ahead`
+    months from now. Returns the names of partitions added.
+    """
+    if storage.BACKEND == 'sqlite':
+        return []
+    cursor = conn.cursor()
+    if not is_partitioned(cursor):
+        cursor.close()
+        return []
+    existing = list_partitions(cursor)
+    now = datetime.now(timezone.utc)
+    horizon = month_start_ms(now.year, now.month + months_ahead + 1)
+    covered = existing[-1][1] if existing else month_start_ms(now.year, now.month)
+
+    added = []
+    while covered < horizon:
+        start = datetime.fromtimestamp(covered / 1000, timezone.utc)
+        added.append(partition_spec(start.year, start.month))
+        covered = added[-1][1]
+    if added:
+        definitions = ", ".join(f"PARTITION {name} VALUES LESS THAN ({bound})" for name, bound in added)
+        cursor.execute(f"""
+            ALTER TABLE events REORGANIZE PARTITION pmax INTO (
+                {definitions},
+                PARTITION pmax VALUES LESS THAN MAXVALUE
+            )
+        """)
+    cursor.close()
+    return [name for name, _ in added]
+
+
+def drop_events_before(conn, cutoff_ms):
+    """
+    Expire events older than `cutoff_ms`.
+
+    On MySQL, whole monthly partitions that end at or before the cutoff
+    are dropped, which is instant regardless of size; events in the
+    partition straddling the cutoff are kept. SQLite falls back to DELETE.
+    Returns a short description of what was removed.
+    """
+    cursor = conn.cursor()
+    try:
+        if storage.BACKEND == 'sqlite' or not is_partitioned(cursor):
+            cursor.execute("DELETE FROM events WHERE timestamp < %s", (cutoff_ms,))
+            conn.commit()
+            return f"deleted {cursor.rowcount} events"
+        expired = [name for name, bound in list_partitions(cursor) if bound <= cutoff_ms]
+        if expired:
+            cursor.execute(f"ALTER TABLE events DROP PARTITION {', '.join(expired)}")
+        return f"dropped partitions: {', '.join(expired) or 'none'}"
+    finally:
+        cursor.close()
+
+
+def explain(conn):
+    """
+    Query plans for INDEXED_QUERIES as [(label, plan text, full_scan)].
+
+    Reading every row of the table counts as a full scan even through an
+    index (SQLite's SCAN ... USING COVERING INDEX, MySQL's type=index);
+    only a SEARCH / ref / range lookup passes. MySQL may still pick a
+    scan on a near-empty table, where it is cheaper, so run this against
+    a database with realistic data.
+    """
+    cursor = conn.cursor()
+    results = []
+    for label, table, query, params in INDEXED_QUERIES:
+        if storage.BACKEND == 'sqlite':
+            cursor.execute(f"EXPLAIN QUERY PLAN {query}", params)
+            details = [row[3] for row in cursor.fetchall()]
+            full_scan = any(re.match(rf'SCAN (TABLE )?{table}\b', detail) for detail in details)
+        else:
+            cursor.execute(f"EXPLAIN {query}", params)
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            details = [f"type={row['type']} key={row['key']} extra={row['Extra']}" for row in rows]
+            full_scan = any(row['table'] == table and row['type'] in ('ALL', 'index') for row in rows)
+        results.append((label, "; ".join(details), full_scan))
+    cursor.close()
+    return results
+
+
+def parse_date(value):
+    return int(datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Overseer schema migrations')
+    parser.add_argument('--status', action='store_true', help='Show applied and pending migrations')
+    parser.add_argument('--explain', action='store_true', help='Check that hot queries use indexes')
+    parser.add_argument('--drop-before', type=str, help='Expire events before this UTC date (YYYY-MM-DD)')
+    args = parser.parse_args()
+
+    try:
+        conn = storage.connect(create=True)
+    except Error as e:
+        print(f"[ERROR] Connecting to {storage.describe()}: {e}")
+        sys.exit(1)
+
+    try:
+        if args.status:
+            cursor = conn.cursor()
+            done = applied_versions(cursor)
+            cursor.close()
+            for version, name, _ in MIGRATIONS:
+                state = "applied" if version in done else "pending"
+                print(f"  {version:3d}  {state:8s} {name}")
+            return
+
+        applied = migrate(conn)
+        added = ensure_partitions(conn)
+        if applied:
+            print(f"[INFO] Applied migrations {', '.join(map(str, applied))} to {storage.describe()}")
+        else:
+            print(f"[INFO] {storage.describe()} is up to date")
+        if added:
+            print(f"[INFO] Added event partitions: {', '.join(added)}")
+
+        if args.drop_before:
+            print(f"[INFO] {drop_events_before(conn, parse_date(args.drop_before))}")
+
+        if args.explain:
+            failed = False
+            for label, plan, full_scan in explain(conn):
+                print(f"  [{'FULL SCAN' if full_scan else 'ok'}] {label}: {plan}")
+                failed = failed or full_scan
+            if failed:
+                print("[ERROR] Some queries scan a whole table instead of searching an index")
+                sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Pre-aggregated event counts kept in step with the `events` table.
+
+The server tallies every batch of event rows in Python and upserts the
+counts in the same transaction as the INSERT, so the rollups are never
+ahead of or behind the committed events. Stats readers then sum a few
+thousand rollup rows instead of scanning millions of events.
+
+    event_counts_hourly      (hour_start, event_type)
+    event_counts_by_level    (level, event_type)   level from event meta
+    event_counts_by_session  (session_id, event_type)
+
+Usage:
+    python database/rollups.py            # print stats from the rollups
+    python database/rollups.py --rebuild  # recompute from events (backfill)
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import storage
+from database.storage import Error, SQL
+
+HOUR_MS = 3600 * 1000
+
+# table -> key columns (every table also has an event_count column)
+ROLLUPS = {
+    'event_counts_hourly': ('hour_start', 'event_type'),
+    'event_counts_by_level': ('level', 'event_type'),
+    'event_counts_by_session': ('session_id', 'event_type'),
+}
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS event_counts_hourly (
+        hour_start BIGINT NOT NULL,
+        event_type VARCHAR(50) NOT NULL,
+        event_count BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (hour_start, event_type)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS event_counts_by_level (
+        level VARCHAR(255) NOT NULL,
+        event_type VARCHAR(50) NOT NULL,
+        event_count BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (level, event_type)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS event_counts_by_session (
+        session_id VARCHAR(255) NOT NULL,
+        event_type VARCHAR(50) NOT NULL,
+        event_count BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (session_id, event_type)
+    )
+    """,
+]
+
+
+def event_level(meta):
+    """`level` from an event's meta JSON, or None."""
+    # Cheap substring test first: most events carry no level
+    if not meta or '"level"' not in meta:
+        return None
+    try:
+        level = json.loads(meta).get('level')
+    except (ValueError, AttributeError):
+        return None
+    return None if level is None else str(level)
+
+
+def tally(rows):
+    """Count server event rows (session_id, event_type, x, y, timestamp, meta) per rollup key."""
+    counts = {table: Counter() for table in ROLLUPS}
+    for session_id, event_type, _, _, timestamp, meta in rows:
+        counts['event_counts_hourly'][(timestamp - timestamp % HOUR_MS, event_type)] += 1
+        counts['event_counts_by_session'][(session_id, event_type)] += 1
+        level = event_level(meta)
+        if level is not None:
+            counts['event_counts_by_level'][(level, event_type)] += 1
+    return counts
+
+
+def apply(cursor, rows):
+    """Add a batch of event rows to the rollups (caller commits)."""
+    for table, counter in tally(rows).items():
+        if not counter:
+            continue
+        keys = ROLLUPS[table]
+        upsert = SQL.upsert_add.format(keys=", ".join(keys), column='event_count')
+        # Sorted so concurrent flushers lock rollup rows in the same order
+        params = [key + (count,) for key, count in sorted(counter.items())]
+        cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(keys)}, event_count) VALUES (%s, %s, %s) {upsert}",
+            params
+        )
+
+
+def rebuild(cursor):
+    """
+    Recompute every rollup from `events`. Counts for events committed
+    while this runs can be lost or doubled, so pause ingest first.
+    """
+    for table in ROLLUPS:
+        cursor.execute(f"DELETE FROM {table}")
+    cursor.execute(f"""
+        INSERT INTO event_counts_hourly (hour_start, event_type, event_count)
+        SELECT timestamp - timestamp % {HOUR_MS}, event_type, COUNT(*) FROM events
+        WHERE timestamp IS NOT NULL AND event_type IS NOT NULL
+        GROUP BY timestamp - timestamp % {HOUR_MS}, event_type
+    """)
+    cursor.execute("""
+        INSERT INTO event_counts_by_session (session_id, event_type, event_count)
+        SELECT session_id, event_type, COUNT(*) FROM events
+        WHERE session_id IS NOT NULL AND event_type IS NOT NULL
+        GROUP BY session_id, event_type
+    """)
+    level = SQL.json_text.format(column='meta_data', key='level')
+    cursor.execute(f"""
+        INSERT INTO event_counts_by_level (level, event_type, event_count)
+        SELECT {level}, event_type, COUNT(*) FROM events
+        WHERE {level} IS NOT NULL AND event_type IS NOT NULL
+        GROUP BY {level}, event_type
+    """)
+
+
+def read_stats(cursor, hours=24, session_id=None):
+    """Dashboard numbers from the rollups; never touches `events`."""
+    cursor.execute("""
+        SELECT event_type, SUM(event_count) FROM event_counts_hourly
+        GROUP BY event_type ORDER BY SUM(event_count) DESC
+    """)
+    by_type = {event_type: int(count) for event_type, count in cursor.fetchall()}
+
+    cursor.execute("SELECT COUNT(*) FROM sessions")
+    sessions = cursor.fetchone()[0]
+
+    cursor.execute("SELECT level, event_type, event_count FROM event_counts_by_level ORDER BY level")
+    levels = {}
+    for level, event_type, count in cursor.fetchall():
+        levels.setdefault(level, {})[event_type] = count
+
+    since = int(time.time() * 1000) // HOUR_MS * HOUR_MS - (hours - 1) * HOUR_MS
+    cursor.execute("""
+        SELECT hour_start, event_type, event_count FROM event_counts_hourly
+        WHERE hour_start >= %s ORDER BY hour_start
+    """, (since,))
+    hourly = [
+        {"hour_start": hour_start, "event_type": event_type, "count": count}
+        for hour_start, event_type, count in cursor.fetchall()
+    ]
+
+    stats = {
+        "total_events": sum(by_type.values()),
+        "events_by_type": by_type,
+        "sessions": sessions,
+        "levels": levels,
+        "hourly": hourly,
+    }
+    if session_id:
+        cursor.execute(
+            "SELECT event_type, event_count FROM event_counts_by_session WHERE session_id = %s",
+            (session_id,)
+        )
+        stats["session"] = {"session_id": session_id, "events_by_type": dict(cursor.fetchall())}
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Overseer event rollups')
+    parser.add_argument('--rebuild', action='store_true', help='Recompute rollups from the events table')
+    parser.add_argument('--hours', type=int, default=24, help='Hours of hourly counts to print')
+    args = parser.parse_args()
+
+    try:
+        conn = storage.connect()
+    except Error as e:
+        print(f"[ERROR] Connecting to {storage.describe()}: {e}")
+        sys.exit(1)
+
+    try:
+        cursor = conn.cursor()
+        if args.rebuild:
+            started = time.perf_counter()
+            rebuild(cursor)
+            conn.commit()
+            print(f"[SUCCESS] Rollups rebuilt in {time.perf_counter() - started:.1f}s")
+        print(json.dumps(read_stats(cursor, hours=args.hours), indent=2))
+        cursor.close()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
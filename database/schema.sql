@@ -1,4 +1,7 @@
 -- The Vault Schema (MySQL Compatible)
+-- This is migration 1, the baseline. database/migrations.py applies it and
+-- every later migration (columns, indexes, partitioning). Add new schema
+-- changes there, not here.
 CREATE DATABASE IF NOT EXISTS telemetry_db;
 USE telemetry_db;
 
@@ -0,0 +1,264 @@
+"""
+Append-only columnar segment store for event coordinates.
+
+Alongside the `events` table, the server appends every recorded event to
+fixed-width column files so heatmap tools can read millions of points
+with `np.memmap` instead of pulling tuples out of the database.
+
+Layout:
+
+    SEGMENT_DIR/
+        seg-<created ms>-<pid>-<seq>/
+            x.f32          float32 x coordinate
+            y.f32          float32 y coordinate
+            timestamp.i64  int64 server timestamp (ms)
+            type.u8        uint8 event type code (see EVENT_TYPE_CODES)
+            session.u32    uint32 index into sessions.jsonl
+            sessions.jsonl one JSON-encoded session_id per line
+
+Each writer process owns its segments, so several server workers can
+append side by side. A segment is never rewritten; readers take the
+shortest column length so a half-written tail is simply not visible yet.
+If a write fails part-way (e.g. a full disk), the columns are cut back
+to the last whole row and the segment is closed, so later rows start a
+new segment instead of landing out of line.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+COLUMNS = {
+    'x': np.dtype('<f4'),
+    'y': np.dtype('<f4'),
+    'timestamp': np.dtype('<i8'),
+    'type': np.dtype('u1'),
+    'session': np.dtype('<u4'),
+}
+
+COLUMN_FILES = {
+    'x': 'x.f32',
+    'y': 'y.f32',
+    'timestamp': 'timestamp.i64',
+    'type': 'type.u8',
+    'session': 'session.u32',
+}
+
+SESSIONS_FILE = 'sessions.jsonl'
+
+# Stable on-disk codes. Only ever append to this list.
+EVENT_TYPE_CODES = {
+    name: code for code, name in enumerate([
+        'STEALTH_BROKEN',
+        'PLAYER_DEATH',
+        'ITEM_USED',
+        'LEVEL_COMPLETE',
+        'ENEMY_ALERT',
+        'CHECKPOINT',
+        'DAMAGE_TAKEN',
+    ])
+}
+OTHER_TYPE_CODE = 255
+
+
+def type_code(event_type):
+    return EVENT_TYPE_CODES.get(event_type, OTHER_TYPE_CODE)
+
+
+class SegmentWriter:
+    """
+    Appends event rows to the current segment, rolling over to a new one
+    every `segment_rows` rows. Thread-safe.
+    """
+
+    def __init__(self, root, segment_rows=1_000_000):
+        self.root = root
+        self.segment_rows = segment_rows
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._path = None
+        self._files = {}
+        self._sessions_file = None
+        self._sessions = {}
+        self._rows = 0
+
+    def append(self, rows):
+        """
+        Append server event rows:
+        (session_id, event_type, x, y, timestamp, meta_json).
+        """
+        with self._lock:
+            while rows:
+                if self._path is None or self._rows >= self.segment_rows:
+                    self._roll()
+                take = min(len(rows), self.segment_rows - self._rows)
+                self._write(rows[:take])
+                rows = rows[take:]
+
+    def close(self):
+        with self._lock:
+            self._close_files()
+
+    def _roll(self):
+        self._close_files()
+        os.makedirs(self.root, exist_ok=True)
+        name = f"seg-{int(time.time() * 1000):013d}-{os.getpid()}-{self._seq:04d}"
+        self._seq += 1
+        self._path = os.path.join(self.root, name)
+        os.makedirs(self._path)
+        self._files = {
+            column: open(os.path.join(self._path, filename), 'ab')
+            for column, filename in COLUMN_FILES.items()
+        }
+        self._sessions_file = open(os.path.join(self._path, SESSIONS_FILE), 'a', encoding='utf-8')
+        self._sessions = {}
+        self._rows = 0
+
+    def _close_files(self):
+        for handle in self._files.values():
+            handle.close()
+        if self._sessions_file:
+            self._sessions_file.close()
+        self._files = {}
+        self._sessions_file = None
+        self._path = None
+
+    def _session_index(self, session_id):
+        index = self._sessions.get(session_id)
+        if index is None:
+            index = len(self._sessions)
+            self._sessions[session_id] = index
+            self._sessions_file.write(json.dumps(session_id) + "\n")
+        return index
+
+    def _write(self, rows):
+        try:
+            self._write_columns(rows)
+        except Exception:
+            self._abandon()
+            raise
+
+    def _abandon(self):
+        """Truncate every column to the rows fully written and close the segment."""
+        for column, handle in self._files.items():
+            try:
+                handle.close()
+            except OSError:
+                pass
+            try:
+                os.truncate(handle.name, self._rows * COLUMNS[column].itemsize)
+            except OSError:
+                pass
+        if self._sessions_file:
+            try:
+                self._sessions_file.close()
+            except OSError:
+                pass
+        self._files = {}
+        self._sessions_file = None
+        self._path = None
+
+    def _write_columns(self, rows):
+        sessions = [self._session_index(row[0]) for row in rows]
+        # Session ids must be on disk before any row points at them
+        self._sessions_file.flush()
+
+        columns = {
+            'x': np.fromiter((row[2] for row in rows), COLUMNS['x'], len(rows)),
+            'y': np.fromiter((row[3] for row in rows), COLUMNS['y'], len(rows)),
+            'timestamp': np.fromiter((row[4] for row in rows), COLUMNS['timestamp'], len(rows)),
+            'type': np.fromiter((type_code(row[1]) for row in rows), COLUMNS['type'], len(rows)),
+            'session': np.array(sessions, dtype=COLUMNS['session']),
+        }
+        for column, values in columns.items():
+            self._files[column].write(values.tobytes())
+        for handle in self._files.values():
+            handle.flush()
+        self._rows += len(rows)
+
+
+class Segment:
+    """Read-only, zero-copy view of one segment directory."""
+
+    def __init__(self, path):
+        self.path = path
+        sizes = {
+            column: os.path.getsize(os.path.join(path, filename)) // COLUMNS[column].itemsize
+            for column, filename in COLUMN_FILES.items()
+        }
+        self.rows = min(sizes.values())
+        self._sessions = None
+
+    def column(self, name):
+        """Memory-map a column (empty array for an empty segment)."""
+        if self.rows == 0:
+            return np.empty(0, dtype=COLUMNS[name])
+        return np.memmap(os.path.join(self.path, COLUMN_FILES[name]),
+                         dtype=COLUMNS[name], mode='r', shape=(self.rows,))
+
+    def sessions(self):
+        if self._sessions is None:
+            with open(os.path.join(self.path, SESSIONS_FILE), encoding='utf-8') as handle:
+                self._sessions = [json.loads(line) for line in handle if line.endswith("\n")]
+        return self._sessions
+
+    def mask(self, event_type=None, session_id=None, since=None, until=None):
+        """Boolean row mask for the given filters, or None for 'all rows'."""
+        mask = None
+
+        def both(a, b):
+            return b if a is None else a & b
+
+        if event_type is not None:
+            mask = both(mask, self.column('type') == type_code(event_type))
+        if session_id is not None:
+            sessions = self.sessions()
+            if session_id not in sessions:
+                return np.zeros(self.rows, dtype=bool)
+            mask = both(mask, self.column('session') == sessions.index(session_id))
+        if since is not None or until is not None:
+            timestamps = self.column('timestamp')
+            if since is not None:
+                mask = both(mask, timestamps >= since)
+            if until is not None:
+                mask = both(mask, timestamps < until)
+        return mask
+
+
+def open_segments(root):
+    """All segments under `root`, oldest first."""
+    if not os.path.isdir(root):
+        return []
+    names = sorted(name for name in os.listdir(root) if name.startswith('seg-'))
+    return [Segment(os.path.join(root, name)) for name in names]
+
+
+def iter_coordinates(root, event_type=None, session_id=None, since=None, until=None):
+    """
+    Yield (x, y) float32 arrays of matching points, one pair per segment.
+    Only the filtered rows are copied out of the memory maps.
+    """
+    for segment in open_segments(root):
+        if segment.rows == 0:
+            continue
+        mask = segment.mask(event_type, session_id, since, until)
+        x = segment.column('x')
+        y = segment.column('y')
+        if mask is not None:
+            x = x[mask]
+            y = y[mask]
+        if len(x):
+            yield x, y
+
+
+def load_coordinates(root, event_type=None, session_id=None, since=None, until=None):
+    """Gather matching (x, y) points from every segment as an (N, 2) float32 array."""
+    parts = [
+        np.column_stack((x, y))
+        for x, y in iter_coordinates(root, event_type, session_id, since, until)
+    ]
+    if not parts:
+        return np.empty((0, 2), dtype=np.float32)
+    return np.concatenate(parts)
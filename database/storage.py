@@ -0,0 +1,342 @@
+"""
+Storage backends for the Overseer.
+
+Server and visualizer talk to the database through this module so the
+same code runs against MySQL (the default) or an embedded SQLite file.
+Pick one with DB_BACKEND in .env.
+
+Both backends hand out DB-API connections that accept MySQL-style `%s`
+placeholders and `cursor(dictionary=True)`. The few SQL fragments that
+differ between the two live on `SQL`.
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+
+try:
+    import mysql.connector
+except ImportError:  # SQLite-only deployments don't need the MySQL driver
+    mysql = None
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import var
+
+BACKEND = var.DB_BACKEND
+
+if BACKEND not in ('mysql', 'sqlite'):
+    raise ValueError(f"Unknown DB_BACKEND '{BACKEND}' (expected 'mysql' or 'sqlite')")
+if BACKEND == 'mysql' and mysql is None:
+    raise ImportError("DB_BACKEND=mysql requires mysql-connector-python")
+
+
+class PoolTimeout(Exception):
+    """No pooled connection became free within the pool's timeout."""
+
+
+# Catch-all for driver errors from either backend
+Error = ((mysql.connector.Error, sqlite3.Error) if mysql else (sqlite3.Error,)) + (PoolTimeout,)
+
+# Errors that mean "database unreachable or busy" rather than "bad data"
+TransientError = (sqlite3.OperationalError, PoolTimeout)
+if mysql:
+    TransientError += (
+        mysql.connector.errors.OperationalError,
+        mysql.connector.errors.InterfaceError,
+    )
+
+# Applied to every SQLite connection: WAL lets readers run alongside the
+# writer, NORMAL sync is durable across app crashes in WAL mode, and the
+# cache/mmap sizes keep hot pages out of the syscall path.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'foreign_keys': 'ON',
+    'busy_timeout': 5000,
+    'cache_size': -65536,
+    'temp_store': 'MEMORY',
+    'mmap_size': 268435456,
+}
+
+
+class MySQLDialect:
+    name = 'mysql'
+    insert_ignore = "INSERT IGNORE"
+    greatest = "GREATEST"
+    # Text value of a top-level key in a JSON column
+    json_text = "JSON_UNQUOTE(JSON_EXTRACT({column}, '$.{key}'))"
+    # Suffix for INSERT ... VALUES that adds to a counter on key collision
+    upsert_add = "ON DUPLICATE KEY UPDATE {column} = {column} + VALUES({column})"
+
+
+class SQLiteDialect:
+    name = 'sqlite'
+    insert_ignore = "INSERT OR IGNORE"
+    greatest = "MAX"
+    json_text = "json_extract({column}, '$.{key}')"
+    upsert_add = "ON CONFLICT ({keys}) DO UPDATE SET {column} = {column} + excluded.{column}"
+
+
+SQL = SQLiteDialect if BACKEND == 'sqlite' else MySQLDialect
+
+
+# ============================================================================
+# SQLITE ADAPTERS
+# ============================================================================
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteCursor:
+    """sqlite3 cursor that takes `%s` placeholders like mysql.connector."""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        if dictionary:
+            self._cursor.row_factory = _dict_row
+
+    def execute(self, operation, params=()):
+        self._cursor.execute(operation.replace('%s', '?'), params)
+
+    def executemany(self, operation, seq_params):
+        self._cursor.executemany(operation.replace('%s', '?'), seq_params)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """Mimics the parts of a mysql.connector connection the Overseer uses."""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._open = True
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self._raw.cursor(), dictionary=dictionary)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def is_connected(self):
+        return self._open
+
+    def close(self):
+        if self._open:
+            self._open = False
+            self._raw.close()
+
+
+class ConnectionPool:
+    """
+    Thread-safe connection pool for either backend.
+
+    Keeps up to `pool_size` idle connections and opens up to
+    `max_overflow` more under load; overflow connections are closed when
+    returned. get_connection() waits up to `timeout` seconds for one to
+    free up, then raises PoolTimeout. A connection idle for longer than
+    `ping_after` seconds is checked with `SELECT 1` before it is handed
+    out, and one older than `recycle` seconds is replaced, so connections
+    the server dropped (MySQL's wait_timeout) never reach a handler.
+    """
+
+    def __init__(self, connect, pool_size, max_overflow=0, timeout=0.0, recycle=0, ping_after=0):
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self._connect = connect
+        self._cond = threading.Condition()
+        # [connection, opened at, last returned at], most recently used last
+        self._idle = deque()
+        self._open = 0
+        self._waiting = 0
+        for _ in range(pool_size):
+            self._idle.append(self._new_entry())
+            self._open += 1
+
+    def _new_entry(self):
+        now = time.monotonic()
+        return [self._connect(), now, now]
+
+    def get_connection(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while not self._idle and self._open >= self.pool_size + self.max_overflow:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"No database connection free after {self.timeout:g}s "
+                                      f"({self._open} open)")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            entry = self._idle.pop() if self._idle else None
+            if entry is None:
+                self._open += 1
+        try:
+            entry = self._checked(entry) if entry else self._new_entry()
+        except BaseException:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        return PooledConnection(self, entry)
+
+    def _checked(self, entry):
+        """The idle entry if it is still usable, otherwise a fresh one."""
+        conn, opened, returned = entry
+        now = time.monotonic()
+        if self.recycle and now - opened > self.recycle:
+            _close_quietly(conn)
+            return self._new_entry()
+        if self.ping_after and now - returned > self.ping_after:
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+                cursor.close()
+            except Error:
+                _close_quietly(conn)
+                return self._new_entry()
+        return entry
+
+    def release(self, entry, broken=False):
+        with self._cond:
+            keep = not broken and len(self._idle) < self.pool_size
+            if keep:
+                entry[2] = time.monotonic()
+                self._idle.append(entry)
+            else:
+                self._open -= 1
+            self._cond.notify()
+        if not keep:
+            _close_quietly(entry[0])
+
+    def stats(self):
+        with self._cond:
+            return {"size": self.pool_size, "max_overflow": self.max_overflow,
+                    "open": self._open, "idle": len(self._idle), "waiting": self._waiting}
+
+
+class PooledConnection:
+    """A checked-out connection; close() hands it back to the pool."""
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+        self._conn = entry[0]
+
+    def is_connected(self):
+        # Checked out and not yet returned; avoids a server round trip
+        return self._entry is not None
+
+    def close(self):
+        entry, self._entry = self._entry, None
+        if entry is None:
+            return
+        try:
+            self._conn.rollback()
+        except Error:
+            self._pool.release(entry, broken=True)
+            return
+        self._pool.release(entry)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Error:
+        pass
+
+
+def _open_sqlite():
+    path = var.SQLITE_PATH
+    if path != ':memory:':
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    raw = sqlite3.connect(path, check_same_thread=False)
+    for pragma, value in SQLITE_PRAGMAS.items():
+        raw.execute(f"PRAGMA {pragma}={value}")
+    return raw
+
+
+# ============================================================================
+# PUBLIC API
+# ============================================================================
+def is_transient(error):
+    """Whether a failed write is worth retrying later as-is."""
+    return isinstance(error, TransientError)
+
+
+def describe():
+    """Human-readable description of where data is stored."""
+    if BACKEND == 'sqlite':
+        return f"SQLite at {var.SQLITE_PATH}"
+    return f"MySQL at {var.DB_HOST}"
+
+
+def connect(create=False):
+    """
+    Open a standalone connection.
+
+    With create=True the database itself is created first if needed
+    (MySQL connects without a schema, creates it and switches to it).
+    """
+    if BACKEND == 'sqlite':
+        return SQLiteConnection(_open_sqlite())
+
+    if not create:
+        return mysql.connector.connect(**var.DB_CONFIG)
+
+    conn = mysql.connector.connect(**var.DB_CONFIG_NO_DB)
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS {var.DB_NAME}")
+    cursor.execute(f"USE {var.DB_NAME}")
+    cursor.close()
+    return conn
+
+
+def create_pool(pool_size=None, max_overflow=None, timeout=None):
+    """Create a connection pool for the configured backend, sized from var.py by default."""
+    return ConnectionPool(
+        connect,
+        var.DB_POOL_SIZE if pool_size is None else pool_size,
+        max_overflow=var.DB_POOL_MAX_OVERFLOW if max_overflow is None else max_overflow,
+        timeout=var.DB_POOL_TIMEOUT if timeout is None else timeout,
+        recycle=var.DB_POOL_RECYCLE_SECONDS,
+        ping_after=var.DB_POOL_PING_SECONDS
+    )
@@ -0,0 +1,23 @@
+import os
+import sys
+
+# The SQL dialect is chosen when storage is imported
+os.environ['DB_BACKEND'] = 'sqlite'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import var
+from database import migrations, storage
+
+
+def test_hot_queries_search_an_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(var, 'SQLITE_PATH', str(tmp_path / 'telemetry.db'))
+    conn = storage.connect(create=True)
+    try:
+        migrations.migrate(conn)
+        results = migrations.explain(conn)
+    finally:
+        conn.close()
+
+    assert len(results) == len(migrations.INDEXED_QUERIES)
+    scans = [(label, plan) for label, plan, full_scan in results if full_scan]
+    assert scans == []
@@ -11,6 +11,13 @@ load_dotenv(BASE_DIR / ".env")
 # ============================================================================
 # DATABASE SETTINGS
 # ============================================================================
+# Storage backend: 'mysql' or 'sqlite' (embedded, single node)
+DB_BACKEND = os.getenv('DB_BACKEND', 'mysql').lower()
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'data/telemetry.db')
+if SQLITE_PATH != ':memory:' and not os.path.isabs(SQLITE_PATH):
+    # Relative to the project root so backend/ and visualizer/ share one file
+    SQLITE_PATH = str(BASE_DIR / SQLITE_PATH)
+
 DB_HOST = os.getenv('DB_HOST', 'localhost')
 DB_NAME = os.getenv('DB_NAME', 'telemetry_db')
 DB_USER = os.getenv('DB_USER', 'root')
@@ -30,13 +37,113 @@ DB_CONFIG_NO_DB = {
     'password': DB_PASSWORD
 }
 
+# Request-handling connection pool: idle connections kept, extra
+# connections opened under load, seconds a request waits for one before
+# getting a 503, and when idle connections are pinged or replaced
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', 5))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 1.0))
+DB_POOL_RECYCLE_SECONDS = float(os.getenv('DB_POOL_RECYCLE_SECONDS', 1800))
+DB_POOL_PING_SECONDS = float(os.getenv('DB_POOL_PING_SECONDS', 30))
+
+# Hours between checks that monthly `events` partitions exist ahead of
+# time (MySQL only; 0 = only when the server starts)
+PARTITION_CHECK_HOURS = float(os.getenv('PARTITION_CHECK_HOURS', 24))
+
 # ============================================================================
 # SERVER SETTINGS
 # ============================================================================
 SERVER_PORT = int(os.getenv('SERVER_PORT', 8090))
 
+# HTTP engine: 'threaded' (thread per connection) or 'async' (asyncio keep-alive)
+SERVER_MODE = os.getenv('SERVER_MODE', 'threaded')
+
+# Handler threads (both engines default to one per pooled connection)
+# and requests allowed to wait for one; past that the server answers 503
+SERVER_THREADS = int(os.getenv('SERVER_THREADS', DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW))
+ASYNC_EXECUTOR_WORKERS = int(os.getenv('ASYNC_EXECUTOR_WORKERS', SERVER_THREADS))
+SERVER_BACKLOG = int(os.getenv('SERVER_BACKLOG', 64))
+SERVER_RETRY_AFTER = int(os.getenv('SERVER_RETRY_AFTER', 1))
+# Seconds a connection may stall mid-request (either engine) or, in
+# threaded mode, sit idle
+# before its handler thread gives up on it
+SERVER_SOCKET_TIMEOUT = float(os.getenv('SERVER_SOCKET_TIMEOUT', 10))
+ASYNC_KEEPALIVE_TIMEOUT = float(os.getenv('ASYNC_KEEPALIVE_TIMEOUT', 15))
+
+# Server processes sharing the port via SO_REUSEPORT (1 = single process)
+SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', 1))
+
+# Largest request body accepted, after undoing gzip/deflate
+REQUEST_BODY_MAX_BYTES = int(os.getenv('REQUEST_BODY_MAX_BYTES', 16 * 1024 * 1024))
+
+# Server logging: write from a background thread, default level,
+# per-category overrides ("request=warning,event=off"), the cap on
+# request/event lines per second (0 = no sampling) and text or json
+LOG_ASYNC = os.getenv('LOG_ASYNC', 'true').lower() in ('1', 'true', 'yes')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'info').lower()
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')
+LOG_SAMPLE_PER_SECOND = int(os.getenv('LOG_SAMPLE_PER_SECOND', 50))
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+
+# Prometheus-text request and database metrics at GET /metrics
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+# Write-behind event buffer: events are acked once queued and flushed in groups
+EVENT_BUFFER_ENABLED = os.getenv('EVENT_BUFFER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+EVENT_BUFFER_CAPACITY = int(os.getenv('EVENT_BUFFER_CAPACITY', 10000))
+EVENT_FLUSH_BATCH_SIZE = int(os.getenv('EVENT_FLUSH_BATCH_SIZE', 200))
+EVENT_FLUSH_INTERVAL_MS = int(os.getenv('EVENT_FLUSH_INTERVAL_MS', 250))
+EVENT_FLUSHER_THREADS = int(os.getenv('EVENT_FLUSHER_THREADS', 1))
+EVENT_BUFFER_RETRY_AFTER = int(os.getenv('EVENT_BUFFER_RETRY_AFTER', 1))
+
+# Columnar copy of every event for memory-mapped heatmap reads
+SEGMENT_STORE_ENABLED = os.getenv('SEGMENT_STORE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SEGMENT_DIR = str(BASE_DIR / os.getenv('SEGMENT_DIR', 'data/segments'))
+SEGMENT_ROWS = int(os.getenv('SEGMENT_ROWS', 1000000))
+
+# Durable local journal for writes while the database is down or slow
+SPOOL_ENABLED = os.getenv('SPOOL_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SPOOL_DIR = str(BASE_DIR / os.getenv('SPOOL_DIR', 'data/spool'))
+SPOOL_LATENCY_THRESHOLD_MS = int(os.getenv('SPOOL_LATENCY_THRESHOLD_MS', 500))
+SPOOL_COOLDOWN_SECONDS = float(os.getenv('SPOOL_COOLDOWN_SECONDS', 5))
+SPOOL_REPLAY_INTERVAL_SECONDS = float(os.getenv('SPOOL_REPLAY_INTERVAL_SECONDS', 1))
+
+# In-memory leaderboard index, reloaded from the database periodically
+# to pick up writes from other worker processes (0 = load once)
+LEADERBOARD_REFRESH_SECONDS = float(os.getenv('LEADERBOARD_REFRESH_SECONDS', 300))
+
+# Session -> user and known-user entries kept in memory (least recently used dropped first)
+SESSION_CACHE_SESSIONS = int(os.getenv('SESSION_CACHE_SESSIONS', 100000))
+SESSION_CACHE_USERS = int(os.getenv('SESSION_CACHE_USERS', 100000))
+
+# Pre-binned heatmap grids (shared by server and visualizer)
+HEATMAP_GRID_ENABLED = os.getenv('HEATMAP_GRID_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+HEATMAP_GRID_WIDTH = float(os.getenv('HEATMAP_GRID_WIDTH', 1000))
+HEATMAP_GRID_HEIGHT = float(os.getenv('HEATMAP_GRID_HEIGHT', 1000))
+HEATMAP_GRID_BINS = int(os.getenv('HEATMAP_GRID_BINS', 200))
+HEATMAP_GRID_CHECKPOINT_SECONDS = float(os.getenv('HEATMAP_GRID_CHECKPOINT_SECONDS', 10))
+
+# GET /heatmap grids held in memory, and how stale they may get
+HEATMAP_CACHE_SECONDS = float(os.getenv('HEATMAP_CACHE_SECONDS', 5))
+HEATMAP_CACHE_ENTRIES = int(os.getenv('HEATMAP_CACHE_ENTRIES', 64))
+
+# Event ids below a cache's watermark that are read again on every
+# refresh. On MySQL an insert takes its AUTO_INCREMENT id before it
+# commits, so with concurrent writers a lower id can become visible after
+# a higher one was already read.
+EVENT_RESCAN_IDS = int(os.getenv('EVENT_RESCAN_IDS', 10000))
+
 # ============================================================================
 # VISUALIZER SETTINGS
 # ============================================================================
 VISUALIZER_OUTPUT_DIR = os.getenv('VISUALIZER_OUTPUT_DIR', 'output')
 VISUALIZER_DEFAULT_EVENT = os.getenv('VISUALIZER_DEFAULT_EVENT', 'PLAYER_DEATH')
+# Where heatmap points come from: 'db', 'segments' or 'grids'
+VISUALIZER_SOURCE = os.getenv('VISUALIZER_SOURCE', 'db')
+# Most points loaded per event type; beyond this a uniform sample is drawn (0 = no limit)
+VISUALIZER_MAX_POINTS = int(os.getenv('VISUALIZER_MAX_POINTS', 0))
+# Keep binned densities between runs and read only newer events (db source)
+VISUALIZER_CACHE_ENABLED = os.getenv('VISUALIZER_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+VISUALIZER_CACHE_DIR = os.getenv('VISUALIZER_CACHE_DIR', 'cache')
+# How heatmap PNGs are drawn: 'matplotlib' or 'raster' (no matplotlib import)
+VISUALIZER_RENDERER = os.getenv('VISUALIZER_RENDERER', 'matplotlib')
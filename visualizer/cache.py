@@ -0,0 +1,143 @@
+"""
+Persistent heatmap cache, keyed by what was drawn and how far into
+`events` it has read.
+
+Each entry covers one key (event type, filters, map size and grid) and
+holds:
+
+    binned     kde.BinnedPoints for every event folded in so far
+    watermark  the highest event_id folded in
+    recent     event_ids folded in within the rescan window below it
+    max_xy     the largest coordinates seen, which fix an auto-sized extent
+    sample     a reservoir sample of points for the scatter overlay
+    density    the density grid computed at the watermark
+    rendered   {output path: [watermark, points, renderer]} for PNGs drawn from it
+
+A rerun asks the database only for rows above the watermark, plus the
+last EVENT_RESCAN_IDS ids below it: on MySQL a lower id can commit after
+a higher one was read, and `recent` keeps those from being counted
+twice. When nothing new turns up the density, and the PNG itself if
+still on disk, are reused. Otherwise the new rows are binned into the
+entry before rendering.
+
+Entries are .npz files under VISUALIZER_CACHE_DIR, replaced atomically.
+Delete the directory to start over.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from visualizer.kde import BinnedPoints
+from visualizer.sampling import PointCollector
+
+# Points kept per entry for the scatter overlay
+SAMPLE_POINTS = 20000
+
+
+class CacheEntry:
+    """Cached state for one heatmap key; see the module docstring."""
+
+    def __init__(self, cache, key, binned, watermark=0, max_xy=(-np.inf, -np.inf),
+                 sample=None, density=None, rendered=None, recent=None):
+        self.cache = cache
+        self.key = key
+        self.binned = binned
+        self.watermark = watermark
+        self.recent = recent if recent is not None else np.empty(0, dtype=np.int64)
+        self.max_xy = tuple(max_xy)
+        self.sample = sample if sample is not None else PointCollector(SAMPLE_POINTS)
+        self._density = density
+        self.rendered = rendered or {}
+
+    def __len__(self):
+        return len(self.binned)
+
+    def covers(self, extent):
+        return self.binned.extent == tuple(float(edge) for edge in extent)
+
+    def add(self, points):
+        """Fold in an (N, 2) array of points (the caller advances the watermark)."""
+        self.binned.add(points[:, 0], points[:, 1])
+        self.sample.add(points[:, 0], points[:, 1])
+        self._density = None
+
+    def density(self):
+        """(xi, yi, zi) for the entry, computed once per watermark."""
+        if self._density is None:
+            self._density = self.binned.density()[2]
+        xmin, xmax, ymin, ymax = self.binned.extent
+        size = self.binned.size
+        xi, yi = np.mgrid[xmin:xmax:size * 1j, ymin:ymax:size * 1j]
+        return xi, yi, self._density
+
+    def is_rendered(self, path, renderer):
+        """Whether `path` was drawn from exactly this data, the same way, and still exists."""
+        return self.rendered.get(path) == [self.watermark, len(self), renderer] and os.path.exists(path)
+
+    def mark_rendered(self, path, renderer):
+        self.rendered[path] = [self.watermark, len(self), renderer]
+        self.save()
+
+    def save(self):
+        self.cache.save(self)
+
+
+class HeatmapCache:
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+        return os.path.join(self.root, f"{digest[:20]}.npz")
+
+    def create(self, key, extent, size):
+        """An empty entry, replacing any saved one on its first save."""
+        return CacheEntry(self, key, BinnedPoints(extent, size))
+
+    def load(self, key):
+        """The entry for `key`, or None if missing or unreadable."""
+        try:
+            with np.load(self._path(key)) as data:
+                meta = json.loads(str(data['meta']))
+                if meta['key'] != key:
+                    return None
+                binned = BinnedPoints(meta['extent'], meta['size'], data['counts'], data['moments'])
+                sample = PointCollector.restore(data['sample'], meta['seen'], SAMPLE_POINTS)
+                density = data['density'] if 'density' in data.files else None
+                return CacheEntry(self, key, binned, meta['watermark'], meta['max_xy'],
+                                  sample, density, meta['rendered'], data['recent'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, entry):
+        os.makedirs(self.root, exist_ok=True)
+        meta = {
+            'key': entry.key,
+            'extent': entry.binned.extent,
+            'size': entry.binned.size,
+            'watermark': entry.watermark,
+            'max_xy': [float(value) for value in entry.max_xy],
+            'seen': entry.sample.seen,
+            'rendered': entry.rendered,
+        }
+        arrays = {
+            'meta': np.array(json.dumps(meta)),
+            'counts': entry.binned.counts,
+            'moments': entry.binned.moments,
+            'sample': entry.sample.points(),
+            'recent': entry.recent,
+        }
+        if entry._density is not None:
+            arrays['density'] = entry._density
+
+        handle, temp = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(temp, self._path(entry.key))
+        except BaseException:
+            os.unlink(temp)
+            raise
@@ -1,20 +1,49 @@
-import mysql.connector
-import matplotlib.pyplot as plt
 import numpy as np
 from scipy import ndimage
-from scipy.stats import gaussian_kde
 import os
 import argparse
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 
 # Import shared configuration from the project root
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import var
+from database import storage
+from database.storage import Error
+from database import segments
+from database import rollups
+from database import grids
+from visualizer import kde
+from visualizer import cache
+from visualizer import raster
+from visualizer.sampling import PointCollector
 
 OUTPUT_DIR = var.VISUALIZER_OUTPUT_DIR
 
-# Database Configuration from common var.py
-DB_CONFIG = var.DB_CONFIG
+# Where points are read from: 'db' (events table) or 'segments' (memmapped columns)
+DATA_SOURCE = var.VISUALIZER_SOURCE
+
+# Optional time window (epoch ms) applied to every fetch
+TIME_RANGE = (None, None)
+
+# Optional level (from event meta) applied to db and grid fetches
+LEVEL = None
+
+# Most points kept per event type (a uniform sample beyond that); None = all
+MAX_POINTS = var.VISUALIZER_MAX_POINTS or None
+
+# Rows pulled from the database per fetchmany
+FETCH_CHUNK = 50000
+
+# Cells per side of the density grid
+GRID_SIZE = 200
+
+# How PNGs are drawn: 'matplotlib' or 'raster' (numpy + zlib, see raster.py)
+RENDERER = var.VISUALIZER_RENDERER
+
+# Binned densities kept between runs for the db source; None = no cache
+CACHE = cache.HeatmapCache(var.VISUALIZER_CACHE_DIR) if var.VISUALIZER_CACHE_ENABLED else None
 
 # Event types matching the server
 EVENT_TYPES = {
@@ -29,98 +58,325 @@ EVENT_TYPES = {
 
 
 def connect_db():
-    """Connect to the MySQL database."""
+    """Connect to the configured database (MySQL or SQLite)."""
     try:
-        return mysql.connector.connect(**DB_CONFIG)
-    except mysql.connector.Error as err:
-        print(f"[ERROR] Connecting to MySQL: {err}")
+        return storage.connect()
+    except Error as err:
+        print(f"[ERROR] Connecting to {storage.describe()}: {err}")
         return None
 
 
 def fetch_events_by_type(event_type, session_id=None):
-    """Fetch coordinates for a specific event type."""
+    """
+    Fetch coordinates for a specific event type.
+    
+    Points come back as an (N, 2) float32 array, streamed in chunks and
+    sampled down to MAX_POINTS if set. With the 'grids' source this
+    returns a pre-binned grids.Grid instead; the heatmap functions
+    accept either.
+    """
+    since, until = TIME_RANGE
+    collector = PointCollector(MAX_POINTS)
+    
+    if DATA_SOURCE == 'segments':
+        for x, y in segments.iter_coordinates(var.SEGMENT_DIR, event_type, session_id, since, until):
+            collector.add(x, y)
+        return collected(collector, event_type)
+    
+    if DATA_SOURCE == 'grids':
+        if session_id or since is not None or until is not None:
+            print("[WARNING] Grids cannot filter by session or time, reading events instead")
+        else:
+            return fetch_grids([event_type])[event_type]
+    
     conn = connect_db()
     if not conn or not conn.is_connected():
-        return []
+        return collector.points()
     
     try:
-        cursor = conn.cursor()
+        # Unbuffered, so rows stream from the server one chunk at a time
+        cursor = conn.cursor(buffered=False)
         
-        if session_id:
-            cursor.execute(
-                "SELECT x_coord, y_coord FROM events WHERE event_type=%s AND session_id=%s",
-                (event_type, session_id)
-            )
-        else:
-            cursor.execute(
-                "SELECT x_coord, y_coord FROM events WHERE event_type=%s",
-                (event_type,)
-            )
+        query = "SELECT x_coord, y_coord FROM events WHERE event_type=%s"
+        clauses, params = event_filters(session_id)
+        query += "".join(f" AND {clause}" for clause in clauses)
         
-        data = cursor.fetchall()
+        cursor.execute(query, (event_type,) + params)
+        while True:
+            rows = cursor.fetchmany(FETCH_CHUNK)
+            if not rows:
+                break
+            collector.add_rows(rows)
         cursor.close()
-        conn.close()
-        return data
-    except mysql.connector.Error as err:
+    except Error as err:
         print(f"[ERROR] Fetching events: {err}")
-        return []
+    finally:
+        conn.close()
+    
+    return collected(collector, event_type)
 
 
-def generate_kde_heatmap(coords, event_type, map_size=(1000, 1000), output_name=None):
+def collected(collector, event_type):
+    """A collector's points, noting when they are a sample."""
+    if collector.sampled:
+        print(f"[INFO] Sampled {len(collector)} of {collector.seen} {event_type} events")
+    return collector.points()
+
+
+def event_filters(session_id=None):
+    """WHERE clauses and parameters for the session, time and level filters."""
+    since, until = TIME_RANGE
+    clauses, params = [], []
+    if session_id:
+        clauses.append("session_id=%s")
+        params.append(session_id)
+    if since is not None:
+        clauses.append("timestamp >= %s")
+        params.append(since)
+    if until is not None:
+        clauses.append("timestamp < %s")
+        params.append(until)
+    if LEVEL is not None:
+        clauses.append(f"{storage.SQL.json_text.format(column='meta_data', key='level')} = %s")
+        params.append(LEVEL)
+    return clauses, tuple(params)
+
+
+def fetch_all_events(event_types):
     """
-    Generate a Kernel Density Estimation heatmap.
+    Coordinates for several event types at once, as {event_type: points}.
     
-    Uses Gaussian KDE to create smooth density gradients from point data.
-    Output is a transparent PNG that can be overlaid on level maps.
+    The database is read in a single grouped scan over one connection
+    instead of a query and a connection per type.
     """
-    if not coords or len(coords) < 2:
-        print(f"[WARNING] Not enough data points for {event_type} ({len(coords)} points)")
-        return None
+    since, until = TIME_RANGE
     
-    x = np.array([c[0] for c in coords])
-    y = np.array([c[1] for c in coords])
+    if DATA_SOURCE == 'segments':
+        return {event_type: fetch_events_by_type(event_type) for event_type in event_types}
     
-    # Get event config
-    config = EVENT_TYPES.get(event_type, {'color': 'Reds', 'name': event_type})
-    
-    print(f"[INFO] Generating KDE heatmap for {config['name']} ({len(coords)} points)")
+    if DATA_SOURCE == 'grids':
+        if since is not None or until is not None:
+            print("[WARNING] Grids cannot filter by session or time, reading events instead")
+        else:
+            return fetch_grids(event_types)
     
-    # Create figure with transparent background
-    fig, ax = plt.subplots(figsize=(12, 12))
-    fig.patch.set_alpha(0)
-    ax.patch.set_alpha(0)
+    collectors = {event_type: PointCollector(MAX_POINTS) for event_type in event_types}
+    conn = connect_db()
+    if not conn or not conn.is_connected():
+        return {event_type: collector.points() for event_type, collector in collectors.items()}
     
     try:
-        # Kernel Density Estimation
-        xy = np.vstack([x, y])
-        kde = gaussian_kde(xy)
+        cursor = conn.cursor(buffered=False)
         
-        # Create grid for evaluation
-        xmin, xmax = 0, map_size[0]
-        ymin, ymax = 0, map_size[1]
+        # Number the types in SQL so each batch converts to one array
+        codes = " ".join(f"WHEN %s THEN {code}" for code in range(len(event_types)))
+        placeholders = ", ".join(["%s"] * len(event_types))
+        query = (f"SELECT CASE event_type {codes} END, x_coord, y_coord FROM events "
+                 f"WHERE event_type IN ({placeholders})")
+        clauses, params = event_filters()
+        query += "".join(f" AND {clause}" for clause in clauses)
         
-        # Auto-adjust if data is outside default bounds
-        if x.max() > xmax or y.max() > ymax:
-            xmax = max(xmax, x.max() * 1.1)
-            ymax = max(ymax, y.max() * 1.1)
-        
-        xi, yi = np.mgrid[xmin:xmax:200j, ymin:ymax:200j]
-        zi = kde(np.vstack([xi.flatten(), yi.flatten()]))
-        zi = zi.reshape(xi.shape)
+        cursor.execute(query, tuple(event_types) * 2 + params)
+        while True:
+            rows = cursor.fetchmany(FETCH_CHUNK)
+            if not rows:
+                break
+            batch = np.asarray(rows, dtype=np.float32)
+            # Each type samples on its own, so rare types keep their share
+            for code, event_type in enumerate(event_types):
+                match = batch[:, 0] == code
+                collectors[event_type].add(batch[match, 1], batch[match, 2])
+        cursor.close()
+    except Error as err:
+        print(f"[ERROR] Fetching events: {err}")
+    finally:
+        conn.close()
+    
+    return {event_type: collected(collector, event_type) for event_type, collector in collectors.items()}
+
+
+def use_cache():
+    return CACHE is not None and DATA_SOURCE == 'db'
+
+
+def fetch_cached(event_type, map_size, fixed_extent=False, session_id=None, conn=None):
+    """
+    Heatmap data for an event type as a cache.CacheEntry, after folding
+    in only the rows above the cached watermark (and late-committed rows
+    within EVENT_RESCAN_IDS below it).
+    
+    fixed_extent keeps the map bounds as given (the combined map);
+    otherwise they stretch to fit the data like generate_kde_heatmap's.
+    A change of bounds rebuilds the entry from scratch.
+    """
+    since, until = TIME_RANGE
+    key = {
+        "event_type": event_type, "session_id": session_id, "level": LEVEL,
+        "since": since, "until": until, "map_size": list(map_size),
+        "size": GRID_SIZE, "extent": "fixed" if fixed_extent else "auto",
+    }
+    entry = CACHE.load(key)
+    watermark = entry.watermark if entry else 0
+    
+    own_conn = conn is None
+    conn = conn or connect_db()
+    if not conn:
+        return entry or CACHE.create(key, (0, map_size[0], 0, map_size[1]), GRID_SIZE)
+    
+    try:
+        cursor = conn.cursor(buffered=False)
+        clauses, params = event_filters(session_id)
+        where = " AND ".join(["event_type=%s", "x_coord IS NOT NULL", "y_coord IS NOT NULL"] + clauses)
+        params = (event_type,) + params
         
-        # Apply Gaussian blur for smoother gradients
-        zi = ndimage.gaussian_filter(zi, sigma=2)
+        floor = max(0, watermark - var.EVENT_RESCAN_IDS)
+        cursor.execute(
+            f"SELECT MAX(event_id), MAX(x_coord), MAX(y_coord) FROM events WHERE {where} AND event_id > %s",
+            params + (floor,)
+        )
+        top, max_x, max_y = cursor.fetchone()
+        if top is None:
+            cursor.close()
+            return entry or CACHE.create(key, (0, map_size[0], 0, map_size[1]), GRID_SIZE)
         
-        # Plot the KDE heatmap
-        im = ax.pcolormesh(xi, yi, zi, shading='gouraud', cmap=config['color'], alpha=0.7)
+        if entry:
+            max_x, max_y = max(max_x, entry.max_xy[0]), max(max_y, entry.max_xy[1])
+        if fixed_extent:
+            extent = (0, map_size[0], 0, map_size[1])
+        else:
+            extent = auto_extent(max_x, max_y, map_size)
+        if entry is None or not entry.covers(extent):
+            entry = CACHE.create(key, extent, GRID_SIZE)
+            watermark = floor = 0
         
-        # Also scatter the actual points (semi-transparent)
-        ax.scatter(x, y, c='white', s=20, alpha=0.3, edgecolors='none')
+        cursor.execute(
+            f"SELECT event_id, x_coord, y_coord FROM events WHERE {where} AND event_id > %s AND event_id <= %s",
+            params + (floor, top)
+        )
+        folded = [entry.recent]
+        while True:
+            rows = cursor.fetchmany(FETCH_CHUNK)
+            if not rows:
+                break
+            batch = np.asarray(rows, dtype=np.float64)
+            ids = batch[:, 0].astype(np.int64)
+            fresh = ~np.isin(ids, entry.recent)
+            if fresh.any():
+                entry.add(batch[fresh, 1:].astype(np.float32))
+                folded.append(ids[fresh])
+        cursor.close()
         
-    except np.linalg.LinAlgError:
-        # Fallback to histogram if KDE fails (e.g., colinear points)
-        print(f"[WARNING] KDE failed, falling back to histogram")
-        ax.hist2d(x, y, bins=30, cmap=config['color'], alpha=0.7)
+        if len(folded) > 1 or top > entry.watermark:
+            recent = np.concatenate(folded)
+            entry.recent = recent[recent > max(top, entry.watermark) - var.EVENT_RESCAN_IDS]
+            entry.watermark = max(top, entry.watermark)
+            entry.max_xy = (max_x, max_y)
+            entry.save()
+            if watermark:
+                print(f"[INFO] Folded new {event_type} events into the cache ({len(entry)} total)")
+    except Error as err:
+        print(f"[ERROR] Fetching events: {err}")
+    finally:
+        if own_conn:
+            conn.close()
+    
+    return entry
+
+
+def fetch_cached_all(event_types, map_size, fixed_extent=False):
+    """fetch_cached for several event types over one connection."""
+    conn = connect_db()
+    try:
+        return {
+            event_type: fetch_cached(event_type, map_size, fixed_extent, conn=conn)
+            for event_type in event_types
+        }
+    finally:
+        if conn:
+            conn.close()
+
+
+def fetch_grids(event_types):
+    """Load the server-maintained bin grids, as {event_type: Grid}."""
+    empty = {event_type: grids.Grid(np.zeros((grids.BINS, grids.BINS))) for event_type in event_types}
+    conn = connect_db()
+    if not conn:
+        return empty
+    try:
+        cursor = conn.cursor()
+        loaded = grids.load_grids(cursor, event_types, LEVEL)
+        cursor.close()
+    except Error as err:
+        print(f"[ERROR] Fetching grids: {err}")
+        return empty
+    finally:
+        conn.close()
+    
+    for event_type, grid in loaded.items():
+        if grid.outside:
+            print(f"[WARNING] {grid.outside} {event_type} events fall outside the "
+                  f"{grids.EXTENT[0]:g}x{grids.EXTENT[1]:g} grid and are not shown")
+    return loaded
+
+
+def grid_density(grid):
+    """Smooth a bin grid into a density surface at the bin centres."""
+    xs, ys = grid.centers()
+    return kde.evaluate_binned(grid.counts, xs, ys, grid.sum_sq)
+
+
+def auto_extent(max_x, max_y, map_size):
+    """Map bounds, stretched when the data runs past them."""
+    xmax, ymax = map_size
+    if max_x > xmax or max_y > ymax:
+        xmax = max(xmax, max_x * 1.1)
+        ymax = max(ymax, max_y * 1.1)
+    return (0, xmax, 0, ymax)
+
+
+def split_coords(coords):
+    """Split rows of (x, y) or an (N, 2) array into x and y arrays."""
+    points = np.asarray(coords, dtype=float).reshape(-1, 2)
+    return points[:, 0], points[:, 1]
+
+
+def parse_time(value):
+    """Accept epoch milliseconds or an ISO date/datetime; return epoch ms."""
+    if value is None:
+        return None
+    if value.isdigit():
+        return int(value)
+    return int(datetime.fromisoformat(value).timestamp() * 1000)
+
+
+def draw_heatmap(xi, yi, zi, cmap, alpha, map_size, output_path, points=None, marker='o'):
+    """
+    Save a density grid as a transparent PNG of the map area, with white
+    dots ('o') or crosses ('x') at points = (x, y) if given.
+    """
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    point_alpha = 0.5 if marker == 'x' else 0.3
+    
+    if RENDERER == 'raster':
+        extent = (xi[0, 0], xi[-1, 0], yi[0, 0], yi[0, -1])
+        raster.render(zi, extent, cmap, alpha, map_size, output_path, points, marker, point_alpha)
+        return
+    
+    # Imported here so the raster renderer never pays matplotlib's startup
+    import matplotlib.pyplot as plt
+    
+    # Create figure with transparent background
+    fig, ax = plt.subplots(figsize=(12, 12))
+    fig.patch.set_alpha(0)
+    ax.patch.set_alpha(0)
+    
+    ax.pcolormesh(xi, yi, zi, shading='gouraud', cmap=cmap, alpha=alpha)
+    
+    if points is not None and len(points[0]):
+        if marker == 'x':
+            ax.scatter(*points, marker='x', c='white', s=50, alpha=point_alpha)
+        else:
+            ax.scatter(*points, c='white', s=20, alpha=point_alpha, edgecolors='none')
     
     # Style the plot
     ax.set_xlim(0, map_size[0])
@@ -129,74 +385,128 @@ def generate_kde_heatmap(coords, event_type, map_size=(1000, 1000), output_name=
     ax.axis('off')  # No axes for clean overlay
     
     # Save with transparency
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    plt.savefig(output_path, transparent=True, bbox_inches='tight', pad_inches=0, dpi=150)
+    plt.close()
+
+
+def generate_kde_heatmap(coords, event_type, map_size=(1000, 1000), output_name=None):
+    """
+    Generate a Kernel Density Estimation heatmap.
+    
+    Uses a binned Gaussian KDE (see kde.py) to create smooth density
+    gradients from point data, a pre-binned grid or a cache entry.
+    Output is a transparent PNG that can be overlaid on level maps.
+    """
+    if coords is None or len(coords) < 2:
+        print(f"[WARNING] Not enough data points for {event_type} ({0 if coords is None else len(coords)} points)")
+        return None
+    
+    # Get event config
+    config = EVENT_TYPES.get(event_type, {'color': 'Reds', 'name': event_type})
     
     if output_name:
         filename = f"{output_name}.png"
     else:
         filename = f"heatmap_{event_type.lower()}.png"
-    
     output_path = os.path.join(OUTPUT_DIR, filename)
-    plt.savefig(output_path, transparent=True, bbox_inches='tight', pad_inches=0, dpi=150)
-    plt.close()
+    
+    entry = coords if isinstance(coords, cache.CacheEntry) else None
+    if entry is not None and entry.is_rendered(output_path, RENDERER):
+        print(f"[INFO] No new {config['name']} events, keeping {output_path}")
+        return output_path
+    
+    grid = coords if isinstance(coords, grids.Grid) else None
+    if entry is not None:
+        x, y = split_coords(entry.sample.points())
+    elif grid is None:
+        x, y = split_coords(coords)
+    
+    print(f"[INFO] Generating KDE heatmap for {config['name']} ({len(coords)} points)")
+    
+    if grid is not None:
+        # Pre-binned on the server: cost depends on grid size only
+        xi, yi, zi = grid_density(grid)
+    elif entry is not None:
+        # Binned across runs; density recomputed only after new events
+        xi, yi, zi = entry.density()
+    else:
+        # Auto-adjust if data is outside default bounds
+        extent = auto_extent(x.max(), y.max(), map_size)
+        
+        # Kernel Density Estimation (copes with colinear points too)
+        xi, yi, zi = kde.evaluate(x, y, extent, GRID_SIZE)
+    
+    # Apply Gaussian blur for smoother gradients
+    zi = ndimage.gaussian_filter(zi, sigma=2)
+    
+    # Also scatter the actual points (semi-transparent)
+    points = None if grid is not None else (x, y)
+    draw_heatmap(xi, yi, zi, config['color'], 0.7, map_size, output_path, points)
+    
+    if entry is not None:
+        entry.mark_rendered(output_path, RENDERER)
     
     print(f"[SUCCESS] Heatmap saved to {output_path}")
     return output_path
 
 
-def generate_combined_heatmap(map_size=(1000, 1000)):
-    """Generate a combined heatmap showing all death and danger zones."""
-    
-    # Fetch death and stealth broken events
-    deaths = fetch_events_by_type('PLAYER_DEATH')
-    stealth = fetch_events_by_type('STEALTH_BROKEN')
-    
-    all_danger = deaths + stealth
+def generate_combined_heatmap(map_size=(1000, 1000), deaths=None, stealth=None):
+    """
+    Generate a combined heatmap showing all death and danger zones.
     
-    if not all_danger:
-        print("[WARNING] No danger zone data found")
-        return None
+    Death and stealth broken events are fetched unless passed in; both
+    are points, grids or cache entries alike.
+    """
+    if deaths is None or stealth is None:
+        if use_cache():
+            danger = fetch_cached_all(['PLAYER_DEATH', 'STEALTH_BROKEN'], map_size, fixed_extent=True)
+            deaths, stealth = danger['PLAYER_DEATH'], danger['STEALTH_BROKEN']
+        else:
+            deaths = fetch_events_by_type('PLAYER_DEATH')
+            stealth = fetch_events_by_type('STEALTH_BROKEN')
     
-    x = np.array([c[0] for c in all_danger])
-    y = np.array([c[1] for c in all_danger])
+    output_path = os.path.join(OUTPUT_DIR, "heatmap_danger_zones.png")
+    marks = None
     
     # Weight deaths higher than stealth breaks
-    weights = np.array([2.0 if i < len(deaths) else 1.0 for i in range(len(all_danger))])
-    
-    fig, ax = plt.subplots(figsize=(12, 12))
-    fig.patch.set_alpha(0)
-    ax.patch.set_alpha(0)
-    
-    try:
-        xy = np.vstack([x, y])
-        kde = gaussian_kde(xy, weights=weights)
-        
-        xi, yi = np.mgrid[0:map_size[0]:200j, 0:map_size[1]:200j]
-        zi = kde(np.vstack([xi.flatten(), yi.flatten()]))
-        zi = zi.reshape(xi.shape)
-        zi = ndimage.gaussian_filter(zi, sigma=3)
-        
-        ax.pcolormesh(xi, yi, zi, shading='gouraud', cmap='hot', alpha=0.8)
+    if isinstance(deaths, grids.Grid):
+        combined = deaths * 2.0 + stealth
+        if not combined.points:
+            print("[WARNING] No danger zone data found")
+            return None
+        xi, yi, zi = grid_density(combined)
+    elif isinstance(deaths, cache.CacheEntry):
+        if deaths.is_rendered(output_path, RENDERER) and stealth.is_rendered(output_path, RENDERER):
+            print(f"[INFO] No new danger zone events, keeping {output_path}")
+            return output_path
+        combined = deaths.binned * 2.0 + stealth.binned
+        if not len(combined):
+            print("[WARNING] No danger zone data found")
+            return None
+        xi, yi, zi = combined.density()
+        marks = split_coords(deaths.sample.points())
+    else:
+        dx, dy = split_coords(deaths)
+        sx, sy = split_coords(stealth)
+        x = np.concatenate([dx, sx])
+        y = np.concatenate([dy, sy])
         
-        # Mark death locations with X
-        if deaths:
-            dx = [d[0] for d in deaths]
-            dy = [d[1] for d in deaths]
-            ax.scatter(dx, dy, marker='x', c='white', s=50, alpha=0.5)
+        if not len(x):
+            print("[WARNING] No danger zone data found")
+            return None
         
-    except Exception as e:
-        print(f"[WARNING] Combined heatmap generation failed: {e}")
-        ax.hist2d(x, y, bins=30, cmap='hot', alpha=0.8)
+        weights = np.concatenate([np.full(len(dx), 2.0), np.full(len(sx), 1.0)])
+        xi, yi, zi = kde.evaluate(x, y, (0, map_size[0], 0, map_size[1]), GRID_SIZE, weights=weights)
+        marks = (dx, dy)
     
-    ax.set_xlim(0, map_size[0])
-    ax.set_ylim(0, map_size[1])
-    ax.set_aspect('equal')
-    ax.axis('off')
+    zi = ndimage.gaussian_filter(zi, sigma=3)
     
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    output_path = os.path.join(OUTPUT_DIR, "heatmap_danger_zones.png")
-    plt.savefig(output_path, transparent=True, bbox_inches='tight', pad_inches=0, dpi=150)
-    plt.close()
+    # Mark death locations with X
+    draw_heatmap(xi, yi, zi, 'hot', 0.8, map_size, output_path, marks, marker='x')
+    
+    if isinstance(deaths, cache.CacheEntry):
+        deaths.mark_rendered(output_path, RENDERER)
+        stealth.mark_rendered(output_path, RENDERER)
     
     print(f"[SUCCESS] Combined danger zone heatmap saved to {output_path}")
     return output_path
@@ -209,59 +519,104 @@ def generate_player_flow(map_size=(1000, 1000)):
     checkpoints = fetch_events_by_type('CHECKPOINT')
     completes = fetch_events_by_type('LEVEL_COMPLETE')
     
-    success_points = checkpoints + completes
+    if isinstance(checkpoints, grids.Grid):
+        return generate_kde_heatmap(checkpoints + completes, 'flow', map_size, 'heatmap_player_flow')
+    
+    success_points = np.concatenate([
+        np.asarray(checkpoints, dtype=float).reshape(-1, 2),
+        np.asarray(completes, dtype=float).reshape(-1, 2)
+    ])
     
-    if not success_points or len(success_points) < 2:
+    if len(success_points) < 2:
         print("[WARNING] Not enough flow data")
         return None
     
     return generate_kde_heatmap(success_points, 'flow', map_size, 'heatmap_player_flow')
 
 
+def render_settings():
+    """The command-line settings render workers need (see apply_settings)."""
+    return {
+        'DATA_SOURCE': DATA_SOURCE, 'TIME_RANGE': TIME_RANGE, 'LEVEL': LEVEL,
+        'MAX_POINTS': MAX_POINTS, 'CACHE': CACHE, 'RENDERER': RENDERER,
+    }
+
+
+def apply_settings(settings):
+    """
+    Worker initializer: install the parent's settings. Spawned workers
+    (the default on macOS and Windows) re-import this module and would
+    otherwise render with the .env defaults.
+    """
+    globals().update(settings)
+
+
+def generate_all(map_size=(1000, 1000), jobs=None):
+    """
+    Generate every per-type heatmap plus the combined danger zone map.
+    
+    Events are fetched in one pass, then each map is rendered in its own
+    worker process, so the run takes about as long as the slowest map.
+    jobs=1 renders in this process instead.
+    """
+    if use_cache():
+        points = fetch_cached_all(list(EVENT_TYPES), map_size)
+        danger = fetch_cached_all(['PLAYER_DEATH', 'STEALTH_BROKEN'], map_size, fixed_extent=True)
+    else:
+        points = danger = fetch_all_events(list(EVENT_TYPES))
+    
+    tasks = [
+        (generate_kde_heatmap, (coords, event_type, map_size))
+        for event_type, coords in points.items() if len(coords)
+    ]
+    tasks.append((generate_combined_heatmap, (map_size, danger['PLAYER_DEATH'], danger['STEALTH_BROKEN'])))
+    
+    if jobs == 1:
+        return [render(*args) for render, args in tasks]
+    
+    with ProcessPoolExecutor(max_workers=jobs, initializer=apply_settings,
+                             initargs=(render_settings(),)) as pool:
+        futures = [pool.submit(render, *args) for render, args in tasks]
+        return [future.result() for future in futures]
+
+
 def get_stats():
-    """Print statistics about collected events."""
+    """Print statistics about collected events (from the rollup tables)."""
     conn = connect_db()
     if not conn:
         return
     
     try:
         cursor = conn.cursor()
+        stats = rollups.read_stats(cursor)
+        cursor.close()
+        conn.close()
         
         print("\n" + "=" * 50)
         print("  TELEMETRY STATISTICS")
         print("=" * 50)
         
-        # Total events
-        cursor.execute("SELECT COUNT(*) FROM events")
-        total = cursor.fetchone()[0]
-        print(f"Total Events: {total}")
-        
-        # Events by type
-        cursor.execute("""
-            SELECT event_type, COUNT(*) as count 
-            FROM events 
-            GROUP BY event_type 
-            ORDER BY count DESC
-        """)
+        print(f"Total Events: {stats['total_events']}")
         
         print("\nEvents by Type:")
-        for row in cursor.fetchall():
-            print(f"  {row[0]}: {row[1]}")
+        for event_type, count in stats['events_by_type'].items():
+            print(f"  {event_type}: {count}")
         
-        # Sessions
-        cursor.execute("SELECT COUNT(*) FROM sessions")
-        sessions = cursor.fetchone()[0]
-        print(f"\nTotal Sessions: {sessions}")
+        if stats['levels']:
+            print("\nEvents by Level:")
+            for level, counts in stats['levels'].items():
+                print(f"  {level}: " + ", ".join(f"{t} {c}" for t, c in counts.items()))
         
-        cursor.close()
-        conn.close()
+        print(f"\nTotal Sessions: {stats['sessions']}")
         print("=" * 50 + "\n")
         
-    except mysql.connector.Error as err:
+    except Error as err:
         print(f"[ERROR] Getting stats: {err}")
 
 
 def main():
+    global DATA_SOURCE, TIME_RANGE, LEVEL, MAX_POINTS, CACHE, RENDERER
+    
     parser = argparse.ArgumentParser(description='Generate telemetry heatmaps')
     parser.add_argument('--event', '-e', type=str, help='Event type to visualize')
     parser.add_argument('--all', '-a', action='store_true', help='Generate all heatmaps')
@@ -269,10 +624,34 @@ def main():
     parser.add_argument('--stats', '-s', action='store_true', help='Show statistics')
     parser.add_argument('--width', type=int, default=1000, help='Map width')
     parser.add_argument('--height', type=int, default=1000, help='Map height')
+    parser.add_argument('--jobs', '-j', type=int, help='Worker processes for --all (default: one per CPU)')
+    parser.add_argument('--source', choices=['db', 'segments', 'grids'], default=DATA_SOURCE,
+                        help='Read points from the database, the columnar segment store, '
+                             'or the server-maintained bin grids')
+    parser.add_argument('--level', type=str, help='Only events whose meta level matches (db and grids)')
+    parser.add_argument('--max-points', type=int, default=MAX_POINTS,
+                        help='Sample at most this many points per event type (0 = all)')
+    parser.add_argument('--renderer', choices=['matplotlib', 'raster'], default=RENDERER,
+                        help='Draw PNGs with matplotlib or the fast numpy/zlib raster renderer')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Recompute from every event instead of the cached watermark')
+    parser.add_argument('--since', type=str, help='Only events at or after this time (epoch ms or ISO date)')
+    parser.add_argument('--until', type=str, help='Only events before this time (epoch ms or ISO date)')
     
     args = parser.parse_args()
     map_size = (args.width, args.height)
     
+    DATA_SOURCE = args.source
+    TIME_RANGE = (parse_time(args.since), parse_time(args.until))
+    LEVEL = args.level
+    MAX_POINTS = args.max_points or None
+    if args.no_cache:
+        CACHE = None
+    RENDERER = args.renderer
+    if LEVEL and DATA_SOURCE == 'segments':
+        print("[ERROR] The segment store does not record levels; use --source db or grids")
+        return
+    
     print("\n" + "=" * 50)
     print("  HEATMAP GENERATOR - Visualizing Suffering")
     print("=" * 50 + "\n")
@@ -287,7 +666,10 @@ def main():
     
     if args.event:
         if args.event.upper() in EVENT_TYPES:
-            coords = fetch_events_by_type(args.event.upper())
+            if use_cache():
+                coords = fetch_cached(args.event.upper(), map_size)
+            else:
+                coords = fetch_events_by_type(args.event.upper())
             generate_kde_heatmap(coords, args.event.upper(), map_size)
         else:
             print(f"[ERROR] Unknown event type: {args.event}")
@@ -295,17 +677,13 @@ def main():
         return
     
     if args.all:
-        for event_type in EVENT_TYPES.keys():
-            coords = fetch_events_by_type(event_type)
-            if coords:
-                generate_kde_heatmap(coords, event_type, map_size)
-        generate_combined_heatmap(map_size)
+        generate_all(map_size, args.jobs)
         return
     
     # Default: Generate death heatmap
     print("Generating death heatmap (use --help for more options)...")
     coords = fetch_events_by_type('PLAYER_DEATH')
-    if coords:
+    if len(coords):
         generate_kde_heatmap(coords, 'PLAYER_DEATH', map_size)
     else:
         print("[INFO] No death events found. Play the game first!")
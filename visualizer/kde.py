@@ -0,0 +1,226 @@
+"""
+Binned Gaussian kernel density estimation on a regular grid.
+
+scipy's gaussian_kde evaluates every point against every grid node,
+which is O(points x nodes). Here the points are first spread onto the
+grid with linear binning (each point split between its four surrounding
+nodes), and the binned weights are then convolved with the Gaussian
+kernel by FFT. The cost is O(points + nodes log nodes) whatever the
+bandwidth, and on a 200x200 grid the result stays within a fraction of a
+percent of gaussian_kde's peak density (see benchmarks/bench_kde.py).
+
+Bandwidths follow scipy: the kernel covariance is the weighted data
+covariance times factor ** 2, where factor is Scott's
+neff ** (-1 / (d + 4)), Silverman's (neff * (d + 2) / 4) ** (-1 / (d + 4))
+(the same thing when d = 2) or a fixed number, and
+neff = sum(w) ** 2 / sum(w ** 2).
+
+Unlike gaussian_kde, degenerate input (one distinct point, or points on
+a line) does not raise: the kernel is kept at least half a grid cell
+wide in every direction.
+"""
+import math
+
+import numpy as np
+from scipy.signal import fftconvolve
+
+# Kernel is truncated this many standard deviations from its centre
+KERNEL_REACH = 4.0
+
+# ...and never reaches further than this many grid widths, which is also
+# how far beyond the extent points are still binned
+MAX_REACH_GRIDS = 1
+
+
+def bandwidth_factor(neff, bw_method='scott', dims=2):
+    """Bandwidth scale factor for `neff` effective points."""
+    if bw_method == 'scott':
+        return neff ** (-1.0 / (dims + 4))
+    if bw_method == 'silverman':
+        return (neff * (dims + 2) / 4.0) ** (-1.0 / (dims + 4))
+    if isinstance(bw_method, (int, float)) and not isinstance(bw_method, bool):
+        return float(bw_method)
+    raise ValueError("bw_method must be 'scott', 'silverman' or a number")
+
+
+def data_covariance(x, y, weights, sum_sq=None):
+    """
+    Weighted covariance of (x, y) with scipy's unbiased correction.
+
+    `sum_sq` is the sum of squared per-point weights. It defaults to
+    sum(weights ** 2), and must be given when each (x, y) stands for
+    several points, as with pre-binned counts.
+    """
+    total = weights.sum()
+    if sum_sq is None:
+        sum_sq = weights @ weights
+    dx = x - weights @ x / total
+    dy = y - weights @ y / total
+    scatter = np.array([
+        [weights @ (dx * dx), weights @ (dx * dy)],
+        [weights @ (dx * dy), weights @ (dy * dy)],
+    ])
+    norm = total - sum_sq / total
+    if norm <= 0:
+        # A single point has no spread; the floor below takes over
+        return np.zeros((2, 2))
+    return scatter / norm
+
+
+def kernel_covariance(cov, factor, step):
+    """Scale the data covariance by factor ** 2, floored at half a grid cell."""
+    cov = cov * factor ** 2
+    floor = (0.5 * max(step)) ** 2
+    values, vectors = np.linalg.eigh(cov)
+    return (vectors * np.maximum(values, floor)) @ vectors.T
+
+
+def gaussian_kernel(cov, step, grid_shape):
+    """
+    Kernel density values at whole-cell offsets, shape (2 * rx + 1,
+    2 * ry + 1). Returns the kernel and its reach (rx, ry) in cells.
+    """
+    reach = [
+        max(1, min(math.ceil(KERNEL_REACH * math.sqrt(cov[axis, axis]) / step[axis]),
+                   MAX_REACH_GRIDS * grid_shape[axis]))
+        for axis in (0, 1)
+    ]
+    ox = np.arange(-reach[0], reach[0] + 1) * step[0]
+    oy = np.arange(-reach[1], reach[1] + 1) * step[1]
+    dx, dy = np.meshgrid(ox, oy, indexing='ij')
+    inv = np.linalg.inv(cov)
+    q = inv[0, 0] * dx * dx + 2 * inv[0, 1] * dx * dy + inv[1, 1] * dy * dy
+    norm = 2 * math.pi * math.sqrt(np.linalg.det(cov))
+    return np.exp(-0.5 * q) / norm, reach
+
+
+def linear_bin(x, y, weights, origin, step, shape):
+    """Spread weighted points onto grid nodes; points off the grid are dropped."""
+    fx = (x - origin[0]) / step[0]
+    fy = (y - origin[1]) / step[1]
+    ix = np.floor(fx).astype(np.intp)
+    iy = np.floor(fy).astype(np.intp)
+    keep = (ix >= 0) & (ix < shape[0] - 1) & (iy >= 0) & (iy < shape[1] - 1)
+    ix, iy, weights = ix[keep], iy[keep], weights[keep]
+    tx, ty = fx[keep] - ix, fy[keep] - iy
+
+    size = shape[0] * shape[1]
+    flat = ix * shape[1] + iy
+    binned = np.bincount(flat, weights * (1 - tx) * (1 - ty), minlength=size)
+    binned += np.bincount(flat + shape[1], weights * tx * (1 - ty), minlength=size)
+    binned += np.bincount(flat + 1, weights * (1 - tx) * ty, minlength=size)
+    binned += np.bincount(flat + shape[1] + 1, weights * tx * ty, minlength=size)
+    return binned.reshape(shape)
+
+
+class BinnedPoints:
+    """
+    Points linearly binned onto a size x size grid over extent = (xmin,
+    xmax, ymin, ymax), plus a margin of MAX_REACH_GRIDS grid widths so
+    points just outside still reach the grid through the kernel.
+
+    Alongside the bins it keeps the weighted moments that fix the
+    bandwidth, so adding points later gives exactly the density of
+    binning them all at once. That is what lets cache.py fold in new
+    events only. Sets over the same grid combine with + and * weight.
+    """
+
+    def __init__(self, extent, size=200, counts=None, moments=None):
+        self.extent = tuple(float(edge) for edge in extent)
+        self.size = size
+        xmin, xmax, ymin, ymax = self.extent
+        self.step = ((xmax - xmin) / (size - 1), (ymax - ymin) / (size - 1))
+        self.margin = MAX_REACH_GRIDS * size
+        shape = (size + 2 * self.margin, size + 2 * self.margin)
+        self.counts = np.zeros(shape) if counts is None else counts
+        # points, sum w, sum w^2, sum wx, sum wy, sum wxx, sum wxy, sum wyy
+        self.moments = np.zeros(8) if moments is None else moments
+
+    def __len__(self):
+        return int(self.moments[0])
+
+    def add(self, x, y, weights=None):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        weights = np.ones(len(x)) if weights is None else np.asarray(weights, dtype=float)
+        origin = (self.extent[0] - self.margin * self.step[0], self.extent[2] - self.margin * self.step[1])
+        self.counts += linear_bin(x, y, weights, origin, self.step, self.counts.shape)
+        self.moments += (
+            len(x), weights.sum(), weights @ weights, weights @ x, weights @ y,
+            weights @ (x * x), weights @ (x * y), weights @ (y * y),
+        )
+
+    def __add__(self, other):
+        if (self.extent, self.size) != (other.extent, other.size):
+            raise ValueError("binned points cover different grids")
+        moments = self.moments + other.moments
+        return BinnedPoints(self.extent, self.size, self.counts + other.counts, moments)
+
+    def __mul__(self, weight):
+        scale = np.array([1, weight, weight * weight] + [weight] * 5)
+        return BinnedPoints(self.extent, self.size, self.counts * weight, self.moments * scale)
+
+    def covariance(self):
+        """Weighted data covariance with scipy's unbiased correction."""
+        _, total, sum_sq, sx, sy, sxx, sxy, syy = self.moments
+        norm = total - sum_sq / total
+        if norm <= 0:
+            return np.zeros((2, 2))
+        mx, my = sx / total, sy / total
+        scatter = np.array([
+            [sxx - total * mx * mx, sxy - total * mx * my],
+            [sxy - total * mx * my, syy - total * my * my],
+        ])
+        return scatter / norm
+
+    def density(self, bw_method='scott'):
+        """(xi, yi, zi) laid out as in evaluate()."""
+        xmin, xmax, ymin, ymax = self.extent
+        xi, yi = np.mgrid[xmin:xmax:self.size * 1j, ymin:ymax:self.size * 1j]
+        total, sum_sq = self.moments[1], self.moments[2]
+
+        factor = bandwidth_factor(total * total / sum_sq, bw_method)
+        cov = kernel_covariance(self.covariance(), factor, self.step)
+        kernel, (rx, ry) = gaussian_kernel(cov, self.step, xi.shape)
+
+        # Convolve only the part of the margin the kernel can reach
+        m = self.margin
+        window = self.counts[m - rx:m + self.size + rx, m - ry:m + self.size + ry]
+        zi = fftconvolve(window, kernel, mode='valid') / total
+        return xi, yi, np.maximum(zi, 0)
+
+
+def evaluate(x, y, extent, size=200, weights=None, bw_method='scott'):
+    """
+    Density of points on a size x size grid over extent = (xmin, xmax,
+    ymin, ymax).
+
+    Returns (xi, yi, zi) laid out as np.mgrid[xmin:xmax:size*1j,
+    ymin:ymax:size*1j], i.e. what gaussian_kde(...)(positions) reshaped
+    to xi.shape gives.
+    """
+    binned = BinnedPoints(extent, size)
+    binned.add(x, y, weights)
+    return binned.density(bw_method)
+
+
+def evaluate_binned(counts, xs, ys, sum_sq=None, bw_method='scott'):
+    """
+    Density from weights already binned at cell centres xs, ys (such as
+    the server's heatmap grids). `sum_sq` is the sum of squared
+    per-event weights, which sets the effective sample size; it defaults
+    to the total, as for unit-weight events.
+
+    Returns (xi, yi, zi) with zi evaluated at the cell centres.
+    """
+    xi, yi = np.meshgrid(xs, ys, indexing='ij')
+    total = counts.sum()
+    if sum_sq is None:
+        sum_sq = total
+    step = (xs[1] - xs[0], ys[1] - ys[0])
+
+    factor = bandwidth_factor(total * total / sum_sq, bw_method)
+    cov = data_covariance(xi.ravel(), yi.ravel(), counts.ravel(), sum_sq)
+    kernel, _ = gaussian_kernel(kernel_covariance(cov, factor, step), step, counts.shape)
+    zi = fftconvolve(counts / total, kernel, mode='same')
+    return xi, yi, np.maximum(zi, 0)
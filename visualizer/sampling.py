@@ -0,0 +1,102 @@
+"""
+Memory-bounded point collection for the heatmap loaders.
+
+Points arrive in chunks (one fetchmany batch, one segment's matches)
+and are copied straight into a float32 array, so a point costs 8 bytes
+rather than a tuple of Python floats. With a point budget the collector
+keeps a uniform reservoir sample instead (Algorithm R, vectorised per
+chunk): memory stays fixed at the budget however many events stream
+past, and every event has the same chance of being drawn.
+"""
+import numpy as np
+
+# Initial capacity of an unbounded collector; doubles as it fills
+INITIAL_CAPACITY = 65536
+
+
+class PointCollector:
+    """
+    Accumulates (x, y) chunks into an (N, 2) float32 array.
+
+    With max_points set, at most that many points are kept, sampled
+    uniformly from everything added; `seen` counts all points offered.
+    """
+
+    def __init__(self, max_points=None, rng=None):
+        self.max_points = max_points or None
+        self.rng = rng if rng is not None else np.random.default_rng()
+        capacity = self.max_points or INITIAL_CAPACITY
+        self._points = np.empty((capacity, 2), dtype=np.float32)
+        self._count = 0
+        self.seen = 0
+
+    @classmethod
+    def restore(cls, points, seen, max_points=None, rng=None):
+        """A collector that carries on from earlier points() and seen."""
+        collector = cls(max_points, rng)
+        collector._reserve(len(points))
+        collector._points[:len(points)] = points
+        collector._count = len(points)
+        collector.seen = seen
+        return collector
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def sampled(self):
+        """Whether points were dropped to stay within the budget."""
+        return self.seen > self._count
+
+    def add(self, x, y):
+        """Add a chunk of coordinates (any numeric arrays of equal length)."""
+        chunk = len(x)
+        if not chunk:
+            return
+        if self.max_points is None:
+            self._reserve(self._count + chunk)
+            self._points[self._count:self._count + chunk, 0] = x
+            self._points[self._count:self._count + chunk, 1] = y
+            self._count += chunk
+            self.seen += chunk
+            return
+
+        # Fill the reservoir first, then replace at random
+        fill = min(chunk, self.max_points - self._count)
+        if fill:
+            self._points[self._count:self._count + fill, 0] = x[:fill]
+            self._points[self._count:self._count + fill, 1] = y[:fill]
+            self._count += fill
+        if fill < chunk:
+            # The t-th point seen (0-based) replaces slot j ~ U[0, t] if j < budget
+            positions = np.arange(self.seen + fill, self.seen + chunk)
+            slots = self.rng.integers(0, positions + 1)
+            keep = slots < self.max_points
+            rows = np.arange(fill, chunk)[keep]
+            slots = slots[keep]
+            # When a slot is drawn twice in one chunk the later point wins
+            slots, last = np.unique(slots[::-1], return_index=True)
+            rows = rows[::-1][last]
+            self._points[slots, 0] = np.asarray(x)[rows]
+            self._points[slots, 1] = np.asarray(y)[rows]
+        self.seen += chunk
+
+    def add_rows(self, rows):
+        """Add a batch of (x, y) rows as returned by a database cursor."""
+        if rows:
+            batch = np.asarray(rows, dtype=np.float32)
+            self.add(batch[:, 0], batch[:, 1])
+
+    def points(self):
+        """The collected points as an (N, 2) float32 array (a view, not a copy)."""
+        return self._points[:self._count]
+
+    def _reserve(self, needed):
+        capacity = len(self._points)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        grown = np.empty((capacity, 2), dtype=np.float32)
+        grown[:self._count] = self._points[:self._count]
+        self._points = grown